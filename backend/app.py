@@ -1,7 +1,9 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, stream_with_context, g, has_request_context
+from werkzeug.http import is_resource_modified
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.dialects.mysql import LONGTEXT
+from sqlalchemy.orm import deferred
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 import pandas as pd
@@ -14,11 +16,33 @@ from mysql.connector import Error
 import hashlib
 import random
 import string
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import logging
+import time
+import csv
+import io
+import multiprocessing
+import socket
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dotenv import load_dotenv
+import click
+from storage import get_store_dir, get_payload_dir, get_sheet_dir, read_manifest, find_sheet, remove_store, version_key
+from search_index import file_vocabulary, search_file, matches_case, tokenize, index_cache
+from sheet_store import (STORE_FORMAT, SheetReader, build_file_store, frame_from_records, load_sheet_profile,
+                         summarize_store, read_rows, read_row)
+from data_cache import DataCache
+from metrics import QUERY_BUCKETS, Registry, StageTimer, instrument_queries
+from auth import CachedUser, TokenSigner, UserCache, password_version
+from maintenance import MaintenanceScheduler, find_orphans, format_bytes, path_size, remove_path
+from mailer import OutboxSender, SMTPConnection, build_message, retry_delay, smtp_configured, smtp_settings
+from query_engine import QueryError, run_query
+from fuzzy_index import DEFAULT_MIN_SCORE, fuzzy_search_file
+from payloads import (write_file_payloads, has_payloads, negotiate_encoding, payload_path, available_encodings, remove_payloads,
+                      replace_payloads)
+from ingest import (PROGRESS_NAME, init_worker, ingest_upload, ingest_replacement, read_progress, write_progress,
+                    request_sheet)
+from readers import sheet_outline
 
 # Load environment variables
 load_dotenv()
@@ -40,15 +64,150 @@ db_host = os.getenv('DB_HOST', 'localhost')
 db_port = os.getenv('DB_PORT', '3306')
 db_name = os.getenv('DB_NAME', 'excel_finder_db')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{quote_plus(db_username)}:{quote_plus(db_password)}@{db_host}:{db_port}/{db_name}"
+# DATABASE_URL overrides the MySQL settings, e.g. sqlite:///bench.db for load tests
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or f"mysql+pymysql://{quote_plus(db_username)}:{quote_plus(db_password)}@{db_host}:{db_port}/{db_name}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Connection pool: connections are checked before use and recycled before MySQL's wait_timeout drops them
+if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
 app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_FILE_SIZE', 16 * 1024 * 1024))  # 16MB max file size
+# 16MB max file size; 0 lifts the cap. Sheets are parsed in chunks, but calamine holds a whole sheet's cells while it reads
+# (.xlsx sheets past readers.CALAMINE_MAX_CELLS are streamed with openpyxl instead), so size worker memory for the largest upload
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_FILE_SIZE', 16 * 1024 * 1024)) or None
+
+# Background upload processing
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', os.cpu_count() or 1))
+UPLOAD_BATCH_MAX_FILES = int(os.getenv('UPLOAD_BATCH_MAX_FILES', 50))  # Files accepted by one /api/upload/batch request
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read per step while saving and hashing an upload
+INGEST_CHUNK_ROWS = int(os.getenv('INGEST_CHUNK_ROWS', 10000))  # Rows held in memory per sheet while streaming
+UPLOAD_JOB_TIMEOUT_SECONDS = int(os.getenv('UPLOAD_JOB_TIMEOUT_SECONDS', 6 * 3600))  # Queued jobs of a server on another host are failed after this long
+
+# In-memory cache of the precomputed file data responses (shared between processes on disk)
+app.config['DATA_CACHE_BYTES'] = int(os.getenv('DATA_CACHE_BYTES', 256 * 1024 * 1024))
+
+# Rows of each sheet included in the upload summary
+UPLOAD_PREVIEW_ROWS = int(os.getenv('UPLOAD_PREVIEW_ROWS', 10))
+
+# Email outbox: messages are queued in the database and sent by a background thread in each web process
+OUTBOX_SENDER = os.getenv('OUTBOX_SENDER', 'true').lower() == 'true'
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 20))  # Messages sent per batch over one SMTP connection
+OUTBOX_POLL_SECONDS = float(os.getenv('OUTBOX_POLL_SECONDS', 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_LEASE_SECONDS = 300  # A claimed message is retried by any sender if not resolved within this time
+OUTBOX_ERROR_LENGTH = 1000
+
+# Session tokens issued at login, and the per-process cache of the users they identify
+AUTH_TOKEN_MAX_AGE = int(os.getenv('AUTH_TOKEN_MAX_AGE', 7 * 24 * 3600))
+REQUIRE_AUTH_TOKEN = os.getenv('REQUIRE_AUTH_TOKEN', 'false').lower() == 'true'  # Reject requests identified only by user_id
+USER_CACHE_SECONDS = float(os.getenv('USER_CACHE_SECONDS', 60))  # 0 disables the cache
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+
+# Maintenance: purging deleted files, spent password resets, finished jobs and orphaned uploads
+FILE_RETENTION_DAYS = int(os.getenv('FILE_RETENTION_DAYS', 30))  # Deleted files' rows and legacy sheet data are kept this long
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))  # Finished upload jobs are kept this long
+ORPHAN_GRACE_SECONDS = int(os.getenv('ORPHAN_GRACE_SECONDS', 3600))  # Unreferenced uploads younger than this are left alone
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv('MAINTENANCE_INTERVAL_SECONDS', 0))  # Run maintenance in the background this often; 0 disables
+MAINTENANCE_BATCH_SIZE = 500  # Rows deleted per transaction, so purges never hold long locks on hot tables
+
+# Log one JSON line per request and per processed upload to the "metrics" logger
+METRICS_LOG = os.getenv('METRICS_LOG', 'false').lower() == 'true'
+
+# Rows read from the column store per step while streaming an export
+EXPORT_BATCH_ROWS = 5000
+
+# Longest JSON-encoded min/max kept in column_profiles
+PROFILE_VALUE_LENGTH = 255
+# Longest sheet or column name kept in column_profiles; longer headers are truncated
+PROFILE_NAME_LENGTH = 255
+
+# Search index configuration
+SEARCH_TERM_LENGTH = 100  # Longer tokens are truncated in the user dictionary
+SEARCH_TERM_BATCH_SIZE = 5000
 
 # Create upload directory if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 db = SQLAlchemy(app)
+data_cache = DataCache(app.config['DATA_CACHE_BYTES'])
+token_signer = TokenSigner(app.config['SECRET_KEY'], AUTH_TOKEN_MAX_AGE)
+user_cache = UserCache(USER_CACHE_SECONDS, USER_CACHE_SIZE)
+metrics_logger = logging.getLogger('metrics')
+
+# Request, upload and database metrics of this process, served at /api/metrics
+metrics = Registry()
+request_seconds = metrics.histogram('http_request_duration_seconds', 'Time to build each API response', ('method', 'endpoint', 'status'))
+query_seconds = metrics.histogram('db_query_duration_seconds', 'SQL statement execution time', ('statement',), QUERY_BUCKETS)
+upload_seconds = metrics.histogram('excel_upload_duration_seconds', 'Time from accepting an upload to indexing it', ('outcome',))
+upload_stage_seconds = metrics.histogram('excel_upload_stage_seconds', 'Time per upload processing stage', ('stage',))
+upload_stage_bytes = metrics.counter('excel_upload_stage_bytes_total', 'Bytes handled per upload processing stage', ('stage',))
+parse_attempt_seconds = metrics.histogram('excel_parse_attempt_seconds', 'Time per reader engine attempt', ('engine', 'outcome'))
+emails_total = metrics.counter('outbox_emails_total', 'Outbox send attempts by outcome', ('outcome',))
+maintenance_rows = metrics.counter('maintenance_rows_deleted_total', 'Rows deleted by maintenance per table', ('table',))
+maintenance_bytes = metrics.counter('maintenance_reclaimed_bytes_total', 'Bytes reclaimed by maintenance', ('kind',))
+
+def record_query(statement, seconds):
+    """Time a SQL statement, and count it against the current request for the request log"""
+    query_seconds.observe(seconds, statement)
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.0) + seconds
+
+instrument_queries(record_query)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe the request's latency by route pattern, so file and user IDs do not become labels"""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    seconds = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_seconds.observe(seconds, request.method, endpoint, response.status_code)
+    if METRICS_LOG:
+        metrics_logger.info(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'seconds': round(seconds, 6),
+            'db_queries': g.get('db_queries', 0),
+            'db_seconds': round(g.get('db_seconds', 0.0), 6)
+        }))
+    return response
+
+def record_upload_stages(stages):
+    """Observe the per-stage seconds and bytes of one upload, as ``StageTimer.as_dict()`` returns them"""
+    for stage, totals in stages.items():
+        upload_stage_seconds.observe(totals['seconds'], stage)
+        if totals['bytes'] is not None:
+            upload_stage_bytes.inc(stage, amount=totals['bytes'])
+
+def record_ingest_result(result):
+    """Observe the stage timings and engine attempts an upload worker reported"""
+    record_upload_stages(result['stages'])
+    for attempt in result['attempts']:
+        parse_attempt_seconds.observe(attempt['seconds'], attempt['engine'], 'ok' if attempt['ok'] else 'failed')
+
+def log_upload_metrics(file_id, outcome, seconds, stages, engine=None):
+    if METRICS_LOG:
+        metrics_logger.info(json.dumps({
+            'event': 'upload',
+            'file_id': file_id,
+            'outcome': outcome,
+            'engine': engine,
+            'seconds': round(seconds, 6),
+            'stages': {stage: {'seconds': round(totals['seconds'], 6), 'bytes': totals['bytes']} for stage, totals in stages.items()}
+        }))
 
 # Database Models
 class User(db.Model):
@@ -67,6 +226,10 @@ class User(db.Model):
 
 class ExcelFile(db.Model):
     __tablename__ = 'excel_files'
+    __table_args__ = (
+        db.Index('idx_excel_files_user_active', 'user_id', 'is_active'),
+        db.Index('idx_excel_files_active_deleted', 'is_active', 'deleted_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     file_id = db.Column(db.String(50), unique=True, nullable=False)
@@ -75,12 +238,113 @@ class ExcelFile(db.Model):
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer, nullable=False)
-    sheets_data = db.Column(LONGTEXT)  # JSON string of sheets data
+    # Legacy JSON string of sheets data, cleared once migrated; deferred so metadata queries never load it
+    sheets_data = deferred(db.Column(db.Text().with_variant(LONGTEXT, 'mysql')))
+    storage_path = db.Column(db.String(500))  # Directory of the columnar sheet store
+    file_format = db.Column(db.String(10))  # Format detected from the file signature
+    parse_engine = db.Column(db.String(20))  # Reader engine that parsed the workbook
+    parse_seconds = db.Column(db.Float)  # Time spent reading and storing the workbook
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the uploaded bytes
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, default=1)  # Bumped each time PUT /api/files/<file_id> replaces the workbook
+    deleted_at = db.Column(db.DateTime)  # When the file was deleted; its row is purged FILE_RETENTION_DAYS later
+
+class SearchTerm(db.Model):
+    """User-scoped term dictionary: which of a user's files contain a token"""
+    __tablename__ = 'search_terms'
+    __table_args__ = (
+        db.Index('idx_search_terms_user_term', 'user_id', 'term'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    file_id = db.Column(db.String(50), nullable=False, index=True)
+    term = db.Column(db.String(100), nullable=False)
+
+class ColumnProfile(db.Model):
+    """Per-column statistics of a stored sheet, computed at ingest"""
+    __tablename__ = 'column_profiles'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.String(50), nullable=False, index=True)
+    sheet_name = db.Column(db.String(255), nullable=False)
+    sheet_position = db.Column(db.Integer, nullable=False)
+    sheet_rows = db.Column(db.Integer, nullable=False)
+    sheet_columns = db.Column(db.Integer, nullable=False)
+    column_name = db.Column(db.String(255), nullable=False)
+    column_position = db.Column(db.Integer, nullable=False)
+    column_type = db.Column(db.String(20), nullable=False)  # int64, float64, bool, datetime, string
+    null_count = db.Column(db.Integer, nullable=False)
+    null_ratio = db.Column(db.Float, nullable=False)
+    distinct_estimate = db.Column(db.Integer, nullable=False)  # HyperLogLog estimate
+    min_value = db.Column(db.String(255))  # JSON-encoded, truncated for long strings
+    max_value = db.Column(db.String(255))
+
+class UploadJob(db.Model):
+    __tablename__ = 'upload_jobs'
+    __table_args__ = (
+        db.Index('idx_upload_jobs_file_status', 'file_id', 'status'),
+        db.Index('idx_upload_jobs_status_finished', 'status', 'finished_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(50), unique=True, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    file_id = db.Column(db.String(50), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    file_size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64))
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, parsing, indexed, failed
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    version = db.Column(db.Integer)  # File version a replacement produces; null for new uploads
+    worker = db.Column(db.String(100))  # Server process that queued the job: host:pid:token
+
+class FileVersion(db.Model):
+    """Version history of a file: one row per uploaded workbook, the newest matching excel_files"""
+    __tablename__ = 'file_versions'
+    __table_args__ = (
+        db.Index('idx_file_versions_file_version', 'file_id', 'version', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    file_id = db.Column(db.String(50), nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    original_filename = db.Column(db.String(255), nullable=False)
+    file_size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64))
+    sheet_count = db.Column(db.Integer)
+    sheets_reused = db.Column(db.Integer, nullable=False, default=0)  # Sheets carried over unchanged from the previous version
+    parse_seconds = db.Column(db.Float)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class EmailOutbox(db.Model):
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('idx_email_outbox_due', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
 
 class PasswordReset(db.Model):
     __tablename__ = 'password_resets'
+    __table_args__ = (
+        db.Index('idx_password_resets_email_token_used', 'email', 'token', 'is_used'),
+        db.Index('idx_password_resets_expires_at', 'expires_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), nullable=False)
@@ -90,15 +354,47 @@ class PasswordReset(db.Model):
     is_used = db.Column(db.Boolean, default=False)
 
 # Database initialization
+def upgrade_schema():
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = db.inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=db.engine.dialect)
+                db.session.execute(db.text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info(f"Added column {table.name}.{column.name}")
+        db.session.commit()
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 def init_db():
     """Initialize the database and create tables"""
     try:
         with app.app_context():
             db.create_all()
+            upgrade_schema()
             logger.info("Database tables created successfully")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
 
+@app.cli.command('migrate-storage')
+def migrate_storage():
+    """Convert files still stored as a sheets_data blob into the columnar sheet store and precompute their responses"""
+    init_db()
+    files = ExcelFile.query.filter(ExcelFile.sheets_data.isnot(None)).all()
+    migrated = 0
+    for file in files:
+        try:
+            store_dir, manifest = ensure_file_store(file)
+            write_file_payloads(get_payload_dir(app.config['UPLOAD_FOLDER'], file.file_id),
+                                file.file_id, file.original_filename, store_dir, manifest)
+            migrated += 1
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error migrating {file.file_id}: {e}")
+    print(f"Migrated {migrated} of {len(files)} files")
+
 # Utility functions
 def generate_user_id():
     """Generate a unique user ID"""
@@ -108,43 +404,833 @@ def generate_file_id():
     """Generate a unique file ID"""
     return f"FILE{str(uuid.uuid4())[:8].upper()}"
 
+def generate_job_id():
+    """Generate a unique upload job ID"""
+    return f"JOB{str(uuid.uuid4())[:8].upper()}"
+
 def generate_reset_token():
     """Generate a secure reset token (6-digit OTP)"""
     return ''.join(random.choices(string.digits, k=6))
 
-def send_email(to_email, subject, body):
-    """Send email using configured SMTP settings"""
+def cache_user(user):
+    """Snapshot a User row into the user cache"""
+    cached = CachedUser(user.id, user.user_id, user.name, user.email, user.is_active, password_version(user.password_hash))
+    user_cache.put(cached)
+    return cached
+
+def load_user(id=None, user_id=None):
+    """A user by database id or public user_id, from the user cache when possible"""
+    cached = user_cache.get(id) if id is not None else user_cache.get_by_user_id(user_id)
+    if cached:
+        return cached
+    user = db.session.get(User, id) if id is not None else User.query.filter_by(user_id=user_id).first()
+    return cache_user(user) if user else None
+
+def request_user(user_id=None):
+    """Identify the caller of a user-scoped endpoint, returning ``(user, error_response)``"""
+    # A login token is checked by signature alone and its user read from the cache, so warm requests skip the user query
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        claims = token_signer.verify(header[len('Bearer '):].strip())
+        user = load_user(id=claims['id']) if claims else None
+        if not user or not user.is_active or user.password_version != claims['pv']:
+            return None, (jsonify({'error': 'Invalid or expired token'}), 401)
+        if user_id and user_id != user.user_id:
+            return None, (jsonify({'error': 'Access denied'}), 403)
+        return user, None
+    # Clients that predate tokens identify themselves by the user_id they send
+    if REQUIRE_AUTH_TOKEN:
+        return None, (jsonify({'error': 'Authentication required'}), 401)
+    if not user_id:
+        return None, (jsonify({'error': 'User ID is required'}), 400)
+    user = load_user(user_id=user_id)
+    if not user:
+        return None, (jsonify({'error': 'User not found'}), 404)
+    return user, None
+
+def check_owner(record):
+    """Error response unless the caller of a per-file endpoint owns a file or upload job, else None"""
+    # Clients without a token send user_id as a query, form or JSON field
+    body = request.get_json(silent=True) if request.is_json else None
+    user_id = request.values.get('user_id') or (body.get('user_id') if isinstance(body, dict) else None)
+    user, error = request_user(user_id)
+    if error:
+        return error
+    if record.user_id != user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    return None
+
+def store_file(excel_file, frames):
+    """Write a file's column store and search index and register its terms in the owner's dictionary"""
+    store_dir = get_store_dir(app.config['UPLOAD_FOLDER'], excel_file.file_id)
+    remove_store(store_dir)
+    manifest = build_file_store(store_dir, frames)
+    excel_file.storage_path = store_dir
+    register_search_terms(excel_file)
+    register_column_profiles(excel_file)
+    return manifest
+
+def register_search_terms(excel_file):
+    """Record the terms of a file's search index in the owner's dictionary"""
+    store_dir = excel_file.storage_path
+    SearchTerm.query.filter_by(file_id=excel_file.file_id).delete()
+    terms = sorted({term[:SEARCH_TERM_LENGTH] for term in file_vocabulary(store_dir)})
+    insert_search_terms(excel_file, terms)
+
+def insert_search_terms(excel_file, terms):
+    for start in range(0, len(terms), SEARCH_TERM_BATCH_SIZE):
+        db.session.execute(SearchTerm.__table__.insert(), [
+            {'user_id': excel_file.user_id, 'file_id': excel_file.file_id, 'term': term}
+            for term in terms[start:start + SEARCH_TERM_BATCH_SIZE]
+        ])
+
+def update_search_terms(excel_file):
+    """Bring a file's recorded terms in line with its current store, writing only the terms that changed"""
+    recorded = {term for term, in db.session.query(SearchTerm.term).filter_by(file_id=excel_file.file_id)}
+    terms = {term[:SEARCH_TERM_LENGTH] for term in file_vocabulary(excel_file.storage_path)}
+    removed = sorted(recorded - terms)
+    for start in range(0, len(removed), SEARCH_TERM_BATCH_SIZE):
+        SearchTerm.query.filter(
+            SearchTerm.file_id == excel_file.file_id,
+            SearchTerm.term.in_(removed[start:start + SEARCH_TERM_BATCH_SIZE])
+        ).delete(synchronize_session=False)
+    insert_search_terms(excel_file, sorted(terms - recorded))
+
+def profile_value(value):
+    """JSON-encode a column minimum or maximum for the column_profiles table"""
+    if value is None:
+        return None
+    return json.dumps(value)[:PROFILE_VALUE_LENGTH]
+
+def register_column_profiles(excel_file):
+    """Record the column profiles of a file's stored sheets"""
+    store_dir = excel_file.storage_path
+    ColumnProfile.query.filter_by(file_id=excel_file.file_id).delete()
+    manifest = read_manifest(store_dir)
+    rows = []
+    for sheet_position, entry in enumerate(manifest['sheets'] if manifest else []):
+        profile = load_sheet_profile(get_sheet_dir(store_dir, entry['key']))
+        for column_position, column in enumerate(profile['columns']):
+            rows.append({
+                'file_id': excel_file.file_id,
+                'sheet_name': entry['name'][:PROFILE_NAME_LENGTH],
+                'sheet_position': sheet_position,
+                'sheet_rows': profile['row_count'],
+                'sheet_columns': profile['column_count'],
+                'column_name': column['name'][:PROFILE_NAME_LENGTH],
+                'column_position': column_position,
+                'column_type': column['type'],
+                'null_count': column['null_count'],
+                'null_ratio': column['null_ratio'],
+                'distinct_estimate': column['distinct_estimate'],
+                'min_value': profile_value(column['min']),
+                'max_value': profile_value(column['max'])
+            })
+    if rows:
+        db.session.execute(ColumnProfile.__table__.insert(), rows)
+
+def ensure_file_store(excel_file):
+    """Return a file's store directory and manifest, migrating files still stored as a sheets_data blob"""
+    store_dir = excel_file.storage_path or get_store_dir(app.config['UPLOAD_FOLDER'], excel_file.file_id)
+    manifest = read_manifest(store_dir)
+    if manifest is None or manifest.get('format') != STORE_FORMAT:
+        if excel_file.sheets_data is None:
+            raise Exception(f"No stored data for file {excel_file.file_id}")
+        legacy_data = json.loads(excel_file.sheets_data)
+        frames = {sheet_name: frame_from_records(records) for sheet_name, records in legacy_data.items()}
+        manifest = store_file(excel_file, frames)
+        store_dir = excel_file.storage_path
+        excel_file.sheets_data = None
+        db.session.commit()
+    return store_dir, manifest
+
+def file_summary(excel_file):
+    """Compact upload summary: sheet names, row/column counts, column types and a preview of each sheet"""
+    store_dir, manifest = ensure_file_store(excel_file)
+    return {'sheets': summarize_store(store_dir, manifest, UPLOAD_PREVIEW_ROWS)}
+
+def read_hit_record(store_dir, manifest, sheet_name, row_number):
+    """Read a single search hit's record from the column store"""
+    entry = find_sheet(manifest, sheet_name)
+    return read_row(get_sheet_dir(store_dir, entry['key']), row_number)
+
+def find_candidate_files(user_pk, query, match):
+    """Return the ids of a user's files whose dictionary holds every query token"""
+    candidates = None
+    for token in tokenize(query):
+        term = token[:SEARCH_TERM_LENGTH]
+        term_filter = SearchTerm.term.startswith(term, autoescape=True) if match == 'prefix' else SearchTerm.term == term
+        rows = db.session.query(SearchTerm.file_id).filter(
+            SearchTerm.user_id == user_pk, term_filter
+        ).distinct().all()
+        file_ids = {row.file_id for row in rows}
+        candidates = file_ids if candidates is None else candidates & file_ids
+        if not candidates:
+            break
+    return candidates or set()
+
+def iter_user_hits(files, query, match, case_sensitive):
+    """Yield ``(file, store, sheet, row, columns)`` hits file by file, building a file's store only once it is reached"""
+    for file in files:
+        store = ensure_file_store(file)
+        for sheet_name, row_number, matched_columns in search_file(store[0], query, match=match):
+            if case_sensitive and not matches_case(read_hit_record(*store, sheet_name, row_number), matched_columns, query, match):
+                continue
+            yield file, store, sheet_name, row_number, matched_columns
+
+_upload_executor = None
+
+def get_upload_executor():
+    """Return the process pool that parses uploaded workbooks off the request threads"""
+    global _upload_executor
+    if _upload_executor is None:
+        _upload_executor = ProcessPoolExecutor(
+            max_workers=UPLOAD_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker
+        )
+    return _upload_executor
+
+def submit_upload(fn, *args):
+    """Submit work to the upload pool, replacing the pool if a worker died"""
+    global _upload_executor
     try:
-        # Get SMTP settings from environment variables
-        smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.getenv('SMTP_PORT', 587))
-        smtp_username = os.getenv('SMTP_USERNAME')
-        smtp_password = os.getenv('SMTP_PASSWORD')
-        
-        # Check if email credentials are configured
-        if not smtp_username or not smtp_password or smtp_username == 'your-email@gmail.com':
-            logger.warning("Email credentials not configured. Please update .env file with your SMTP settings.")
-            return False
-        
-        msg = MIMEMultipart()
-        msg['From'] = smtp_username
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(smtp_server, smtp_port)
-        server.starttls()
-        server.login(smtp_username, smtp_password)
-        text = msg.as_string()
-        server.sendmail(smtp_username, to_email, text)
-        server.quit()
-        
-        logger.info(f"Email sent successfully to {to_email}")
+        return get_upload_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Upload worker pool was broken, starting a new one")
+        _upload_executor = None
+        return get_upload_executor().submit(fn, *args)
+
+_worker_id = None
+
+def current_worker():
+    """This server process as host:pid:token; the token tells it apart from an earlier process with the same pid"""
+    global _worker_id
+    if _worker_id is None or _worker_id.split(':')[-2] != str(os.getpid()):
+        _worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    return _worker_id
+
+def worker_alive(worker):
+    """Whether the server process that queued a job still runs: True, False, or None when it is on another host"""
+    if worker is None:
+        # Queued before jobs recorded their process, so by a server that has since been restarted
+        return False
+    if worker == current_worker():
         return True
-    except Exception as e:
-        logger.error(f"Error sending email: {e}")
+    host, pid, _ = worker.rsplit(':', 2)
+    if host != socket.gethostname():
+        return None
+    if int(pid) == os.getpid():
         return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def queue_upload_job(job, outline):
+    """Submit the parse of a new upload to the upload pool, recording the outcome when it finishes"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    store_dir = get_store_dir(upload_folder, job.file_id)
+    write_progress(os.path.join(store_dir, PROGRESS_NAME), {
+        'status': 'queued',
+        'sheets': [dict(sheet, status='queued', rows=None) for sheet in outline]
+    })
+    future = submit_upload(
+        ingest_upload, job.file_path, store_dir, os.path.join(store_dir, PROGRESS_NAME), INGEST_CHUNK_ROWS,
+        get_payload_dir(upload_folder, job.file_id), job.file_id, job.original_filename
+    )
+    job_id = job.job_id
+    future.add_done_callback(lambda f: finish_upload_job(job_id, f))
+    return future
+
+def queue_replace_job(job, excel_file):
+    """Submit the parse of a file's new version to the upload pool, recording the outcome when it finishes"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    key = version_key(job.file_id, job.version)
+    store_dir = get_store_dir(upload_folder, key)
+    future = submit_upload(
+        ingest_replacement, job.file_path, store_dir, os.path.join(store_dir, PROGRESS_NAME), INGEST_CHUNK_ROWS,
+        get_payload_dir(upload_folder, key), job.file_id, job.original_filename,
+        excel_file.storage_path or get_store_dir(upload_folder, job.file_id), excel_file.file_path,
+        get_payload_dir(upload_folder, job.file_id)
+    )
+    job_id = job.job_id
+    future.add_done_callback(lambda f: finish_replace_job(job_id, f))
+    return future
+
+def discard_job_files(job):
+    """Remove what an unfinished job left on disk; a replacement leaves the file's current version in place"""
+    if not job.version:
+        discard_upload(job.file_id, job.file_path)
+        return
+    upload_folder = app.config['UPLOAD_FOLDER']
+    if os.path.exists(job.file_path):
+        os.remove(job.file_path)
+    remove_store(get_store_dir(upload_folder, version_key(job.file_id, job.version)))
+    remove_payloads(get_payload_dir(upload_folder, version_key(job.file_id, job.version)))
+
+def release_replace_job(job):
+    """Give up a replacement reserved but never queued, freeing its version for the next upload"""
+    if os.path.exists(job.file_path):
+        os.remove(job.file_path)
+    db.session.delete(job)
+    db.session.commit()
+
+def requeue_job(job):
+    """Parse a job's saved upload again from the start"""
+    if not os.path.exists(job.file_path):
+        raise Exception('Uploaded file is missing')
+    upload_folder = app.config['UPLOAD_FOLDER']
+    key = version_key(job.file_id, job.version) if job.version else job.file_id
+    remove_store(get_store_dir(upload_folder, key))
+    remove_payloads(get_payload_dir(upload_folder, key))
+    if not job.version:
+        return queue_upload_job(job, read_outline(job.file_path))
+    excel_file = ExcelFile.query.filter_by(file_id=job.file_id, is_active=True).first()
+    if not excel_file:
+        raise Exception('File was deleted while its new version was queued')
+    return queue_replace_job(job, excel_file)
+
+def abandoned_jobs():
+    """Queued jobs whose server process is gone, or on another host and older than UPLOAD_JOB_TIMEOUT_SECONDS"""
+    timed_out = datetime.utcnow() - timedelta(seconds=UPLOAD_JOB_TIMEOUT_SECONDS)
+    return [
+        job for job in UploadJob.query.filter(UploadJob.status == 'queued').all()
+        if worker_alive(job.worker) is False or (worker_alive(job.worker) is None and job.created_at < timed_out)
+    ]
+
+def recover_upload_jobs(requeue=True):
+    """Re-queue jobs left queued by a server process that is gone, or fail them; returns ``(requeued, failed)``"""
+    requeued = failed = 0
+    for job in abandoned_jobs():
+        # Claim the job, so that processes recovering at the same time do not both take it
+        previous = job.worker
+        owner = UploadJob.worker == previous if previous is not None else UploadJob.worker.is_(None)
+        claimed = UploadJob.query.filter(UploadJob.id == job.id, UploadJob.status == 'queued', owner).update(
+            {'worker': current_worker()}, synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            continue
+        db.session.refresh(job)
+        if requeue:
+            try:
+                requeue_job(job)
+                requeued += 1
+                logger.info(f"Re-queued upload job {job.job_id} left by {previous}")
+                continue
+            except Exception as e:
+                logger.error(f"Re-queueing upload job {job.job_id} failed: {e}")
+        discard_job_files(job)
+        job.status = 'failed'
+        job.error = 'The server stopped before the file was processed'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        failed += 1
+        logger.warning(f"Failed upload job {job.job_id} left by {previous}")
+    return requeued, failed
+
+def finish_upload_job(job_id, future):
+    """Record the outcome of a background parse: create the ExcelFile or mark the job failed"""
+    with app.app_context():
+        job = UploadJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return
+        timer = StageTimer()
+        try:
+            result = future.result()
+            excel_file = parsed_file_record(job.file_id, job.user_id, job.filename, job.original_filename,
+                                            job.file_path, job.file_size, job.content_hash, result)
+            db.session.add(excel_file)
+            db.session.flush()
+            with timer.stage('register'):
+                register_search_terms(excel_file)
+                register_column_profiles(excel_file)
+            job.status = 'indexed'
+            job.finished_at = datetime.utcnow()
+            with timer.stage('db_commit'):
+                db.session.commit()
+            stages = dict(result['stages'], **timer.as_dict())
+            seconds = (job.finished_at - job.created_at).total_seconds()
+            record_ingest_result(result)
+            record_upload_stages(timer.as_dict())
+            upload_seconds.observe(seconds, 'indexed')
+            log_upload_metrics(job.file_id, 'indexed', seconds, stages, result['engine'])
+            logger.info(f"Successfully processed and saved Excel file: {job.original_filename}")
+        except Exception as e:
+            db.session.rollback()
+            # Clean up file if processing fails
+            discard_upload(job.file_id, job.file_path)
+            logger.error(f"Excel processing error for {job.original_filename}: {e}")
+            job = UploadJob.query.filter_by(job_id=job_id).first()
+            job.status = 'failed'
+            job.error = f'Failed to process Excel file: {str(e)}'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            upload_seconds.observe((job.finished_at - job.created_at).total_seconds(), 'failed')
+
+def finish_replace_job(job_id, future):
+    """Record a parsed new version of a file: repoint the file at it and release what only the old version used"""
+    with app.app_context():
+        job = UploadJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return
+        upload_folder = app.config['UPLOAD_FOLDER']
+        store_dir = get_store_dir(upload_folder, version_key(job.file_id, job.version))
+        staged_payload_dir = get_payload_dir(upload_folder, version_key(job.file_id, job.version))
+        timer = StageTimer()
+        try:
+            result = future.result()
+            excel_file = ExcelFile.query.filter_by(file_id=job.file_id, is_active=True).first()
+            if not excel_file:
+                raise Exception('File was deleted while its new version was processed')
+            if not FileVersion.query.filter_by(file_id=excel_file.file_id).count():
+                db.session.add(initial_file_version(excel_file))
+            previous_path = excel_file.file_path
+            previous_store = excel_file.storage_path or get_store_dir(upload_folder, excel_file.file_id)
+            previous_version = excel_file.version
+            
+            excel_file.filename = job.filename
+            excel_file.original_filename = job.original_filename
+            excel_file.file_path = job.file_path
+            excel_file.file_size = job.file_size
+            excel_file.content_hash = job.content_hash
+            excel_file.storage_path = store_dir
+            excel_file.file_format = result['format']
+            excel_file.parse_engine = result['engine']
+            excel_file.parse_seconds = result['parse_seconds']
+            excel_file.uploaded_at = datetime.utcnow()
+            excel_file.version = job.version
+            db.session.add(FileVersion(
+                file_id=excel_file.file_id,
+                version=job.version,
+                original_filename=job.original_filename,
+                file_size=job.file_size,
+                content_hash=job.content_hash,
+                sheet_count=len(result['manifest']['sheets']),
+                sheets_reused=len(result['reused_sheets']),
+                parse_seconds=result['parse_seconds'],
+                created_at=excel_file.uploaded_at
+            ))
+            with timer.stage('register'):
+                update_search_terms(excel_file)
+                register_column_profiles(excel_file)
+            job.status = 'indexed'
+            job.finished_at = datetime.utcnow()
+            with timer.stage('db_commit'):
+                db.session.commit()
+            
+            replace_payloads(staged_payload_dir, get_payload_dir(upload_folder, excel_file.file_id))
+            invalidate_cached_payloads(excel_file.file_id, previous_version)
+            release_unreferenced(previous_path, previous_store)
+            stages = dict(result['stages'], **timer.as_dict())
+            seconds = (job.finished_at - job.created_at).total_seconds()
+            record_ingest_result(result)
+            record_upload_stages(timer.as_dict())
+            upload_seconds.observe(seconds, 'replaced')
+            log_upload_metrics(job.file_id, 'replaced', seconds, stages, result['engine'])
+            logger.info(f"Stored version {job.version} of {job.file_id}, reusing "
+                        f"{len(result['reused_sheets'])} of {len(result['manifest']['sheets'])} sheets")
+        except Exception as e:
+            db.session.rollback()
+            discard_job_files(job)
+            logger.error(f"Excel processing error for new version of {job.file_id}: {e}")
+            job = UploadJob.query.filter_by(job_id=job_id).first()
+            job.status = 'failed'
+            job.error = f'Failed to process Excel file: {str(e)}'
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            upload_seconds.observe((job.finished_at - job.created_at).total_seconds(), 'failed')
+
+def initial_file_version(excel_file):
+    """History row for a file's first version, written when it is first replaced"""
+    manifest = read_manifest(excel_file.storage_path) if excel_file.storage_path else None
+    return FileVersion(
+        file_id=excel_file.file_id,
+        version=excel_file.version or 1,
+        original_filename=excel_file.original_filename,
+        file_size=excel_file.file_size,
+        content_hash=excel_file.content_hash,
+        sheet_count=len(manifest['sheets']) if manifest else None,
+        sheets_reused=0,
+        parse_seconds=excel_file.parse_seconds,
+        created_at=excel_file.uploaded_at
+    )
+
+def new_upload_path(original_filename, file_id=None):
+    """Allocate a file ID (unless given) and the path its upload is saved under"""
+    file_id = file_id or generate_file_id()
+    safe_filename = secure_filename(original_filename)
+    if not safe_filename:
+        safe_filename = f"file_{file_id}.xlsx"
+    unique_filename = f"{file_id}_{safe_filename}"
+    return file_id, unique_filename, os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+
+def parsed_file_record(file_id, user_pk, filename, original_filename, file_path, file_size, content_hash, result):
+    """ExcelFile for a workbook the ingest worker has just parsed into its column store"""
+    return ExcelFile(
+        file_id=file_id,
+        user_id=user_pk,
+        filename=filename,
+        original_filename=original_filename,
+        file_path=file_path,
+        file_size=file_size,
+        storage_path=get_store_dir(app.config['UPLOAD_FOLDER'], file_id),
+        content_hash=content_hash,
+        file_format=result['format'],
+        parse_engine=result['engine'],
+        parse_seconds=result['parse_seconds']
+    )
+
+def shared_file_record(source, file_id, user_pk, original_filename, file_size, content_hash):
+    """ExcelFile sharing the upload and column store of an already parsed file with the same content"""
+    return ExcelFile(
+        file_id=file_id,
+        user_id=user_pk,
+        filename=source.filename,
+        original_filename=original_filename,
+        file_path=source.file_path,
+        file_size=file_size,
+        storage_path=source.storage_path,
+        content_hash=content_hash,
+        file_format=source.file_format,
+        parse_engine=source.parse_engine,
+        parse_seconds=0
+    )
+
+def discard_upload(file_id, file_path):
+    """Remove everything a failed upload left on disk"""
+    if os.path.exists(file_path):
+        os.remove(file_path)
+    remove_store(get_store_dir(app.config['UPLOAD_FOLDER'], file_id))
+    remove_payloads(get_payload_dir(app.config['UPLOAD_FOLDER'], file_id))
+
+def read_outline(file_path):
+    """Sheet names and size estimates of a saved upload, or none if its metadata cannot be read"""
+    try:
+        return sheet_outline(file_path)
+    except Exception as e:
+        # The background parse reports the actual error
+        logger.warning(f"Could not list the sheets of {file_path}: {e}")
+        return []
+
+def save_upload(file, file_path):
+    """Stream an upload to disk, hashing it on the way; returns its size and SHA-256"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(file_path, 'wb') as out:
+        while True:
+            chunk = file.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+def find_parsed_duplicate(content_hash):
+    """Return an active file with the same content whose column store is already built"""
+    candidates = ExcelFile.query.filter(
+        ExcelFile.content_hash == content_hash,
+        ExcelFile.is_active == True,
+        ExcelFile.storage_path.isnot(None)
+    ).all()
+    for candidate in candidates:
+        if read_manifest(candidate.storage_path) is not None and os.path.exists(candidate.file_path):
+            return candidate
+    return None
+
+def release_file_data(excel_file):
+    """Remove a file's upload and column store once no other active file references them"""
+    others = ExcelFile.query.filter(ExcelFile.id != excel_file.id, ExcelFile.is_active == True)
+    if not others.filter(ExcelFile.file_path == excel_file.file_path).count():
+        if os.path.exists(excel_file.file_path):
+            os.remove(excel_file.file_path)
+    store_dir = excel_file.storage_path or get_store_dir(app.config['UPLOAD_FOLDER'], excel_file.file_id)
+    if not others.filter(ExcelFile.storage_path == store_dir).count():
+        remove_store(store_dir)
+
+def release_unreferenced(file_path, store_dir):
+    """Remove an upload and column store that no active file references any more"""
+    active = ExcelFile.query.filter(ExcelFile.is_active == True)
+    if not active.filter(ExcelFile.file_path == file_path).count():
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    if not active.filter(ExcelFile.storage_path == store_dir).count():
+        remove_store(store_dir)
+
+def hash_file(file_path):
+    """SHA-256 of a stored file, read in upload-sized chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def payload_cache_key(file_id, version, encoding):
+    # Keyed by version, so a process that missed a replacement never serves the old body under the new ETag
+    return f"{file_id}.v{version or 1}.{encoding or 'json'}"
+
+def invalidate_cached_payloads(file_id, version):
+    for encoding in [None] + available_encodings():
+        data_cache.invalidate(payload_cache_key(file_id, version, encoding))
+
+def file_data_response(excel_file):
+    """Serve a file's full data from its precomputed payload, honouring ETag and Accept-Encoding"""
+    payload_dir = get_payload_dir(app.config['UPLOAD_FOLDER'], excel_file.file_id)
+    if not has_payloads(payload_dir):
+        # Files stored before responses were precomputed, or shared with an identical upload
+        store_dir, manifest = ensure_file_store(excel_file)
+        write_file_payloads(payload_dir, excel_file.file_id, excel_file.original_filename, store_dir, manifest)
+    if not excel_file.content_hash and os.path.exists(excel_file.file_path):
+        excel_file.content_hash = hash_file(excel_file.file_path)
+        db.session.commit()
+    
+    encoding = negotiate_encoding(request.accept_encodings, payload_dir)
+    etag = f"{excel_file.file_id}-{excel_file.content_hash or 'unhashed'}" + (f"-{encoding}" if encoding else '')
+    last_modified = excel_file.uploaded_at.replace(microsecond=0)
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = app.response_class(status=304)
+    else:
+        cache_key = payload_cache_key(excel_file.file_id, excel_file.version, encoding)
+        body = data_cache.get(cache_key)
+        if body is None:
+            with open(payload_path(payload_dir, encoding), 'rb') as f:
+                body = f.read()
+            data_cache.put(cache_key, body)
+        response = app.response_class(body, status=200, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+_outbox_sender = None
+_maintenance_scheduler = None
+
+def get_outbox_sender():
+    """Return this process's outbox sender thread, starting it on first use"""
+    global _outbox_sender
+    if _outbox_sender is None:
+        _outbox_sender = OutboxSender(drain_outbox, OUTBOX_BATCH_SIZE, OUTBOX_POLL_SECONDS)
+        _outbox_sender.start()
+    return _outbox_sender
+
+def enqueue_email(to_email, subject, body):
+    """Queue an email in the outbox and wake the sender; the request does not wait for SMTP"""
+    db.session.add(EmailOutbox(to_email=to_email, subject=subject, body=body))
+    db.session.commit()
+    if OUTBOX_SENDER:
+        get_outbox_sender().wake()
+
+def claim_outbox_batch(now):
+    """Claim up to a batch of due messages, one conditional update each so concurrent senders never share one"""
+    due = db.session.query(EmailOutbox.id).filter(
+        EmailOutbox.status.in_(('pending', 'sending')),
+        EmailOutbox.next_attempt_at <= now
+    ).order_by(EmailOutbox.next_attempt_at).limit(OUTBOX_BATCH_SIZE).all()
+    lease = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+    claimed = []
+    for (message_id,) in due:
+        updated = EmailOutbox.query.filter(
+            EmailOutbox.id == message_id,
+            EmailOutbox.status.in_(('pending', 'sending')),
+            EmailOutbox.next_attempt_at <= now
+        ).update({'status': 'sending', 'next_attempt_at': lease}, synchronize_session=False)
+        if updated:
+            claimed.append(message_id)
+    db.session.commit()
+    return len(due), claimed
+
+def drain_outbox(connection):
+    """Send one batch of due outbox messages over a kept-open SMTP connection; returns how many were due"""
+    settings = connection.settings
+    if not smtp_configured(settings):
+        return 0
+    with app.app_context():
+        due_count, claimed = claim_outbox_batch(datetime.utcnow())
+        messages = EmailOutbox.query.filter(EmailOutbox.id.in_(claimed)).order_by(EmailOutbox.id).all() if claimed else []
+        for message in messages:
+            message.attempts += 1
+            try:
+                connection.send(message.to_email, build_message(settings['username'], message.to_email, message.subject, message.body))
+                message.status = 'sent'
+                message.sent_at = datetime.utcnow()
+                emails_total.inc('sent')
+                logger.info(f"Email sent successfully to {message.to_email}")
+            except Exception as e:
+                connection.handle_error(e)
+                message.last_error = str(e)[:OUTBOX_ERROR_LENGTH]
+                if message.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    message.status = 'failed'
+                    emails_total.inc('failed')
+                    logger.error(f"Giving up on email to {message.to_email} after {message.attempts} attempts: {e}")
+                else:
+                    message.status = 'pending'
+                    message.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(message.attempts))
+                    emails_total.inc('retry')
+                    logger.warning(f"Error sending email to {message.to_email}, will retry: {e}")
+            # Committed per message so a crash never resends what already went out
+            db.session.commit()
+        return due_count
+
+@app.cli.command('send-outbox')
+def send_outbox():
+    """Send every due outbox message now, for running without the background sender"""
+    connection = SMTPConnection(smtp_settings())
+    processed = 0
+    try:
+        while True:
+            handled = drain_outbox(connection)
+            processed += handled
+            if handled < OUTBOX_BATCH_SIZE:
+                break
+    finally:
+        connection.close()
+    print(f"Processed {processed} outbox messages")
+
+def delete_in_batches(model, criteria, dry_run=False):
+    """Delete the rows matching ``criteria`` a batch at a time; returns how many there were"""
+    if dry_run:
+        return db.session.query(db.func.count(model.id)).filter(*criteria).scalar()
+    deleted = 0
+    while True:
+        ids = [row.id for row in db.session.query(model.id).filter(*criteria).limit(MAINTENANCE_BATCH_SIZE)]
+        if not ids:
+            return deleted
+        model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+def purge_deleted_files(cutoff, dry_run=False):
+    """Delete the rows and legacy sheet data of files deleted before ``cutoff``; returns ``(files, bytes)``"""
+    if not dry_run:
+        # Files deleted before deletion times were recorded start their retention period now
+        ExcelFile.query.filter(ExcelFile.is_active == False, ExcelFile.deleted_at.is_(None)).update(
+            {'deleted_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+    
+    expired = (ExcelFile.is_active == False, ExcelFile.deleted_at < cutoff)
+    blob_bytes = db.func.coalesce(db.func.length(ExcelFile.sheets_data), 0)
+    if dry_run:
+        count, size = db.session.query(db.func.count(ExcelFile.id), db.func.coalesce(db.func.sum(blob_bytes), 0)).filter(*expired).one()
+        return count, int(size)
+    
+    purged = reclaimed = 0
+    while True:
+        batch = db.session.query(ExcelFile.id, ExcelFile.file_id, blob_bytes).filter(*expired).limit(MAINTENANCE_BATCH_SIZE).all()
+        if not batch:
+            return purged, reclaimed
+        file_ids = [row.file_id for row in batch]
+        for model in (SearchTerm, ColumnProfile, FileVersion):
+            model.query.filter(model.file_id.in_(file_ids)).delete(synchronize_session=False)
+        ExcelFile.query.filter(ExcelFile.id.in_([row.id for row in batch])).delete(synchronize_session=False)
+        db.session.commit()
+        purged += len(batch)
+        reclaimed += sum(int(row[2]) for row in batch)
+
+def purge_password_resets(now, dry_run=False):
+    """Delete expired and used password reset records"""
+    expired = delete_in_batches(PasswordReset, (PasswordReset.expires_at < now,), dry_run)
+    # Tokens expire within hours, so the used ones left are found among the few still live
+    used = delete_in_batches(PasswordReset, (PasswordReset.expires_at >= now, PasswordReset.is_used == True), dry_run)
+    return expired + used
+
+def find_orphaned_uploads():
+    """Uploads, stores and payload directories in UPLOAD_FOLDER that no active file or queued job uses"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    files, stores, payloads = set(), set(), set()
+    active = db.session.query(ExcelFile.file_id, ExcelFile.file_path, ExcelFile.storage_path).filter(ExcelFile.is_active == True)
+    for file_id, file_path, storage_path in active:
+        files.add(os.path.abspath(file_path))
+        stores.add(os.path.abspath(storage_path or get_store_dir(upload_folder, file_id)))
+        payloads.add(os.path.abspath(get_payload_dir(upload_folder, file_id)))
+    queued = db.session.query(UploadJob.file_id, UploadJob.file_path, UploadJob.version).filter(UploadJob.status == 'queued')
+    for file_id, file_path, version in queued:
+        key = version_key(file_id, version) if version else file_id
+        files.add(os.path.abspath(file_path))
+        stores.add(os.path.abspath(get_store_dir(upload_folder, key)))
+        payloads.add(os.path.abspath(get_payload_dir(upload_folder, key)))
+    
+    return (
+        find_orphans(upload_folder, files, ORPHAN_GRACE_SECONDS)
+        + find_orphans(os.path.dirname(get_store_dir(upload_folder, 'file')), stores, ORPHAN_GRACE_SECONDS, directories=True)
+        + find_orphans(os.path.dirname(get_payload_dir(upload_folder, 'file')), payloads, ORPHAN_GRACE_SECONDS, directories=True)
+    )
+
+def run_maintenance(dry_run=False, requeue_jobs=False):
+    """Purge deleted files, spent password resets, finished jobs and orphaned uploads; returns what was reclaimed.
+
+    Jobs left queued by a server process that is gone are failed, or parsed
+    again when ``requeue_jobs`` (only for a server process, which can finish them).
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    files, blob_bytes = purge_deleted_files(now - timedelta(days=FILE_RETENTION_DAYS), dry_run)
+    resets = purge_password_resets(now, dry_run)
+    # Settled before finished jobs are purged and uploads swept, so their files are no longer protected
+    requeued, abandoned = (0, len(abandoned_jobs())) if dry_run else recover_upload_jobs(requeue_jobs)
+    jobs = delete_in_batches(UploadJob, (
+        UploadJob.status.in_(('indexed', 'failed')),
+        UploadJob.finished_at < now - timedelta(days=JOB_RETENTION_DAYS)
+    ), dry_run)
+    orphans = find_orphaned_uploads()
+    orphan_bytes = sum(remove_path(path) if not dry_run else path_size(path) for path in orphans)
+    
+    report = {
+        'dry_run': dry_run,
+        'deleted_files': files,
+        'sheet_data_bytes': blob_bytes,
+        'password_resets': resets,
+        'upload_jobs': jobs,
+        'requeued_jobs': requeued,
+        'abandoned_jobs': abandoned,
+        'orphaned_paths': len(orphans),
+        'orphaned_bytes': orphan_bytes,
+        'bytes_reclaimed': blob_bytes + orphan_bytes,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    if not dry_run:
+        for table, count in (('excel_files', files), ('password_resets', resets), ('upload_jobs', jobs)):
+            maintenance_rows.inc(table, amount=count)
+        maintenance_bytes.inc('sheet_data', amount=blob_bytes)
+        maintenance_bytes.inc('orphaned_uploads', amount=orphan_bytes)
+    logger.info(f"Maintenance {'dry run' if dry_run else 'run'}: {files} deleted files, {resets} password resets, "
+                f"{jobs} upload jobs, {requeued} re-queued and {abandoned} abandoned jobs, {len(orphans)} orphaned paths, "
+                f"{format_bytes(report['bytes_reclaimed'])} reclaimed")
+    return report
+
+def scheduled_maintenance():
+    with app.app_context():
+        run_maintenance(requeue_jobs=True)
+
+def start_maintenance_scheduler():
+    """Start this process's periodic maintenance thread"""
+    global _maintenance_scheduler
+    if _maintenance_scheduler is None:
+        _maintenance_scheduler = MaintenanceScheduler(scheduled_maintenance, MAINTENANCE_INTERVAL_SECONDS)
+        _maintenance_scheduler.start()
+    return _maintenance_scheduler
+
+@app.cli.command('maintenance')
+@click.option('--dry-run', is_flag=True, help='Report what would be reclaimed without deleting anything')
+def maintenance_command(dry_run):
+    """Purge deleted files, spent password resets, finished upload jobs and orphaned uploads; fail abandoned upload jobs"""
+    init_db()
+    report = run_maintenance(dry_run)
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    print(f"{verb} {format_bytes(report['bytes_reclaimed'])}: {report['deleted_files']} deleted files "
+          f"({format_bytes(report['sheet_data_bytes'])} of sheet data), {report['orphaned_paths']} orphaned uploads "
+          f"({format_bytes(report['orphaned_bytes'])}), {report['password_resets']} password resets, "
+          f"{report['upload_jobs']} upload jobs, {report['abandoned_jobs']} abandoned upload jobs failed")
 
 # Authentication Routes
 @app.route('/api/auth/register', methods=['POST'])
@@ -211,8 +1297,11 @@ def login():
         if not user.is_active:
             return jsonify({'error': 'Account is deactivated'}), 401
         
+        cache_user(user)
         return jsonify({
             'message': 'Login successful',
+            'token': token_signer.issue(user),
+            'expires_in': AUTH_TOKEN_MAX_AGE,
             'user': {
                 'user_id': user.user_id,
                 'name': user.name,
@@ -266,15 +1355,16 @@ Best regards,
 Excel Finder Team
         """
         
-        email_sent = send_email(email, subject, body)
-        
-        if email_sent:
+        if smtp_configured(smtp_settings()):
+            # Sent by the outbox sender, so a slow mail server does not hold up the response
+            enqueue_email(email, subject, body)
             return jsonify({
                 'message': 'Password reset OTP sent to your email',
                 'email_sent': True
             }), 200
         else:
-            # If email fails, still return the token for testing purposes
+            # If email is not configured, still return the token for testing purposes
+            logger.warning("Email credentials not configured. Please update .env file with your SMTP settings.")
             logger.warning(f"Email sending failed for {email}, returning token for testing")
             return jsonify({
                 'message': 'Password reset token generated (email sending failed)',
@@ -345,6 +1435,8 @@ def reset_password():
         reset_record.is_used = True
         
         db.session.commit()
+        # Tokens issued before the reset no longer match; other processes notice once their entry expires
+        user_cache.invalidate(user.id)
         
         return jsonify({'message': 'Password reset successfully'}), 200
         
@@ -360,10 +1452,6 @@ def upload_excel():
             return jsonify({'error': 'No file provided'}), 400
         
         file = request.files['file']
-        user_id = request.form.get('user_id')
-        
-        if not user_id:
-            return jsonify({'error': 'User ID is required'}), 400
         
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
@@ -371,188 +1459,243 @@ def upload_excel():
         if not file.filename.lower().endswith(('.xlsx', '.xls')):
             return jsonify({'error': 'Only Excel files are allowed'}), 400
         
-        user = User.query.filter_by(user_id=user_id).first()
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        user, error = request_user(request.form.get('user_id'))
+        if error:
+            return error
         
 
         original_filename = file.filename
-        file_id = generate_file_id()
-        safe_filename = secure_filename(original_filename)
-        if not safe_filename:  
-            safe_filename = f"file_{file_id}.xlsx"
-        
-        unique_filename = f"{file_id}_{safe_filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        
-        file.save(file_path)
-        file_size = os.path.getsize(file_path)
-        
-        # Process Excel file
-        try:
-            # Try different engines and approaches for better compatibility
-            excel_data = None
-            error_messages = []
-            
-            # Method 1: Try with openpyxl engine (best for .xlsx)
-            try:
-                excel_data = pd.read_excel(file_path, sheet_name=None, engine='openpyxl')
-                logger.info(f"Successfully read Excel file with openpyxl engine")
-            except Exception as e1:
-                error_messages.append(f"openpyxl: {str(e1)}")
-                
-                # Method 2: Try with openpyxl and different parameters
-                try:
-                    excel_data = pd.read_excel(file_path, sheet_name=None, engine='openpyxl',
-                                            na_values=['', ' ', 'N/A', 'n/a', 'NULL', 'null'])
-                    logger.info(f"Successfully read Excel file with openpyxl (with na_values)")
-                except Exception as e2:
-                    error_messages.append(f"openpyxl_na: {str(e2)}")
-                    
-                    # Method 3: Try with xlrd engine for .xls files
-                    try:
-                        excel_data = pd.read_excel(file_path, sheet_name=None, engine='xlrd')
-                        logger.info(f"Successfully read Excel file with xlrd engine")
-                    except Exception as e3:
-                        error_messages.append(f"xlrd: {str(e3)}")
-                        
-                        # Method 4: Try with calamine engine (if available)
-                        try:
-                            excel_data = pd.read_excel(file_path, sheet_name=None, engine='calamine')
-                            logger.info(f"Successfully read Excel file with calamine engine")
-                        except Exception as e4:
-                            error_messages.append(f"calamine: {str(e4)}")
-                            
-                            # Method 5: Try without specifying engine
-                            try:
-                                excel_data = pd.read_excel(file_path, sheet_name=None)
-                                logger.info(f"Successfully read Excel file with default engine")
-                            except Exception as e5:
-                                error_messages.append(f"default: {str(e5)}")
-                                
-                                # Method 6: Try reading as binary and converting
-                                try:
-                                    import openpyxl
-                                    workbook = openpyxl.load_workbook(file_path, data_only=True)
-                                    excel_data = {}
-                                    for sheet_name in workbook.sheetnames:
-                                        sheet = workbook[sheet_name]
-                                        data = []
-                                        for row in sheet.iter_rows(values_only=True):
-                                            data.append(row)
-                                        if data:
-                                            df = pd.DataFrame(data[1:], columns=data[0])
-                                            excel_data[sheet_name] = df
-                                    logger.info(f"Successfully read Excel file with openpyxl direct method")
-                                except Exception as e6:
-                                    error_messages.append(f"openpyxl_direct: {str(e6)}")
-                                    
-                                    # Method 7: Try with different encoding
-                                    try:
-                                        excel_data = pd.read_excel(file_path, sheet_name=None,
-                                                                engine='openpyxl', encoding='utf-8')
-                                        logger.info(f"Successfully read Excel file with utf-8 encoding")
-                                    except Exception as e7:
-                                        error_messages.append(f"utf8_encoding: {str(e7)}")
-                                        raise Exception(f"All methods failed. Errors: {'; '.join(error_messages)}")
-            
-            if excel_data is None or not excel_data:
-                raise Exception("Failed to read Excel file with any method")
-            
-            sheets_data = {}
-            
-            for sheet_name, df in excel_data.items():
-                try:
-                    # Convert DataFrame to JSON-serializable format
-                    df_cleaned = df.copy()
-                    
-                    # Handle empty DataFrames
-                    if df_cleaned.empty:
-                        sheets_data[sheet_name] = []
-                        continue
-                    
-                    # Clean column names (remove special characters)
-                    df_cleaned.columns = [str(col).strip() for col in df_cleaned.columns]
-                    
-                    # Convert all columns to string to avoid JSON serialization issues
-                    for col in df_cleaned.columns:
-                        try:
-                            df_cleaned[col] = df_cleaned[col].astype(str)
-                        except Exception as col_error:
-                            logger.warning(f"Error converting column {col}: {col_error}")
-                            df_cleaned[col] = df_cleaned[col].apply(lambda x: str(x) if pd.notna(x) else '')
-                    
-                    # Replace various forms of NaN and empty values
-                    df_cleaned = df_cleaned.replace(['nan', 'NaN', 'NAN', 'None', 'NULL', 'null', 'N/A', 'n/a'], '')
-                    df_cleaned = df_cleaned.fillna('')
-                    
-                    # Remove completely empty rows
-                    df_cleaned = df_cleaned.dropna(how='all')
-                    
-                    # Convert to records
-                    records = df_cleaned.to_dict('records')
-                    sheets_data[sheet_name] = records
-                    
-                except Exception as sheet_error:
-                    logger.error(f"Error processing sheet {sheet_name}: {sheet_error}")
-                    # If a sheet fails, create an empty sheet
-                    sheets_data[sheet_name] = []
-            
-            # Save to database
-            excel_file = ExcelFile(
-                file_id=file_id,
-                user_id=user.id,
-                filename=unique_filename,
-                original_filename=original_filename,
-                file_path=file_path,
-                file_size=file_size,
-                sheets_data=json.dumps(sheets_data)
-            )
-            
+        file_id, unique_filename, file_path = new_upload_path(original_filename)
+        
+        started = time.perf_counter()
+        timer = StageTimer()
+        with timer.stage('save'):
+            file_size, content_hash = save_upload(file, file_path)
+        timer.add('save', 0, file_size)
+        
+        # An identical workbook that is already parsed is shared instead of parsed again
+        with timer.stage('dedup_lookup'):
+            duplicate = find_parsed_duplicate(content_hash)
+        if duplicate:
+            os.remove(file_path)
+            excel_file = shared_file_record(duplicate, file_id, user.id, original_filename, file_size, content_hash)
             db.session.add(excel_file)
-            db.session.commit()
-            
-            logger.info(f"Successfully processed and saved Excel file: {original_filename}")
+            db.session.flush()
+            with timer.stage('register'):
+                register_search_terms(excel_file)
+                register_column_profiles(excel_file)
+            with timer.stage('db_commit'):
+                db.session.commit()
+            seconds = time.perf_counter() - started
+            record_upload_stages(timer.as_dict())
+            upload_seconds.observe(seconds, 'deduplicated')
+            log_upload_metrics(file_id, 'deduplicated', seconds, timer.as_dict())
+            logger.info(f"Reused parsed data of {duplicate.file_id} for duplicate upload {original_filename}")
             
             return jsonify({
                 'message': 'File uploaded successfully',
                 'file_id': file_id,
                 'filename': original_filename,
-                'sheets': list(sheets_data.keys()),
-                'sheets_data': sheets_data
+                'status': 'indexed',
+                'deduplicated': True,
+                'summary': file_summary(excel_file)
             }), 201
-            
+        
+        # List the sheets from the workbook metadata now; their cells are parsed in the background
+        with timer.stage('outline'):
+            outline = read_outline(file_path)
+        
+        # Queue the workbook for parsing in the background worker pool
+        job = UploadJob(
+            job_id=generate_job_id(),
+            user_id=user.id,
+            file_id=file_id,
+            filename=unique_filename,
+            original_filename=original_filename,
+            file_path=file_path,
+            file_size=file_size,
+            content_hash=content_hash,
+            worker=current_worker()
+        )
+        db.session.add(job)
+        with timer.stage('db_commit'):
+            db.session.commit()
+        job_id = job.job_id
+        
+        try:
+            with timer.stage('queue'):
+                queue_upload_job(job, outline)
         except Exception as e:
-            # Clean up file if processing fails
-            if os.path.exists(file_path):
-                os.remove(file_path)
-            logger.error(f"Excel processing error for {original_filename}: {e}")
-            return jsonify({
-                'error': f'Failed to process Excel file: {str(e)}',
-                'details': 'Please ensure the file is a valid Excel file (.xlsx or .xls) and not corrupted. The file may contain unsupported formatting or be password protected.'
-            }), 500
-            
+            discard_upload(file_id, file_path)
+            job.status = 'failed'
+            job.error = f'Failed to queue Excel file: {str(e)}'
+            db.session.commit()
+            raise
+        record_upload_stages(timer.as_dict())
+        
+        return jsonify({
+            'message': 'File accepted for processing',
+            'job_id': job_id,
+            'file_id': file_id,
+            'filename': original_filename,
+            'status': 'queued',
+            'sheets': outline
+        }), 202
+        
     except Exception as e:
         logger.error(f"Upload error: {e}")
         return jsonify({'error': 'Upload failed'}), 500
 
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_excel_batch():
+    """Upload many Excel files in one request, parse them in parallel and index them in one transaction"""
+    try:
+        # The whole batch may exceed the single-file request cap; each file is still checked against it
+        max_file_size = app.config['MAX_CONTENT_LENGTH']
+        request.max_content_length = max_file_size * UPLOAD_BATCH_MAX_FILES if max_file_size else None
+        
+        files = [file for file in request.files.getlist('files') if file.filename]
+        
+        if not files:
+            return jsonify({'error': 'No files provided'}), 400
+        
+        if len(files) > UPLOAD_BATCH_MAX_FILES:
+            return jsonify({'error': f'At most {UPLOAD_BATCH_MAX_FILES} files can be uploaded at once'}), 400
+        
+        user, error = request_user(request.form.get('user_id'))
+        if error:
+            return error
+        
+        # Save each file and queue its parse straight away, so parsing overlaps saving the rest of the batch
+        timer = StageTimer()
+        uploads = []
+        parsing = {}
+        for file in files:
+            upload = {'filename': file.filename}
+            uploads.append(upload)
+            if not file.filename.lower().endswith(('.xlsx', '.xls')):
+                upload.update(status='rejected', error='Only Excel files are allowed')
+                continue
+            file_id, unique_filename, file_path = new_upload_path(file.filename)
+            with timer.stage('save'):
+                file_size, content_hash = save_upload(file, file_path)
+            timer.add('save', 0, file_size)
+            upload.update(file_id=file_id, unique_filename=unique_filename, file_path=file_path,
+                          file_size=file_size, content_hash=content_hash)
+            if max_file_size and file_size > max_file_size:
+                os.remove(file_path)
+                upload.update(status='rejected', error='File is too large')
+                continue
+            
+            # Identical content is parsed once, whether it is already stored or repeated within the batch
+            duplicate = find_parsed_duplicate(content_hash)
+            if duplicate:
+                os.remove(file_path)
+                upload['source'] = duplicate
+                continue
+            if content_hash in parsing:
+                os.remove(file_path)
+                upload['leader'] = parsing[content_hash]
+                continue
+            store_dir = get_store_dir(app.config['UPLOAD_FOLDER'], file_id)
+            upload['future'] = submit_upload(
+                ingest_upload, file_path, store_dir, os.path.join(store_dir, PROGRESS_NAME), INGEST_CHUNK_ROWS,
+                get_payload_dir(app.config['UPLOAD_FOLDER'], file_id), file_id, file.filename
+            )
+            parsing[content_hash] = upload
+        
+        # Collect the parses, then create every ExcelFile in one transaction
+        records = []
+        for upload in uploads:
+            if 'future' not in upload:
+                continue
+            try:
+                result = upload['future'].result()
+                record_ingest_result(result)
+                upload['record'] = parsed_file_record(
+                    upload['file_id'], user.id, upload['unique_filename'], upload['filename'],
+                    upload['file_path'], upload['file_size'], upload['content_hash'], result
+                )
+            except Exception as e:
+                discard_upload(upload['file_id'], upload['file_path'])
+                logger.error(f"Excel processing error for {upload['filename']}: {e}")
+                upload.update(status='failed', error=f'Failed to process Excel file: {str(e)}')
+        
+        for upload in uploads:
+            if 'leader' in upload:
+                leader = upload['leader']
+                if 'record' not in leader:
+                    upload.update(status='failed', error=leader['error'])
+                    continue
+                upload['source'] = leader['record']
+            if 'source' in upload:
+                upload['record'] = shared_file_record(upload['source'], upload['file_id'], user.id, upload['filename'],
+                                                      upload['file_size'], upload['content_hash'])
+                upload['deduplicated'] = True
+            if 'record' in upload:
+                upload['status'] = 'indexed'
+                records.append(upload['record'])
+        
+        try:
+            db.session.add_all(records)
+            db.session.flush()
+            with timer.stage('register'):
+                for record in records:
+                    register_search_terms(record)
+                    register_column_profiles(record)
+            with timer.stage('db_commit'):
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for upload in uploads:
+                if 'future' in upload:
+                    discard_upload(upload['file_id'], upload['file_path'])
+            raise
+        record_upload_stages(timer.as_dict())
+        logger.info(f"Indexed {len(records)} of {len(uploads)} files in batch upload")
+        
+        results = []
+        for upload in uploads:
+            result = {'filename': upload['filename'], 'status': upload['status']}
+            if upload['status'] == 'indexed':
+                result['file_id'] = upload['file_id']
+                result['deduplicated'] = upload.get('deduplicated', False)
+            else:
+                result['error'] = upload['error']
+            results.append(result)
+        
+        return jsonify({
+            'message': f'{len(records)} of {len(uploads)} files uploaded successfully',
+            'indexed': len(records),
+            'failed': len(uploads) - len(records),
+            'files': results
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Batch upload error: {e}")
+        return jsonify({'error': 'Batch upload failed'}), 500
+
 @app.route('/api/files/<user_id>', methods=['GET'])
 def get_user_files(user_id):
     """Get all files uploaded by a user"""
     try:
-        user = User.query.filter_by(user_id=user_id).first()
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        user, error = request_user(user_id)
+        if error:
+            return error
         
-        files = ExcelFile.query.filter_by(user_id=user.id, is_active=True).all()
+        # Only the listed columns, so the sheets_data blob of legacy rows is never read
+        rows = db.session.execute(
+            db.select(ExcelFile.file_id, ExcelFile.original_filename, ExcelFile.uploaded_at, ExcelFile.file_size)
+            .where(ExcelFile.user_id == user.id, ExcelFile.is_active == True)
+        ).all()
         
         files_data = []
-        for file in files:
+        for file_id, filename, uploaded_at, file_size in rows:
             files_data.append({
-                'file_id': file.file_id,
-                'filename': file.original_filename,
-                'uploaded_at': file.uploaded_at.isoformat(),
-                'file_size': file.file_size
+                'file_id': file_id,
+                'filename': filename,
+                'uploaded_at': uploaded_at.isoformat(),
+                'file_size': file_size
             })
         
         return jsonify({'files': files_data}), 200
@@ -563,24 +1706,532 @@ def get_user_files(user_id):
 
 @app.route('/api/files/<file_id>/data', methods=['GET'])
 def get_file_data(file_id):
-    """Get Excel file data by file ID"""
+    """Get Excel file data by file ID, optionally one page of one sheet"""
     try:
+        sheet = request.args.get('sheet')
+        columns = request.args.get('columns')
+        paged = sheet is not None or columns is not None or 'offset' in request.args or 'limit' in request.args
+        try:
+            offset = max(int(request.args.get('offset', 0)), 0)
+            limit = min(max(int(request.args.get('limit', 100)), 1), 5000)
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be integers'}), 400
+        
         file = ExcelFile.query.filter_by(file_id=file_id, is_active=True).first()
         if not file:
+            # A new upload's sheets can be read one by one while the rest are still being parsed
+            job = UploadJob.query.filter_by(file_id=file_id, status='queued', version=None).first()
+            if job:
+                return check_owner(job) or pending_file_data(job, sheet, columns, paged, offset, limit)
             return jsonify({'error': 'File not found'}), 404
+        error = check_owner(file)
+        if error:
+            return error
+        
+        if not paged:
+            return file_data_response(file)
         
-        sheets_data = json.loads(file.sheets_data)
+        store_dir, manifest = ensure_file_store(file)
+        
+        sheets = [entry['name'] for entry in manifest['sheets']]
+        if not sheets:
+            return jsonify({'error': 'File has no sheets'}), 404
+        
+        entry = find_sheet(manifest, sheet if sheet is not None else sheets[0])
+        if not entry:
+            return jsonify({'error': 'Sheet not found'}), 404
+        
+        page, error = sheet_page(get_sheet_dir(store_dir, entry['key']), entry, columns, offset, limit)
+        if error:
+            return error
+        
+        return jsonify(dict(page, file_id=file.file_id, filename=file.original_filename, sheets=sheets)), 200
+        
+    except Exception as e:
+        logger.error(f"Get file data error: {e}")
+        return jsonify({'error': 'Failed to retrieve file data'}), 500
+
+def sheet_page(sheet_dir, entry, columns, offset, limit):
+    """One page of a stored sheet for the data endpoint, as ``(page, error_response)``"""
+    projection = None
+    if columns:
+        projection = [column for column in columns.split(',') if column]
+        unknown = [column for column in projection if column not in entry['columns']]
+        if unknown:
+            return None, (jsonify({'error': f"Unknown columns: {', '.join(unknown)}"}), 400)
+    
+    return {
+        'sheet': entry['name'],
+        'columns': projection or entry['columns'],
+        'total_rows': entry['row_count'],
+        'offset': offset,
+        'limit': limit,
+        'rows': read_rows(sheet_dir, offset, limit, projection)
+    }, None
+
+def pending_file_data(job, sheet, columns, paged, offset, limit):
+    """Serve a sheet of an upload that is still being parsed, or ask the worker to parse it next"""
+    store_dir = get_store_dir(app.config['UPLOAD_FOLDER'], job.file_id)
+    progress = read_progress(os.path.join(store_dir, PROGRESS_NAME))
+    progress_sheets = progress['sheets'] if progress else []
+    sheets = [sheet_progress['name'] for sheet_progress in progress_sheets]
+    pending = {
+        'file_id': job.file_id,
+        'filename': job.original_filename,
+        'job_id': job.job_id,
+        'status': 'parsing',
+        'sheets': sheets
+    }
+    # The full response needs every sheet, so it waits for the job
+    if not paged or not sheets:
+        return jsonify(pending), 202
+    
+    sheet_name = sheet if sheet is not None else sheets[0]
+    if sheet_name not in sheets:
+        return jsonify({'error': 'Sheet not found'}), 404
+    position = sheets.index(sheet_name)
+    sheet_progress = progress_sheets[position]
+    if 'key' not in sheet_progress:
+        request_sheet(store_dir, position)
+        response = jsonify(dict(pending, sheet=sheet_name))
+        response.status_code = 202
+        response.headers['Retry-After'] = '1'
+        return response
+    
+    sheet_dir = get_sheet_dir(store_dir, sheet_progress['key'])
+    reader = SheetReader(sheet_dir)
+    entry = {'name': sheet_name, 'columns': reader.columns, 'row_count': reader.row_count}
+    page, error = sheet_page(sheet_dir, entry, columns, offset, limit)
+    if error:
+        return error
+    return jsonify(dict(page, **pending)), 200
+
+def ndjson_lines(batches):
+    """Serialize batches of records as newline-delimited JSON"""
+    for records in batches:
+        yield ''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records)
+
+def csv_lines(columns, batches):
+    """Serialize batches of records as CSV, starting with a header row"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for records in batches:
+        writer.writerows([['' if record[column] is None else record[column] for column in columns] for record in records])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@app.route('/api/files/<file_id>/sheets/<path:sheet>/rows.ndjson', methods=['GET'], defaults={'export_format': 'ndjson'})
+@app.route('/api/files/<file_id>/sheets/<path:sheet>/rows.csv', methods=['GET'], defaults={'export_format': 'csv'})
+def export_sheet_rows(file_id, sheet, export_format):
+    """Stream every row of a sheet as NDJSON or CSV straight from the column store"""
+    try:
+        file = ExcelFile.query.filter_by(file_id=file_id, is_active=True).first()
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        error = check_owner(file)
+        if error:
+            return error
+        
+        store_dir, manifest = ensure_file_store(file)
+        entry = find_sheet(manifest, sheet)
+        if not entry:
+            return jsonify({'error': 'Sheet not found'}), 404
+        
+        reader = SheetReader(get_sheet_dir(store_dir, entry['key']))
+        batches = reader.iter_batches(EXPORT_BATCH_ROWS)
+        
+        if export_format == 'csv':
+            response = app.response_class(stream_with_context(csv_lines(reader.columns, batches)), mimetype='text/csv')
+            download_name = f"{os.path.splitext(file.original_filename)[0]}-{entry['name']}.csv"
+            response.headers['Content-Disposition'] = f"attachment; filename=\"{secure_filename(download_name) or 'sheet.csv'}\""
+        else:
+            response = app.response_class(stream_with_context(ndjson_lines(batches)), mimetype='application/x-ndjson')
+        response.headers['X-Total-Rows'] = str(entry['row_count'])
+        return response
+        
+    except Exception as e:
+        logger.error(f"Export sheet rows error: {e}")
+        return jsonify({'error': 'Failed to export sheet rows'}), 500
+
+def decode_profile_value(value):
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        # Truncated long string
+        return value
+
+@app.route('/api/files/<file_id>/profile', methods=['GET'])
+def get_file_profile(file_id):
+    """Get the per-sheet shape and per-column statistics of a file without reading its rows"""
+    try:
+        file = ExcelFile.query.filter_by(file_id=file_id, is_active=True).first()
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        error = check_owner(file)
+        if error:
+            return error
+        
+        profiles = ColumnProfile.query.filter_by(file_id=file_id).order_by(
+            ColumnProfile.sheet_position, ColumnProfile.column_position).all()
+        if not profiles:
+            # Files stored before profiling was added are profiled on first request
+            ensure_file_store(file)
+            register_column_profiles(file)
+            db.session.commit()
+            profiles = ColumnProfile.query.filter_by(file_id=file_id).order_by(
+                ColumnProfile.sheet_position, ColumnProfile.column_position).all()
+        
+        sheets = []
+        positions = []
+        for profile in profiles:
+            # Grouped by position, since truncated sheet names need not be distinct
+            if not positions or positions[-1] != profile.sheet_position:
+                positions.append(profile.sheet_position)
+                sheets.append({
+                    'name': profile.sheet_name,
+                    'row_count': profile.sheet_rows,
+                    'column_count': profile.sheet_columns,
+                    'columns': []
+                })
+            sheets[-1]['columns'].append({
+                'name': profile.column_name,
+                'type': profile.column_type,
+                'null_count': profile.null_count,
+                'null_ratio': profile.null_ratio,
+                'distinct_estimate': profile.distinct_estimate,
+                'min': decode_profile_value(profile.min_value),
+                'max': decode_profile_value(profile.max_value)
+            })
         
         return jsonify({
             'file_id': file.file_id,
             'filename': file.original_filename,
-            'sheets': list(sheets_data.keys()),
-            'sheets_data': sheets_data
+            'sheets': sheets
         }), 200
         
     except Exception as e:
-        logger.error(f"Get file data error: {e}")
-        return jsonify({'error': 'Failed to retrieve file data'}), 500
+        logger.error(f"Get file profile error: {e}")
+        return jsonify({'error': 'Failed to retrieve file profile'}), 500
+
+@app.route('/api/files/<file_id>/query', methods=['POST'])
+def query_file(file_id):
+    """Filter, group and aggregate one sheet of a file server-side"""
+    try:
+        spec = request.get_json(silent=True)
+        if not isinstance(spec, dict):
+            return jsonify({'error': 'Query must be a JSON object'}), 400
+        
+        file = ExcelFile.query.filter_by(file_id=file_id, is_active=True).first()
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        error = check_owner(file)
+        if error:
+            return error
+        
+        store_dir, manifest = ensure_file_store(file)
+        sheets = [entry['name'] for entry in manifest['sheets']]
+        if not sheets:
+            return jsonify({'error': 'File has no sheets'}), 404
+        
+        entry = find_sheet(manifest, spec.get('sheet', sheets[0]))
+        if not entry:
+            return jsonify({'error': 'Sheet not found'}), 404
+        
+        try:
+            result = run_query(get_sheet_dir(store_dir, entry['key']), spec)
+        except QueryError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify({
+            'file_id': file.file_id,
+            'sheet': entry['name'],
+            **result
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Query file error: {e}")
+        return jsonify({'error': 'Failed to query file'}), 500
+
+@app.route('/api/files/<file_id>/search', methods=['GET'])
+def search_file_data(file_id):
+    """Search the rows of an Excel file using its inverted index"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        match = request.args.get('match', 'exact')
+        if match not in ('exact', 'prefix', 'fuzzy'):
+            return jsonify({'error': 'match must be exact, prefix or fuzzy'}), 400
+        
+        sheet = request.args.get('sheet')
+        column = request.args.get('column')
+        case_sensitive = request.args.get('case_sensitive', 'false').lower() == 'true'
+        try:
+            limit = min(int(request.args.get('limit', 100)), 1000)
+            min_score = float(request.args.get('min_score', DEFAULT_MIN_SCORE))
+        except ValueError:
+            return jsonify({'error': 'limit and min_score must be numbers'}), 400
+        
+        file = ExcelFile.query.filter_by(file_id=file_id, is_active=True).first()
+        if not file:
+            return jsonify({'error': 'File not found'}), 404
+        error = check_owner(file)
+        if error:
+            return error
+        
+        # Files uploaded before indexing existed get their index built on first search
+        store_dir, manifest = ensure_file_store(file)
+        
+        if match == 'fuzzy':
+            # Typo-tolerant lookup: best-scoring rows first, scored by edit distance to the closest cell value
+            hits = fuzzy_search_file(store_dir, query, sheet, column, min_score)
+            results = []
+            for score, sheet_name, row_number, matched_columns, _ in hits[:limit]:
+                record = read_hit_record(store_dir, manifest, sheet_name, row_number)
+                results.append({
+                    'sheet': sheet_name,
+                    'row': row_number,
+                    'matched_columns': matched_columns,
+                    'matched_value': record.get(matched_columns[0]),
+                    'score': round(score, 4),
+                    'record': record
+                })
+            
+            return jsonify({
+                'file_id': file.file_id,
+                'query': query,
+                'match': match,
+                'total': len(hits),
+                'results': results
+            }), 200
+        
+        results = []
+        total = 0
+        for sheet_name, row_number, matched_columns in search_file(store_dir, query, sheet, column, match):
+            if len(results) >= limit and not case_sensitive:
+                total += 1
+                continue
+            record = read_hit_record(store_dir, manifest, sheet_name, row_number)
+            if case_sensitive and not matches_case(record, matched_columns, query, match):
+                continue
+            total += 1
+            if len(results) < limit:
+                results.append({
+                    'sheet': sheet_name,
+                    'row': row_number,
+                    'matched_columns': matched_columns,
+                    'record': record
+                })
+        
+        return jsonify({
+            'file_id': file.file_id,
+            'query': query,
+            'match': match,
+            'total': total,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Search file error: {e}")
+        return jsonify({'error': 'Failed to search file'}), 500
+
+@app.route('/api/users/<user_id>/search', methods=['GET'])
+def search_user_files(user_id):
+    """Search the rows of every active file owned by a user"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        match = request.args.get('match', 'exact')
+        if match not in ('exact', 'prefix'):
+            return jsonify({'error': 'match must be exact or prefix'}), 400
+        
+        case_sensitive = request.args.get('case_sensitive', 'false').lower() == 'true'
+        try:
+            offset = max(int(request.args.get('offset', 0)), 0)
+            limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        except ValueError:
+            return jsonify({'error': 'offset and limit must be integers'}), 400
+        
+        user, error = request_user(user_id)
+        if error:
+            return error
+        
+        # Only files whose dictionary holds every query token are searched; files that predate the
+        # dictionary have no terms recorded until their store is built, so they are searched too
+        candidates = find_candidate_files(user.id, query, match)
+        files = (ExcelFile.query.filter(
+            ExcelFile.user_id == user.id, ExcelFile.is_active == True,
+            db.or_(ExcelFile.file_id.in_(candidates), ExcelFile.storage_path.is_(None))
+        ).order_by(ExcelFile.uploaded_at.desc()).all())
+        
+        # Stop once the page and one more hit are found; records are only loaded for the page
+        hits = list(islice(iter_user_hits(files, query, match, case_sensitive), offset + limit + 1))
+        
+        results = []
+        for file, store, sheet_name, row_number, matched_columns in hits[offset:offset + limit]:
+            results.append({
+                'file_id': file.file_id,
+                'filename': file.original_filename,
+                'sheet': sheet_name,
+                'row': row_number,
+                'matched_columns': matched_columns,
+                'record': read_hit_record(*store, sheet_name, row_number)
+            })
+        
+        return jsonify({
+            'query': query,
+            'match': match,
+            'offset': offset,
+            'limit': limit,
+            'has_more': len(hits) > offset + limit,
+            'results': results
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Search user files error: {e}")
+        return jsonify({'error': 'Failed to search files'}), 500
+
+@app.route('/api/files/<file_id>', methods=['PUT'])
+def replace_file(file_id):
+    """Upload a new version of a file; only sheets whose content changed are parsed again"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+        
+        file = request.files['file']
+        
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        
+        if not file.filename.lower().endswith(('.xlsx', '.xls')):
+            return jsonify({'error': 'Only Excel files are allowed'}), 400
+        
+        user, error = request_user(request.form.get('user_id'))
+        if error:
+            return error
+        
+        # Lock the file's row, so that concurrent replacements queue one at a time
+        excel_file = ExcelFile.query.filter_by(file_id=file_id, is_active=True).with_for_update().first()
+        if not excel_file:
+            return jsonify({'error': 'File not found'}), 404
+        if excel_file.user_id != user.id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        # Versions are built one at a time, each from the one before it
+        if UploadJob.query.filter_by(file_id=file_id, status='queued').count():
+            return jsonify({'error': 'A new version of this file is already being processed'}), 409
+        
+        version = (excel_file.version or 1) + 1
+        original_filename = file.filename
+        _, unique_filename, file_path = new_upload_path(original_filename, version_key(file_id, version))
+        
+        # Reserve the version before saving, so that no other request takes the same upload path and store
+        job = UploadJob(
+            job_id=generate_job_id(),
+            user_id=user.id,
+            file_id=file_id,
+            filename=unique_filename,
+            original_filename=original_filename,
+            file_path=file_path,
+            file_size=0,
+            version=version,
+            worker=current_worker()
+        )
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.job_id
+        
+        started = time.perf_counter()
+        timer = StageTimer()
+        try:
+            with timer.stage('save'):
+                file_size, content_hash = save_upload(file, file_path)
+        except Exception:
+            release_replace_job(job)
+            raise
+        timer.add('save', 0, file_size)
+        
+        if content_hash == excel_file.content_hash:
+            release_replace_job(job)
+            return jsonify({
+                'message': 'File is unchanged',
+                'file_id': file_id,
+                'version': excel_file.version or 1,
+                'status': 'unchanged'
+            }), 200
+        
+        job.file_size = file_size
+        job.content_hash = content_hash
+        with timer.stage('db_commit'):
+            db.session.commit()
+        
+        try:
+            with timer.stage('queue'):
+                queue_replace_job(job, excel_file)
+        except Exception as e:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            job.status = 'failed'
+            job.error = f'Failed to queue Excel file: {str(e)}'
+            db.session.commit()
+            raise
+        record_upload_stages(timer.as_dict())
+        
+        return jsonify({
+            'message': 'New version accepted for processing',
+            'job_id': job_id,
+            'file_id': file_id,
+            'version': version,
+            'filename': original_filename,
+            'status': 'queued'
+        }), 202
+        
+    except Exception as e:
+        logger.error(f"Replace file error: {e}")
+        return jsonify({'error': 'Failed to replace file'}), 500
+
+@app.route('/api/files/<file_id>/versions', methods=['GET'])
+def get_file_versions(file_id):
+    """Version history of a file, newest first"""
+    try:
+        excel_file = ExcelFile.query.filter_by(file_id=file_id).first()
+        if not excel_file:
+            return jsonify({'error': 'File not found'}), 404
+        error = check_owner(excel_file)
+        if error:
+            return error
+        
+        versions = FileVersion.query.filter_by(file_id=file_id).order_by(FileVersion.version.desc()).all()
+        if not versions:
+            versions = [initial_file_version(excel_file)]
+        
+        return jsonify({
+            'file_id': file_id,
+            'version': excel_file.version or 1,
+            'versions': [{
+                'version': version.version,
+                'filename': version.original_filename,
+                'file_size': version.file_size,
+                'content_hash': version.content_hash,
+                'sheet_count': version.sheet_count,
+                'sheets_reused': version.sheets_reused,
+                'parse_seconds': version.parse_seconds,
+                'uploaded_at': version.created_at.isoformat() if version.created_at else None
+            } for version in versions]
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Get file versions error: {e}")
+        return jsonify({'error': 'Failed to retrieve file versions'}), 500
 
 @app.route('/api/files/<file_id>', methods=['DELETE'])
 def delete_file(file_id):
@@ -589,13 +2240,20 @@ def delete_file(file_id):
         file = ExcelFile.query.filter_by(file_id=file_id).first()
         if not file:
             return jsonify({'error': 'File not found'}), 404
+        error = check_owner(file)
+        if error:
+            return error
         
-        # Delete physical file
-        if os.path.exists(file.file_path):
-            os.remove(file.file_path)
+        # Delete physical file and its column store unless another upload of the same content shares them
+        release_file_data(file)
+        remove_payloads(get_payload_dir(app.config['UPLOAD_FOLDER'], file.file_id))
+        invalidate_cached_payloads(file.file_id, file.version)
         
-        # Mark as inactive in database
+        # Mark as inactive in database and drop it from the owner's search dictionary
         file.is_active = False
+        file.deleted_at = datetime.utcnow()
+        SearchTerm.query.filter_by(file_id=file.file_id).delete()
+        ColumnProfile.query.filter_by(file_id=file.file_id).delete()
         db.session.commit()
         
         return jsonify({'message': 'File deleted successfully'}), 200
@@ -604,6 +2262,76 @@ def delete_file(file_id):
         logger.error(f"Delete file error: {e}")
         return jsonify({'error': 'Failed to delete file'}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Get the processing status of an uploaded file"""
+    try:
+        job = UploadJob.query.filter_by(job_id=job_id).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        # The summary carries preview rows, so only the uploader may see it
+        error = check_owner(job)
+        if error:
+            return error
+        
+        progress = None
+        if job.status != 'failed':
+            store_key = version_key(job.file_id, job.version) if job.version else job.file_id
+            progress = read_progress(os.path.join(get_store_dir(app.config['UPLOAD_FOLDER'], store_key), PROGRESS_NAME))
+        
+        status = job.status
+        if status == 'queued' and progress and progress['status'] != 'queued':
+            status = 'parsing'
+        sheets = progress['sheets'] if progress else []
+        
+        summary = None
+        if job.status == 'indexed':
+            excel_file = ExcelFile.query.filter_by(file_id=job.file_id, is_active=True).first()
+            if excel_file:
+                summary = file_summary(excel_file)
+        
+        return jsonify({
+            'job_id': job.job_id,
+            'file_id': job.file_id,
+            'version': job.version,
+            'filename': job.original_filename,
+            'status': status,
+            'error': job.error,
+            'created_at': job.created_at.isoformat(),
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+            'progress': {
+                'sheets_total': len(sheets),
+                'sheets_done': sum(1 for sheet in sheets if sheet['status'] == 'indexed'),
+                'sheets': sheets
+            },
+            'summary': summary
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Get job status error: {e}")
+        return jsonify({'error': 'Failed to retrieve job status'}), 500
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """File data cache counters, for sizing DATA_CACHE_BYTES"""
+    return jsonify(data_cache.stats()), 200
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, upload and database metrics of this process in the Prometheus text format"""
+    cache = data_cache.stats()
+    indexes = index_cache.stats()
+    body = metrics.render({
+        'data_cache_bytes': ('Bytes of file data responses cached in memory', cache['bytes']),
+        'data_cache_entries': ('File data responses cached in memory', cache['entries']),
+        'data_cache_hits': ('File data cache hits', cache['hits']),
+        'data_cache_misses': ('File data cache misses', cache['misses']),
+        'data_cache_evictions': ('File data cache evictions', cache['evictions']),
+        'search_index_cache_bytes': ('Bytes of sheet search indexes kept memory-mapped', indexes['bytes']),
+        'search_index_cache_entries': ('Sheet search indexes kept memory-mapped', indexes['entries']),
+    })
+    return app.response_class(body, status=200, mimetype='text/plain; version=0.0.4')
+
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -612,4 +2340,12 @@ def health_check():
 
 if __name__ == '__main__':
     init_db()
+    with app.app_context():
+        # Parse again the uploads a previous run accepted but did not finish
+        recover_upload_jobs()
+    if OUTBOX_SENDER:
+        # Pick up messages left in the outbox by a previous run
+        get_outbox_sender()
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        start_maintenance_scheduler()
     app.run(debug=True, host='0.0.0.0', port=5000)
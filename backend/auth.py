@@ -0,0 +1,113 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+
+TOKEN_SALT = 'auth-token'
+
+# The parts of a user record that authenticated endpoints need, safe to share between requests
+CachedUser = namedtuple('CachedUser', ['id', 'user_id', 'name', 'email', 'is_active', 'password_version'])
+
+
+def password_version(password_hash):
+    """Short digest of a password hash; tokens carry it so changing the password revokes them"""
+    return hashlib.sha256(password_hash.encode()).hexdigest()[:16]
+
+
+class TokenSigner:
+    """Issues and verifies signed, expiring session tokens without touching the database"""
+
+    def __init__(self, secret_key, max_age):
+        self.serializer = URLSafeTimedSerializer(secret_key, salt=TOKEN_SALT)
+        self.max_age = max_age
+
+    def issue(self, user):
+        return self.serializer.dumps({
+            'id': user.id,
+            'user_id': user.user_id,
+            'pv': password_version(user.password_hash),
+        })
+
+    def verify(self, token):
+        """The token's claims, or None if it is malformed, tampered with or expired"""
+        try:
+            return self.serializer.loads(token, max_age=self.max_age)
+        except BadSignature:
+            return None
+
+
+class UserCache:
+    """Per-process TTL cache of ``CachedUser`` records by database id.
+
+    Entries can also be found by public ``user_id``. At most ``max_entries``
+    are kept, evicting the least recently used; a TTL of 0 disables caching.
+    """
+
+    def __init__(self, ttl_seconds, max_entries):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.ids = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def _drop(self, id):
+        _, user = self.entries.pop(id)
+        if self.ids.get(user.user_id) == id:
+            del self.ids[user.user_id]
+
+    def get(self, id):
+        with self.lock:
+            entry = self.entries.get(id)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(id)
+            self.misses += 1
+            return None
+
+    def get_by_user_id(self, user_id):
+        with self.lock:
+            id = self.ids.get(user_id)
+        if id is None:
+            with self.lock:
+                self.misses += 1
+            return None
+        return self.get(id)
+
+    def put(self, user):
+        if self.ttl_seconds <= 0:
+            return
+        with self.lock:
+            if user.id in self.entries:
+                self._drop(user.id)
+            self.entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self.ids[user.user_id] = user.id
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+    def invalidate(self, id):
+        with self.lock:
+            if id in self.entries:
+                self._drop(id)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.ids.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,134 @@
+import argparse
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {name: float(np.percentile(values, q)) for name, q in (('p50', 50), ('p95', 95))}
+
+
+def workbook_bytes(seed):
+    buffer = io.BytesIO()
+    frame = pd.DataFrame({'Name': [f"item {seed} {i}" for i in range(50)], 'Value': range(50)})
+    with pd.ExcelWriter(buffer) as writer:
+        frame.to_excel(writer, index=False)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DB queries per request of user-scoped endpoints with and without login tokens')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--files', type=int, default=10, help='Files per user before the run')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    # Seed a throwaway SQLite database unless DATABASE_URL points somewhere else
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'uploads'))
+    os.environ.setdefault('OUTBOX_SENDER', 'false')
+    import app as appmod
+    from app import app, db, User, ExcelFile
+
+    # Baseline file list: the single user-and-files join the endpoint ran before it read users from the cache
+    @app.route('/bench/legacy-files/<user_id>')
+    def legacy_files(user_id):
+        rows = db.session.execute(
+            db.select(User.id, ExcelFile.file_id, ExcelFile.original_filename, ExcelFile.uploaded_at, ExcelFile.file_size)
+            .outerjoin(ExcelFile, db.and_(ExcelFile.user_id == User.id, ExcelFile.is_active == True))
+            .where(User.user_id == user_id)
+        ).all()
+        return {'files': [row.file_id for row in rows if row.file_id is not None]}
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    # Users log in once and own copies of one parsed workbook, so every upload is deduplicated rather than parsed
+    sample = workbook_bytes(0)
+    users = []
+    for n in range(args.users):
+        email = f"bench{n}.{time.time()}@example.com"
+        client.post('/api/auth/register', json={'email': email, 'password': 'bench', 'name': 'Bench'})
+        login = client.post('/api/auth/login', json={'email': email, 'password': 'bench'}).get_json()
+        users.append((login['user']['user_id'], login['token']))
+    job = client.post('/api/upload', data={'user_id': users[0][0], 'file': (io.BytesIO(sample), 'sample.xlsx')}).get_json()
+    while client.get(f"/api/jobs/{job['job_id']}", query_string={'user_id': users[0][0]}).get_json()['status'] not in ('indexed', 'failed'):
+        time.sleep(0.2)
+    for user_id, _ in users:
+        for i in range(args.files):
+            client.post('/api/upload', data={'user_id': user_id, 'file': (io.BytesIO(sample), f"f{i}.xlsx")})
+
+    queries = []
+    db_lock = threading.Lock()
+
+    def count_query(*_):
+        with db_lock:
+            queries.append(1)
+
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    # Mixed workload: mostly file listings, some searches across a user's files, some (deduplicated) uploads
+    mix = [('list', 0.6), ('search', 0.25), ('upload', 0.15)]
+
+    def request_for(kind, user_id, token, use_token, legacy):
+        headers = {'Authorization': f"Bearer {token}"} if use_token else {}
+        if kind == 'list':
+            path = f"/bench/legacy-files/{user_id}" if legacy else f"/api/files/{user_id}"
+            return client.get(path, headers=headers)
+        if kind == 'search':
+            return client.get(f"/api/users/{user_id}/search", query_string={'q': 'item'}, headers=headers)
+        data = {'file': (io.BytesIO(sample), 'sample.xlsx')}
+        if not use_token:
+            data['user_id'] = user_id
+        return client.post('/api/upload', data=data, headers=headers)
+
+    def run(name, use_token, cache_seconds, legacy=False):
+        appmod.user_cache.ttl_seconds = cache_seconds
+        appmod.user_cache.clear()
+        rng = random.Random(args.seed)
+        per_kind = {kind: {'latencies': [], 'queries': 0} for kind, _ in mix}
+        for _ in range(args.requests):
+            kind = rng.choices([kind for kind, _ in mix], [weight for _, weight in mix])[0]
+            user_id, token = rng.choice(users)
+            queries.clear()
+            begun = time.perf_counter()
+            response = request_for(kind, user_id, token, use_token, legacy)
+            elapsed = time.perf_counter() - begun
+            assert response.status_code < 300, (kind, response.status_code, response.get_json())
+            per_kind[kind]['latencies'].append(elapsed)
+            per_kind[kind]['queries'] += len(queries)
+            if kind == 'upload':
+                # Keep the file count steady so the modes see the same data
+                client.delete(f"/api/files/{response.get_json()['file_id']}", query_string={'user_id': user_id})
+        total_requests = sum(len(stats['latencies']) for stats in per_kind.values())
+        total_queries = sum(stats['queries'] for stats in per_kind.values())
+        columns = ' '.join(
+            f"{stats['queries'] / max(len(stats['latencies']), 1):>8.2f} {percentiles(stats['latencies'])['p50']:>7.1f}"
+            for stats in per_kind.values()
+        )
+        print(f"{name:<24} {total_queries / total_requests:>8.2f} {columns}")
+        return total_queries / total_requests
+
+    print(f"{args.users} users x {args.files} files, {args.requests} requests "
+          f"({', '.join(f'{int(weight * 100)}% {kind}' for kind, weight in mix)})")
+    print(f"{'mode':<24} {'q/req':>8} " + ' '.join(f"{kind[:6] + ' q':>8} {'p50 ms':>7}" for kind, _ in mix))
+    baseline = run('user_id, no cache', False, 0, legacy=True)
+    run('user_id + user cache', False, appmod.USER_CACHE_SECONDS or 60)
+    current = run('token + user cache', True, appmod.USER_CACHE_SECONDS or 60)
+    print(f"DB queries per request: {baseline:.2f} -> {current:.2f} ({(1 - current / baseline) * 100:.0f}% fewer)")
+    appmod.get_upload_executor().shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from cleaning import clean_frame
+
+
+def legacy_clean(df):
+    """The per-column cleaning loop upload_excel() used before cleaning.py"""
+    df_cleaned = df.copy()
+    df_cleaned.columns = [str(col).strip() for col in df_cleaned.columns]
+    for col in df_cleaned.columns:
+        try:
+            df_cleaned[col] = df_cleaned[col].astype(str)
+        except Exception:
+            df_cleaned[col] = df_cleaned[col].apply(lambda x: str(x) if pd.notna(x) else '')
+    df_cleaned = df_cleaned.replace(['nan', 'NaN', 'NAN', 'None', 'NULL', 'null', 'N/A', 'n/a'], '')
+    df_cleaned = df_cleaned.fillna('')
+    df_cleaned = df_cleaned.dropna(how='all')
+    return df_cleaned
+
+
+def make_sheet(rows, columns, seed=0):
+    """Synthetic raw sheet as read_excel returns it: mixed numeric, text, date and sparse columns"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for position in range(columns):
+        kind = position % 4
+        if kind == 0:
+            values = rng.integers(0, 100000, rows).astype(float)
+            values[rng.random(rows) < 0.05] = np.nan
+        elif kind == 1:
+            values = rng.random(rows) * 1000
+        elif kind == 2:
+            values = np.array(['item', 'N/A', 'region', '', 'null', 'value'], dtype=object)[rng.integers(0, 6, rows)]
+        else:
+            values = pd.date_range('2020-01-01', periods=rows, freq='min')
+        data[f"Column {position} "] = values
+    frame = pd.DataFrame(data)
+    # Every 50th row is blank, as in sheets with spacer rows
+    frame.iloc[::50] = np.nan
+    return frame
+
+
+def time_pipeline(clean, frame, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        clean(frame)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the legacy and vectorized sheet cleaning pipelines')
+    parser.add_argument('--tall-rows', type=int, default=1000000)
+    parser.add_argument('--wide-rows', type=int, default=20000)
+    parser.add_argument('--wide-columns', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    shapes = [
+        ('wide', args.wide_rows, args.wide_columns),
+        ('tall', args.tall_rows, 8),
+    ]
+    print(f"{'sheet':<6} {'shape':>14} {'legacy rows/s':>15} {'vectorized rows/s':>18} {'speedup':>8} {'rows kept':>16}")
+    for name, rows, columns in shapes:
+        frame = make_sheet(rows, columns)
+        legacy = time_pipeline(legacy_clean, frame, args.repeat)
+        vectorized = time_pipeline(clean_frame, frame, args.repeat)
+        kept = f"{len(legacy_clean(frame))} -> {len(clean_frame(frame))}"
+        print(f"{name:<6} {f'{rows}x{columns}':>14} {rows / legacy:>15,.0f} {rows / vectorized:>18,.0f} {legacy / vectorized:>7.1f}x {kept:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000
+    return {name: float(np.percentile(values, q)) for name, q in (('p50', 50), ('p95', 95), ('p99', 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test GET /api/files/<user_id> against a seeded database')
+    parser.add_argument('--files', type=int, default=10000, help='Files per user')
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--blob-bytes', type=int, default=20000, help='Size of the legacy sheets_data blob per file')
+    args = parser.parse_args()
+
+    # Seed a throwaway SQLite database unless DATABASE_URL points somewhere else
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ.setdefault('UPLOAD_FOLDER', os.path.join(workdir, 'uploads'))
+    from app import app, db, User, ExcelFile
+
+    with app.app_context():
+        db.create_all()
+        blob = '{"Sheet1": [' + ','.join(['{"a": 1}'] * (args.blob_bytes // 9)) + ']}'
+        user_ids = []
+        started = datetime.utcnow()
+        for n in range(args.users):
+            user = User(user_id=f"BENCH{n:04d}{int(time.time())}", name='Bench', email=f"bench{n}.{time.time()}@example.com",
+                        password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            user_ids.append(user.user_id)
+            db.session.execute(ExcelFile.__table__.insert(), [
+                {'file_id': f"{user.user_id}F{i:06d}", 'user_id': user.id, 'filename': f"f{i}.xlsx",
+                 'original_filename': f"f{i}.xlsx", 'file_path': f"/tmp/f{i}.xlsx", 'file_size': 1000 + i,
+                 'sheets_data': blob, 'uploaded_at': started - timedelta(seconds=i), 'is_active': i % 10 != 0}
+                for i in range(args.files)
+            ])
+        db.session.commit()
+
+    queries = []
+    db_lock = threading.Lock()
+
+    def count_query(*_):
+        with db_lock:
+            queries.append(1)
+
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', count_query)
+
+    def run(path_for):
+        latencies = []
+        lock = threading.Lock()
+        queries.clear()
+
+        def worker(count):
+            client = app.test_client()
+            for i in range(count):
+                path = path_for(i)
+                begun = time.perf_counter()
+                response = client.get(path)
+                elapsed = time.perf_counter() - begun
+                assert response.status_code == 200, response.status_code
+                with lock:
+                    latencies.append(elapsed)
+
+        per_thread = max(args.requests // args.threads, 1)
+        threads = [threading.Thread(target=worker, args=(per_thread,)) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, len(queries) / len(latencies)
+
+    # Baseline: the user lookup plus full ExcelFile entities, blob included, as the endpoint used to load them
+    @app.route('/bench/legacy-files/<user_id>')
+    def legacy_files(user_id):
+        user = User.query.filter_by(user_id=user_id).first()
+        files = ExcelFile.query.options(db.undefer(ExcelFile.sheets_data)).filter_by(user_id=user.id, is_active=True).all()
+        return {'files': [{'file_id': f.file_id, 'filename': f.original_filename,
+                           'uploaded_at': f.uploaded_at.isoformat(), 'file_size': f.file_size} for f in files]}
+
+    print(f"{args.users} users x {args.files:,} files, {args.requests} requests on {args.threads} threads")
+    print(f"{'endpoint':<10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, prefix in (('legacy', '/bench/legacy-files/'), ('current', '/api/files/')):
+        latencies, per_request = run(lambda i: f"{prefix}{user_ids[i % len(user_ids)]}")
+        stats = percentiles(latencies)
+        print(f"{name:<10} {stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f} {per_request:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from sheet_store import SheetWriter, SheetReader
+from profiling import profile_reader, write_profile
+from query_engine import run_query
+
+
+QUERIES = [
+    ('filter', {'filters': [{'column': 'Region', 'op': 'eq', 'value': 'EU'},
+                            {'column': 'Amount', 'op': 'gt', 'value': 1000}]}),
+    ('sum by region', {'group_by': ['Region'], 'aggregates': [{'func': 'sum', 'column': 'Amount'}]}),
+    ('top amounts', {'order_by': [{'column': 'Amount', 'desc': True}], 'limit': 10}),
+    ('contains', {'filters': [{'column': 'Customer', 'op': 'contains', 'value': 'cust49'}]}),
+    ('ruled out', {'filters': [{'column': 'Amount', 'op': 'gt', 'value': 10000}]}),
+]
+
+
+def make_sheet(sheet_dir, rows, seed=0):
+    """Write a synthetic sales sheet straight into the column store (no search index)"""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'Region': np.array(['EU', 'US', 'APAC', 'LATAM'], dtype=object)[rng.integers(0, 4, rows)],
+        'Amount': rng.random(rows) * 5000,
+        'Quantity': pd.array(rng.integers(0, 100, rows), dtype='Int64'),
+        'Date': pd.date_range('2020-01-01', periods=rows, freq='min'),
+        'Customer': np.array([f"cust{i % 5000}" for i in range(rows)], dtype=object),
+    })
+    writer = SheetWriter(sheet_dir)
+    writer.append(frame)
+    writer.close()
+    write_profile(sheet_dir, profile_reader(SheetReader(sheet_dir)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the query engine on a synthetic sheet')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as sheet_dir:
+        make_sheet(sheet_dir, args.rows)
+        print(f"{'query':<14} {'seconds':>8} {'matched':>10}")
+        for name, spec in QUERIES:
+            best = None
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = run_query(sheet_dir, spec)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{name:<14} {best:>8.3f} {result['matched_rows']:>10,}")
+
+
+if __name__ == "__main__":
+    main()
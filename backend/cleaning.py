@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+
+# Cell values treated as empty
+NULL_SENTINELS = ['', 'nan', 'NaN', 'NAN', 'None', 'NULL', 'null', 'N/A', 'n/a']
+
+# Largest integer a float64 holds exactly
+MAX_EXACT_FLOAT_INT = 2 ** 53
+
+
+def clean_column_names(columns):
+    """Strip column names and make them strings"""
+    return [str(column).strip() for column in columns]
+
+
+def normalize_nulls(frame):
+    """Replace null sentinel strings with NaN in a single pass over the text columns"""
+    text_columns = [name for name, dtype in frame.dtypes.items() if not pd.api.types.is_numeric_dtype(dtype)
+                    and not pd.api.types.is_datetime64_any_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)]
+    if not text_columns:
+        return frame
+    text = frame[text_columns]
+    frame[text_columns] = text.mask(text.isin(NULL_SENTINELS))
+    return frame
+
+
+def drop_empty_rows(frame):
+    """Remove rows where every cell is null"""
+    if frame.empty:
+        return frame
+    keep = frame.notna().to_numpy().any(axis=1)
+    if keep.all():
+        return frame.reset_index(drop=True)
+    return frame[keep].reset_index(drop=True)
+
+
+def narrow_boolean(frame):
+    """Store object columns holding only booleans (bools with blanks) as nullable booleans"""
+    for name, series in frame.items():
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) == 'boolean':
+            frame[name] = series.astype('boolean')
+    return frame
+
+
+def narrow_integral(frame):
+    """Store float columns holding only whole numbers (ints with blanks) as nullable ints"""
+    for name, series in frame.items():
+        if pd.api.types.is_float_dtype(series.dtype):
+            values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            if len(values) and np.all(values == np.trunc(values)) and np.abs(values).max() < MAX_EXACT_FLOAT_INT:
+                frame[name] = series.astype('Int64')
+    return frame
+
+
+def clean_frame(frame):
+    """Normalize a raw sheet DataFrame for storage.
+
+    Null sentinels become NaN, fully empty rows are dropped and object
+    columns are re-inferred so numbers, dates and booleans keep their types
+    when some cells are blank.
+    """
+    frame = frame.copy(deep=False)
+    frame.columns = clean_column_names(frame.columns)
+    frame = normalize_nulls(frame)
+    frame = drop_empty_rows(frame)
+    frame = frame.infer_objects()
+    frame = narrow_boolean(frame)
+    return narrow_integral(frame)
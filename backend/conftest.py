@@ -0,0 +1,50 @@
+import os
+import json
+import tempfile
+
+import pytest
+
+# test_excel.py is a command-line benchmark and workbook checker, not a pytest module
+collect_ignore = ['test_excel.py']
+
+# The app reads its configuration at import, so point it at a throwaway SQLite database and upload folder first
+_workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ['UPLOAD_FOLDER'] = os.path.join(_workdir, 'uploads')
+
+
+@pytest.fixture
+def client():
+    from app import app, db, user_cache
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    user_cache.clear()
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(client):
+    """Register a user and return ``(user_id, auth headers)``"""
+    def make(email='owner@example.com'):
+        client.post('/api/auth/register', json={'email': email, 'password': 'secret', 'name': 'Test'})
+        response = client.post('/api/auth/login', json={'email': email, 'password': 'secret'})
+        body = response.get_json()
+        return body['user']['user_id'], {'Authorization': f"Bearer {body['token']}"}
+    return make
+
+
+@pytest.fixture
+def make_file(client):
+    """Add a file stored the legacy way, as a sheets_data blob migrated into the column store on first read"""
+    def make(user_id, sheets):
+        from app import app, db, User, ExcelFile, generate_file_id
+        with app.app_context():
+            user = User.query.filter_by(user_id=user_id).first()
+            excel_file = ExcelFile(file_id=generate_file_id(), user_id=user.id, filename='book.xlsx',
+                                   original_filename='book.xlsx', file_path='/nonexistent/book.xlsx', file_size=1,
+                                   sheets_data=json.dumps(sheets))
+            db.session.add(excel_file)
+            db.session.commit()
+            return excel_file.file_id
+    return make
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+
+
+class DataCache:
+    """Byte-bounded LRU cache of serialized file payloads.
+
+    Entries are kept in memory up to ``max_bytes`` in total, evicting the
+    least recently used first. ``sizeof`` gives the bytes an entry counts
+    for, so the cache can also hold objects other than ``bytes``.
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def _store(self, key, payload):
+        if self.sizeof(payload) > self.max_bytes:
+            return
+        if key in self.entries:
+            self.size -= self.sizeof(self.entries.pop(key))
+        self.entries[key] = payload
+        self.size += self.sizeof(payload)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= self.sizeof(evicted)
+            self.evictions += 1
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return payload
+            self.misses += 1
+            return None
+
+    def put(self, key, payload):
+        with self.lock:
+            self._store(key, payload)
+
+    def invalidate(self, key):
+        with self.lock:
+            payload = self.entries.pop(key, None)
+            if payload is not None:
+                self.size -= self.sizeof(payload)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
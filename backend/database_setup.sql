@@ -24,11 +24,85 @@ CREATE TABLE IF NOT EXISTS excel_files (
     file_path VARCHAR NOT NULL,
     file_size INT NOT NULL,
     sheets_data TEXT,
+    storage_path VARCHAR(500),
+    file_format VARCHAR(10),
+    parse_engine VARCHAR(20),
+    parse_seconds FLOAT,
+    content_hash VARCHAR(64),
+    version INT DEFAULT 1,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     is_active BOOLEAN DEFAULT TRUE,
+    deleted_at TIMESTAMP NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     INDEX idx_user_id (user_id),
-    INDEX idx_file_id (file_id)
+    INDEX idx_excel_files_user_active (user_id, is_active),
+    INDEX idx_excel_files_active_deleted (is_active, deleted_at),
+    INDEX idx_file_id (file_id),
+    INDEX idx_content_hash (content_hash)
+);
+
+CREATE TABLE IF NOT EXISTS search_terms (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    file_id VARCHAR(50) NOT NULL,
+    term VARCHAR(100) NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_search_terms_user_term (user_id, term),
+    INDEX idx_search_terms_file_id (file_id)
+);
+
+CREATE TABLE IF NOT EXISTS column_profiles (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    file_id VARCHAR(50) NOT NULL,
+    sheet_name VARCHAR(255) NOT NULL,
+    sheet_position INT NOT NULL,
+    sheet_rows INT NOT NULL,
+    sheet_columns INT NOT NULL,
+    column_name VARCHAR(255) NOT NULL,
+    column_position INT NOT NULL,
+    column_type VARCHAR(20) NOT NULL,
+    null_count INT NOT NULL,
+    null_ratio FLOAT NOT NULL,
+    distinct_estimate INT NOT NULL,
+    min_value VARCHAR(255),
+    max_value VARCHAR(255),
+    INDEX idx_column_profiles_file_id (file_id)
+);
+
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    job_id VARCHAR(50) UNIQUE NOT NULL,
+    user_id INT NOT NULL,
+    file_id VARCHAR(50) NOT NULL,
+    filename VARCHAR(255) NOT NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    file_size INT NOT NULL,
+    content_hash VARCHAR(64),
+    version INT,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL,
+    worker VARCHAR(100),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_job_id (job_id),
+    INDEX idx_upload_jobs_file_status (file_id, status),
+    INDEX idx_upload_jobs_status_finished (status, finished_at)
+);
+
+CREATE TABLE IF NOT EXISTS file_versions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    file_id VARCHAR(50) NOT NULL,
+    version INT NOT NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    file_size INT NOT NULL,
+    content_hash VARCHAR(64),
+    sheet_count INT,
+    sheets_reused INT NOT NULL DEFAULT 0,
+    parse_seconds FLOAT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE INDEX idx_file_versions_file_version (file_id, version)
 );
 
 
@@ -40,7 +114,23 @@ CREATE TABLE IF NOT EXISTS password_resets (
     expires_at TIMESTAMP NOT NULL,
     is_used BOOLEAN DEFAULT FALSE,
     INDEX idx_email (email),
-    INDEX idx_token (token)
+    INDEX idx_token (token),
+    INDEX idx_password_resets_email_token_used (email, token, is_used),
+    INDEX idx_password_resets_expires_at (expires_at)
+);
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    to_email VARCHAR(120) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    next_attempt_at DATETIME NOT NULL,
+    sent_at DATETIME NULL,
+    INDEX idx_email_outbox_due (status, next_attempt_at)
 );
 
 
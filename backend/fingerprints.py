@@ -0,0 +1,163 @@
+import re
+import hashlib
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from readers import XLSX, XLS, sniff_format, engine_available, local_name, xlsx_sheet_parts
+
+
+FINGERPRINT_CHUNK_BYTES = 1024 * 1024
+
+# A shared-string cell up to the index of its string; quotes and namespace prefixes vary between writers.
+# Each pattern starts with a literal and checks the preceding whitespace afterwards, which lets the
+# regex engine skip ahead to candidate matches instead of trying every position of a large part.
+SHARED_STRING_ATTRIBUTE = re.compile(rb'''t=(?<=\st=)["']s["']''')
+SHARED_STRING_CELL = re.compile(rb'''(t=(?<=\st=)["']s["'][^>]*>\s*<(?:\w+:)?v>\s*)(\d+)''')
+# The style index of a cell (or row)
+STYLE_INDEX = re.compile(rb'''(s=(?<=\ss=)["'])(\d+)''')
+TOKEN_DTYPE = 'S20'
+
+
+def token(data):
+    """Fixed-width stand-in for a shared string or number format in a sheet's fingerprint"""
+    return hashlib.sha1(data).digest()
+
+
+def xlsx_date_system(archive):
+    """The workbook's date1904 flag, which changes how every date cell is read"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    for element in workbook.iter():
+        if local_name(element.tag) == 'workbookPr':
+            return element.get('date1904', '').encode()
+    return b''
+
+
+def xlsx_shared_strings(archive):
+    """Tokens of the shared string table items, by index"""
+    strings = []
+    if 'xl/sharedStrings.xml' in archive.namelist():
+        with archive.open('xl/sharedStrings.xml') as f:
+            for _, element in ET.iterparse(f):
+                if local_name(element.tag) == 'si':
+                    strings.append(token(ET.tostring(element)))
+                    element.clear()
+    return np.array(strings, dtype=TOKEN_DTYPE)
+
+
+def xlsx_number_formats(archive):
+    """Tokens of the number format of each cell style, the only part of styling that changes how a cell is read.
+
+    A final extra token stands for style indexes past the end of the table.
+    """
+    formats = []
+    if 'xl/styles.xml' in archive.namelist():
+        styles = ET.fromstring(archive.read('xl/styles.xml'))
+        codes = {element.get('numFmtId'): element.get('formatCode') for element in styles.iter() if local_name(element.tag) == 'numFmt'}
+        for element in styles.iter():
+            if local_name(element.tag) == 'cellXfs':
+                for style in element:
+                    format_id = style.get('numFmtId', '0')
+                    formats.append(token((codes.get(format_id) or f"builtin {format_id}").encode('utf-8')))
+    formats.append(token(b'default'))
+    return np.array(formats, dtype=TOKEN_DTYPE)
+
+
+def indexes(values):
+    return np.array(values, dtype=np.bytes_).astype(np.int64) if values else np.zeros(0, dtype=np.int64)
+
+
+def xlsx_sheet_fingerprint(archive, part, date_system, shared_strings, number_formats):
+    """Hash of a worksheet part with its shared string and style indexes resolved, or None if they cannot be.
+
+    Writers such as openpyxl rebuild the shared string table and styles on
+    every save, shifting the indexes of sheets that did not change, so the
+    indexes are cut out of the XML and the tokens of what they point to are
+    hashed alongside it instead.
+    """
+    # Separate running digests, so where the chunks happen to split does not change the result
+    xml_digest, string_digest, style_digest = hashlib.sha256(date_system), hashlib.sha256(), hashlib.sha256()
+    pending = b''
+    with archive.open(part) as f:
+        for chunk in iter(lambda: f.read(FINGERPRINT_CHUNK_BYTES), b''):
+            data = pending + chunk
+            # Resolve only whole cells; the tail after the last closing tag waits for the next chunk
+            end = data.rfind(b'c>') + 2 if b'c>' in data else 0
+            region = data[:end]
+            string_cells = SHARED_STRING_CELL.findall(region)
+            if len(string_cells) != len(SHARED_STRING_ATTRIBUTE.findall(region)):
+                return None
+            string_indexes = indexes([index for _, index in string_cells])
+            if len(string_indexes) and string_indexes.max() >= len(shared_strings):
+                return None
+            region = SHARED_STRING_CELL.sub(rb'\1', region)
+            style_indexes = np.minimum(indexes([index for _, index in STYLE_INDEX.findall(region)]), len(number_formats) - 1)
+            xml_digest.update(STYLE_INDEX.sub(rb'\1', region))
+            string_digest.update(shared_strings[string_indexes].tobytes())
+            style_digest.update(number_formats[style_indexes].tobytes())
+            pending = data[end:]
+    xml_digest.update(pending)
+    return hashlib.sha256(xml_digest.digest() + string_digest.digest() + style_digest.digest()).hexdigest()
+
+
+def xlsx_fingerprints(file_path):
+    with zipfile.ZipFile(file_path) as archive:
+        date_system = xlsx_date_system(archive)
+        shared_strings = xlsx_shared_strings(archive)
+        number_formats = xlsx_number_formats(archive)
+        names = set(archive.namelist())
+        return {
+            name: xlsx_sheet_fingerprint(archive, part, date_system, shared_strings, number_formats) if part in names else None
+            for name, part in xlsx_sheet_parts(archive)
+        }
+
+
+def xls_fingerprints(file_path):
+    """Hash of each sheet's row stream, read without the cleaning and storing a full parse does.
+
+    Each reader renders cells differently, so the digest is seeded with the
+    reader's name and fingerprints from different readers never match.
+    """
+    fingerprints = {}
+    if engine_available('calamine'):
+        from python_calamine import CalamineWorkbook
+        workbook = CalamineWorkbook.from_path(file_path)
+        try:
+            for name in workbook.sheet_names:
+                digest = hashlib.sha256(b'calamine')
+                for row in workbook.get_sheet_by_name(name).iter_rows():
+                    digest.update(repr(row).encode('utf-8'))
+                fingerprints[name] = digest.hexdigest()
+        finally:
+            workbook.close()
+        return fingerprints
+
+    import xlrd
+    workbook = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        for name in workbook.sheet_names():
+            sheet = workbook.sheet_by_name(name)
+            digest = hashlib.sha256(f"xlrd{workbook.datemode}".encode())
+            for row_number in range(sheet.nrows):
+                digest.update(repr((sheet.row_types(row_number), sheet.row_values(row_number))).encode('utf-8'))
+            fingerprints[name] = digest.hexdigest()
+            workbook.unload_sheet(name)
+    finally:
+        workbook.release_resources()
+    return fingerprints
+
+
+def sheet_fingerprints(file_path):
+    """``{sheet name: fingerprint}`` identifying each sheet's content, without parsing the workbook.
+
+    Sheets of an .xlsx are fingerprinted from their raw XML part, sheets of
+    an .xls from their row stream. A sheet whose fingerprint is None (or a
+    format without fingerprints) must always be parsed.
+    """
+    file_format = sniff_format(file_path)
+    if file_format == XLSX:
+        return xlsx_fingerprints(file_path)
+    if file_format == XLS:
+        return xls_fingerprints(file_path)
+    return {}
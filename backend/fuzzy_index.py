@@ -0,0 +1,271 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from storage import get_sheet_dir, write_json_atomic, read_json, read_manifest
+from search_index import TOKEN_PATTERN
+from sheet_store import STRING, SheetReader
+
+
+FUZZY_VALUES_NAME = 'fuzzy.json'
+FUZZY_ARRAYS_NAME = 'fuzzy.npz'
+FUZZY_FORMAT = 2  # 2 adds each word of a multi-word value
+FUZZY_BATCH_ROWS = 100000
+MAX_FUZZY_LENGTH = 64  # Longer cell values are left to the word index
+MAX_CANDIDATES = 200   # Values ranked by edit distance per query
+DEFAULT_MIN_SCORE = 0.6
+
+
+def normalize_value(value):
+    """Lowercase a cell value and drop spaces and punctuation, so "ACME  Corp." matches "acme corp" """
+    return ''.join(TOKEN_PATTERN.findall(str(value).lower()))
+
+
+def value_terms(value):
+    """Normalized terms a cell is found by: the whole value and, for several words, each word on its own"""
+    words = TOKEN_PATTERN.findall(str(value).lower())
+    terms = [''.join(words)] + (words if len(words) > 1 else [])
+    return [term for term in dict.fromkeys(terms) if term and len(term) <= MAX_FUZZY_LENGTH]
+
+
+def trigrams(text):
+    """Distinct three-character windows of a normalized value, padded so short values have some"""
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def levenshtein(a, b):
+    """Edit distance between two strings using Myers' bit-parallel algorithm"""
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    peq = {}
+    for position, char in enumerate(b):
+        peq[char] = peq.get(char, 0) | (1 << position)
+    mask = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    pv, mv, distance = mask, 0, len(b)
+    for char in a:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & mask) ^ pv) | eq
+        ph = (mv | ~(xh | pv)) & mask
+        mh = pv & xh
+        if ph & last:
+            distance += 1
+        elif mh & last:
+            distance -= 1
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv
+    return distance
+
+
+def value_trigram_pairs(values, batch_values=FUZZY_BATCH_ROWS):
+    """Every (trigram, value id) pair of a list of normalized values, computed a batch at a time.
+
+    Characters are numbered within ``alphabet`` so a trigram packs into one
+    integer key; pairs may repeat when a value contains a trigram twice.
+    """
+    alphabet = [' '] + sorted(set(''.join(values)) - {' '})
+    lookup = np.zeros(max(map(ord, alphabet)) + 1, dtype=np.int64)
+    lookup[[ord(char) for char in alphabet]] = np.arange(len(alphabet))
+    width = np.int64(len(alphabet))
+    keys = []
+    ids = []
+    for start in range(0, len(values), batch_values):
+        batch = values[start:start + batch_values]
+        # Padded fixed-width unicode, one row of code points per value
+        codes = np.array([f" {text} " for text in batch], dtype=f"U{MAX_FUZZY_LENGTH + 2}")
+        codes = lookup[codes.view(np.uint32).reshape(len(batch), -1)]
+        lengths = np.fromiter(map(len, batch), dtype=np.int64, count=len(batch)) + 2
+        windows = codes[:, :-2] * width * width + codes[:, 1:-1] * width + codes[:, 2:]
+        valid = np.arange(windows.shape[1]) < (lengths - 2)[:, None]
+        keys.append(windows[valid])
+        ids.append(np.nonzero(valid)[0] + start)
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), alphabet
+    return np.concatenate(keys), np.concatenate(ids), alphabet
+
+
+def build_fuzzy_index(sheet_dir):
+    """Write the trigram index over the distinct normalized text values and words of a stored sheet.
+
+    Values are kept in first-seen order with the cells holding each one
+    (``row * column_count + column``) and, per trigram, the values
+    containing it, both as offset/position arrays. A cell of several words
+    is listed under the whole value and under each word, so "alice" finds
+    "Alice Smith".
+    """
+    reader = SheetReader(sheet_dir)
+    column_count = max(len(reader.columns), 1)
+    value_ids = {}
+    cell_values = []
+    cell_positions = []
+    for position, name in enumerate(reader.columns):
+        if reader.kinds[name] != STRING:
+            continue
+        for start in range(0, reader.row_count, FUZZY_BATCH_ROWS):
+            codes, uniques = pd.factorize(reader.column(name, start, start + FUZZY_BATCH_ROWS))
+            pair_codes = []
+            pair_ids = []
+            for code, raw in enumerate(uniques):
+                for text in value_terms(raw):
+                    pair_codes.append(code)
+                    pair_ids.append(value_ids.setdefault(text, len(value_ids)))
+            if not pair_codes:
+                continue
+            # Rows grouped by code (nulls, code -1, sort first), expanded to one cell per (code, value) pair
+            present = codes >= 0
+            by_code = np.argsort(codes, kind='stable')[np.count_nonzero(~present):]
+            code_starts = np.concatenate([[0], np.cumsum(np.bincount(codes[present], minlength=len(uniques)))])
+            pair_codes = np.array(pair_codes, dtype=np.int64)
+            lengths = code_starts[pair_codes + 1] - code_starts[pair_codes]
+            firsts = np.repeat(code_starts[pair_codes] - np.cumsum(lengths) + lengths, lengths)
+            rows = by_code[firsts + np.arange(len(firsts))]
+            cell_values.append(np.repeat(np.array(pair_ids, dtype=np.int64), lengths))
+            cell_positions.append((rows + start) * column_count + position)
+
+    values = list(value_ids)
+    cell_values = np.concatenate(cell_values) if cell_values else np.zeros(0, dtype=np.int64)
+    cell_positions = np.concatenate(cell_positions) if cell_positions else np.zeros(0, dtype=np.int64)
+    cell_order = np.argsort(cell_values, kind='stable')
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(cell_values, minlength=len(values)))])
+
+    pair_keys, pair_values, alphabet = value_trigram_pairs(values)
+    width = len(alphabet)
+    # Sorting by (trigram, value) groups each trigram's postings and exposes repeats within a value
+    order = np.lexsort((pair_values, pair_keys))
+    pair_keys, pair_values = pair_keys[order], pair_values[order]
+    keep = np.ones(len(pair_keys), dtype=bool)
+    keep[1:] = (pair_keys[1:] != pair_keys[:-1]) | (pair_values[1:] != pair_values[:-1])
+    pair_keys, pair_values = pair_keys[keep], pair_values[keep]
+    trigram_keys, pair_trigrams = np.unique(pair_keys, return_inverse=True)
+    trigram_offsets = np.concatenate([[0], np.cumsum(np.bincount(pair_trigrams, minlength=len(trigram_keys)))])
+    trigram_counts = np.bincount(pair_values, minlength=len(values)).astype(np.int32)
+    trigram_list = [
+        alphabet[key // (width * width)] + alphabet[key // width % width] + alphabet[key % width]
+        for key in trigram_keys.tolist()
+    ]
+
+    arrays_path = os.path.join(sheet_dir, FUZZY_ARRAYS_NAME)
+    with open(f"{arrays_path}.tmp", 'wb') as f:
+        np.savez(
+            f,
+            offsets=offsets.astype(np.int64),
+            cells=cell_positions[cell_order].astype(np.int64),
+            trigram_offsets=trigram_offsets.astype(np.int64),
+            trigram_values=pair_values.astype(np.int32),
+            trigram_counts=trigram_counts,
+        )
+    os.replace(f"{arrays_path}.tmp", arrays_path)
+    write_json_atomic(os.path.join(sheet_dir, FUZZY_VALUES_NAME), {
+        'format': FUZZY_FORMAT,
+        'columns': reader.columns,
+        'values': values,
+        'trigrams': trigram_list,
+    })
+
+
+@lru_cache(maxsize=16)
+def _load_fuzzy_index(path, mtime):
+    index = read_json(path)
+    index['trigram_ids'] = {gram: i for i, gram in enumerate(index.pop('trigrams'))}
+    with np.load(os.path.join(os.path.dirname(path), FUZZY_ARRAYS_NAME)) as arrays:
+        index.update({name: arrays[name] for name in arrays.files})
+    return index
+
+
+def load_fuzzy_index(sheet_dir):
+    """Return a sheet's fuzzy index, building it for sheets stored before fuzzy search or its current format"""
+    path = os.path.join(sheet_dir, FUZZY_VALUES_NAME)
+    if not os.path.exists(path):
+        build_fuzzy_index(sheet_dir)
+    index = _load_fuzzy_index(path, os.path.getmtime(path))
+    if index.get('format') != FUZZY_FORMAT:
+        build_fuzzy_index(sheet_dir)
+        index = _load_fuzzy_index(path, os.path.getmtime(path))
+    return index
+
+
+def column_value_mask(index, column_number):
+    """Boolean mask of the value ids with at least one cell in a column"""
+    column_count = max(len(index['columns']), 1)
+    counts = np.diff(index['offsets'])
+    in_column = index['cells'] % column_count == column_number
+    mask = np.zeros(len(index['values']), dtype=bool)
+    mask[np.repeat(np.arange(len(counts)), counts)[in_column]] = True
+    return mask
+
+
+def fuzzy_candidates(index, query, min_score=DEFAULT_MIN_SCORE, allowed=None):
+    """Return ``[(score, value_id)]`` for indexed values close to the query, best first.
+
+    Values sharing the most trigrams with the query are shortlisted with a
+    vectorized count, and only that shortlist is ranked by edit distance.
+    ``allowed`` (a mask over value ids) narrows the values before the
+    shortlist is cut, so a column filter does not lose its best matches.
+    """
+    text = normalize_value(query)
+    if not text:
+        return []
+    grams = [index['trigram_ids'][gram] for gram in trigrams(text) if gram in index['trigram_ids']]
+    if not grams:
+        return []
+    offsets = index['trigram_offsets']
+    hits = np.concatenate([index['trigram_values'][offsets[g]:offsets[g + 1]] for g in grams])
+    counts = np.bincount(hits, minlength=len(index['values']))
+    candidates = np.flatnonzero(counts)
+    if allowed is not None:
+        candidates = candidates[allowed[candidates]]
+    shared = counts[candidates]
+    similarity = shared / (len(trigrams(text)) + index['trigram_counts'][candidates] - shared)
+    if len(candidates) > MAX_CANDIDATES:
+        keep = np.argpartition(-similarity, MAX_CANDIDATES)[:MAX_CANDIDATES]
+        candidates = candidates[keep]
+
+    ranked = []
+    for value_id in candidates.tolist():
+        value = index['values'][value_id]
+        score = 1 - levenshtein(text, value) / max(len(text), len(value))
+        if score >= min_score:
+            ranked.append((score, value_id))
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+    return ranked
+
+
+def fuzzy_search_file(store_dir, query, sheet=None, column=None, min_score=DEFAULT_MIN_SCORE):
+    """Rows holding a value close to the query, as ``(score, sheet, row, columns, value)`` best first"""
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return []
+    hits = []
+    for entry in manifest['sheets']:
+        if sheet is not None and entry['name'] != sheet:
+            continue
+        index = load_fuzzy_index(get_sheet_dir(store_dir, entry['key']))
+        columns = index['columns']
+        if column is not None and column not in columns:
+            continue
+        column_count = max(len(columns), 1)
+        allowed = column_value_mask(index, columns.index(column)) if column is not None else None
+        rows = {}
+        for score, value_id in fuzzy_candidates(index, query, min_score, allowed):
+            cells = index['cells'][index['offsets'][value_id]:index['offsets'][value_id + 1]]
+            for row_number, column_number in zip(*np.divmod(cells, column_count)):
+                name = columns[column_number]
+                if column is not None and name != column:
+                    continue
+                best = rows.get(int(row_number))
+                if best is None:
+                    rows[int(row_number)] = [score, [name], index['values'][value_id]]
+                elif score == best[0] and name not in best[1]:
+                    best[1].append(name)
+        for row_number, (score, matched_columns, value) in rows.items():
+            hits.append((score, entry['name'], row_number, matched_columns, value))
+    hits.sort(key=lambda hit: -hit[0])
+    return hits
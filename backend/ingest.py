@@ -0,0 +1,266 @@
+import os
+import json
+import time
+import shutil
+import logging
+
+import pandas as pd
+
+from readers import sniff_format, select_engines, open_workbook, sheet_outline, largest_sheet_cells
+from cleaning import clean_frame
+from sheet_store import STORE_FORMAT, SheetBuilder, sheet_entry
+from storage import get_sheet_dir, sheet_key_for, write_json_atomic, write_manifest, read_manifest, remove_store, link_tree
+from payloads import write_file_payloads, remove_payloads, available_encodings, payload_path
+from fuzzy_index import build_fuzzy_index
+from fingerprints import sheet_fingerprints
+from metrics import StageTimer
+
+logger = logging.getLogger(__name__)
+
+
+PROGRESS_NAME = 'progress.json'
+# Holds one empty file per sheet position a reader is waiting for, parsed ahead of workbook order
+REQUESTED_NAME = 'requested'
+DEFAULT_CHUNK_ROWS = 10000
+
+
+def init_worker():
+    """Configure logging in upload worker processes"""
+    logging.basicConfig(level=logging.INFO)
+
+
+def write_progress(progress_path, progress):
+    if progress_path:
+        write_json_atomic(progress_path, progress)
+
+
+def read_progress(progress_path):
+    if not os.path.exists(progress_path):
+        return None
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def request_sheet(store_dir, position):
+    """Ask the worker ingesting a store to parse the sheet at ``position`` next"""
+    requested_dir = os.path.join(store_dir, REQUESTED_NAME)
+    os.makedirs(requested_dir, exist_ok=True)
+    with open(os.path.join(requested_dir, str(position)), 'a'):
+        pass
+
+
+def next_sheet(store_dir, pending):
+    """The pending sheet position to parse next: the earliest requested one, else the first in the workbook"""
+    requested_dir = os.path.join(store_dir, REQUESTED_NAME)
+    if os.path.isdir(requested_dir):
+        requested = []
+        for name in os.listdir(requested_dir):
+            path = os.path.join(requested_dir, name)
+            if name.isdigit() and int(name) in pending:
+                requested.append((os.path.getmtime(path), int(name)))
+        if requested:
+            return min(requested)[1]
+    return pending[0]
+
+
+def ingest_with_engine(file_path, engine, store_dir, progress, progress_path, chunk_rows, timer,
+                       reused_sheets=None, fingerprints=None, outline=None):
+    """Stream every sheet of a workbook through one reader engine into the column store, timing each stage.
+
+    Sheets named in ``reused_sheets`` (name -> source sheet directory and
+    manifest entry) are hard-linked from an earlier store instead of read.
+    Sheets requested through ``request_sheet`` are parsed first; each sheet
+    can be read from the store as soon as its progress has a ``key``.
+    """
+    reused_sheets = reused_sheets or {}
+    with timer.stage('open'):
+        reader = open_workbook(file_path, engine)
+    try:
+        outline = {sheet['name']: sheet for sheet in outline or []}
+        progress['sheets'] = [
+            dict(outline.get(sheet_name, {}), name=sheet_name, status='queued', rows=None)
+            for sheet_name in reader.sheet_names
+        ]
+        write_progress(progress_path, progress)
+        
+        entries = {}
+        pending = list(range(len(reader.sheet_names)))
+        while pending:
+            position = next_sheet(store_dir, pending)
+            pending.remove(position)
+            sheet_name = reader.sheet_names[position]
+            sheet_key = sheet_key_for(position)
+            sheet_progress = progress['sheets'][position]
+            sheet_dir = get_sheet_dir(store_dir, sheet_key)
+            
+            if sheet_name in reused_sheets:
+                source_dir, previous_entry = reused_sheets[sheet_name]
+                with timer.stage('reuse'):
+                    link_tree(source_dir, sheet_dir)
+                entry = dict(previous_entry, name=sheet_name, key=sheet_key)
+                sheet_progress['reused'] = True
+            else:
+                sheet_progress.update({'status': 'parsing', 'rows': 0})
+                write_progress(progress_path, progress)
+                
+                builder = SheetBuilder(sheet_dir)
+                for chunk in timer.iterate('read', reader.iter_chunks(sheet_name, chunk_rows)):
+                    try:
+                        with timer.stage('clean'):
+                            cleaned = clean_frame(chunk)
+                    except Exception as sheet_error:
+                        logger.error(f"Error processing sheet {sheet_name}: {sheet_error}")
+                        # If a sheet fails, create an empty sheet
+                        shutil.rmtree(sheet_dir, ignore_errors=True)
+                        builder = SheetBuilder(sheet_dir)
+                        builder.append(pd.DataFrame())
+                        break
+                    with timer.stage('store'):
+                        builder.append(cleaned)
+                    sheet_progress['rows'] = builder.row_count
+                    write_progress(progress_path, progress)
+                
+                with timer.stage('store'):
+                    entry = sheet_entry(sheet_name, sheet_key, builder.close())
+                with timer.stage('fuzzy_index'):
+                    build_fuzzy_index(sheet_dir)
+            
+            if fingerprints is not None:
+                entry['fingerprint'] = fingerprints.get(sheet_name)
+            entries[position] = entry
+            sheet_progress.update({'status': 'indexed', 'rows': entry['row_count'], 'key': sheet_key})
+            write_progress(progress_path, progress)
+        
+        manifest = {'format': STORE_FORMAT, 'sheets': [entries[position] for position in sorted(entries)]}
+        write_manifest(store_dir, manifest)
+        shutil.rmtree(os.path.join(store_dir, REQUESTED_NAME), ignore_errors=True)
+        return manifest
+    finally:
+        reader.close()
+
+
+def estimate_sheets(file_path):
+    """Sheet size estimates of a workbook whose upload did not record them, or none if they cannot be read"""
+    try:
+        return sheet_outline(file_path)
+    except Exception:
+        return []
+
+
+def ingest_workbook(file_path, store_dir, progress_path=None, chunk_rows=DEFAULT_CHUNK_ROWS, reused_sheets=None,
+                    fingerprints=None):
+    """Parse a workbook into its column store, reporting per-sheet progress.
+
+    The file signature and the size of the largest sheet pick an engine up
+    front, with at most one fallback, and sheets are read and written in
+    ``chunk_rows`` chunks. calamine is fastest but holds each sheet's cells
+    while it is read, so workbooks with a sheet past ``CALAMINE_MAX_CELLS``
+    are streamed with openpyxl, whose memory does not grow with sheet size. Runs in an upload worker process, so it only touches the
+    filesystem and returns what the caller should record in the database,
+    including every engine attempt and the seconds spent per stage.
+    """
+    file_format = sniff_format(file_path)
+    # Sheets listed (with size estimates) by the structural pass made when the file was uploaded
+    initial_progress = read_progress(progress_path) if progress_path else None
+    outline = initial_progress['sheets'] if initial_progress else []
+    
+    engines = select_engines(file_format, largest_sheet_cells(outline or estimate_sheets(file_path)))
+    if not engines:
+        raise Exception(f"Unsupported file format: {file_format}")
+    
+    error_messages = []
+    attempts = []
+    for engine in engines:
+        progress = {'status': 'parsing', 'engine': engine, 'sheets': outline}
+        write_progress(progress_path, progress)
+        timer = StageTimer()
+        started = time.perf_counter()
+        try:
+            manifest = ingest_with_engine(file_path, engine, store_dir, progress, progress_path, chunk_rows, timer,
+                                          reused_sheets, fingerprints, outline)
+        except Exception as e:
+            attempts.append({'engine': engine, 'seconds': time.perf_counter() - started, 'ok': False})
+            error_messages.append(f"{engine}: {str(e)}")
+            logger.warning(f"Reading {file_format} file with {engine} failed: {e}")
+            remove_store(store_dir)
+            continue
+        
+        parse_seconds = time.perf_counter() - started
+        attempts.append({'engine': engine, 'seconds': parse_seconds, 'ok': True})
+        logger.info(f"Successfully read Excel file with {engine} engine in {parse_seconds:.2f}s")
+        progress['status'] = 'indexed'
+        write_progress(progress_path, progress)
+        return {
+            'manifest': manifest,
+            'format': file_format,
+            'engine': engine,
+            'parse_seconds': parse_seconds,
+            'attempts': attempts,
+            'stages': timer.as_dict(),
+            'reused_sheets': [entry['name'] for entry in manifest['sheets'] if entry['name'] in (reused_sheets or {})]
+        }
+    
+    raise Exception(f"All methods failed. Errors: {'; '.join(error_messages)}")
+
+
+def precompute_payloads(result, store_dir, payload_dir, file_id, filename, previous_payload_dir=None, previous_names=None):
+    """Serialize and compress a parsed file's full data response, adding those stages to ``result``"""
+    timer = StageTimer()
+    try:
+        size = write_file_payloads(payload_dir, file_id, filename, store_dir, result['manifest'],
+                                   previous_payload_dir, previous_names, timer)
+        timer.add('serialize', 0, size)
+        timer.add('compress', 0, sum(os.path.getsize(payload_path(payload_dir, encoding)) for encoding in available_encodings()))
+    except Exception as e:
+        # The response is rebuilt on first read, so a failure here does not fail the upload
+        logger.warning(f"Precomputing the data response of {file_id} failed: {e}")
+        remove_payloads(payload_dir)
+    result['stages'].update(timer.as_dict())
+
+
+def ingest_upload(file_path, store_dir, progress_path, chunk_rows, payload_dir, file_id, filename):
+    """Parse an uploaded workbook, then precompute its full data response and encodings"""
+    result = ingest_workbook(file_path, store_dir, progress_path, chunk_rows)
+    precompute_payloads(result, store_dir, payload_dir, file_id, filename)
+    return result
+
+
+def reusable_sheets(previous_store_dir, previous_file_path):
+    """``{fingerprint: (sheet directory, manifest entry)}`` of a file's current store.
+
+    Stores built before fingerprints were recorded have their original
+    upload fingerprinted instead.
+    """
+    manifest = read_manifest(previous_store_dir)
+    if manifest is None or manifest.get('format') != STORE_FORMAT:
+        return {}
+    entries = manifest['sheets']
+    if any(entry.get('fingerprint') is None for entry in entries) and os.path.exists(previous_file_path):
+        upload_fingerprints = sheet_fingerprints(previous_file_path)
+        entries = [dict(entry, fingerprint=entry.get('fingerprint') or upload_fingerprints.get(entry['name'])) for entry in entries]
+    return {
+        entry['fingerprint']: (get_sheet_dir(previous_store_dir, entry['key']), entry)
+        for entry in entries if entry.get('fingerprint')
+    }
+
+
+def ingest_replacement(file_path, store_dir, progress_path, chunk_rows, payload_dir, file_id, filename,
+                       previous_store_dir, previous_file_path, previous_payload_dir):
+    """Parse a new version of a workbook, re-ingesting only the sheets whose content changed.
+
+    Each sheet is fingerprinted from the raw file and matched against the
+    current version's sheets; matches are hard-linked into the new store,
+    so only changed or added sheets are read, cleaned and indexed, and the
+    serialized rows of matches are cut from the current data response.
+    The fingerprints are kept in the new manifest for the next replacement.
+    """
+    timer = StageTimer()
+    with timer.stage('fingerprint'):
+        fingerprints = sheet_fingerprints(file_path)
+        reusable = reusable_sheets(previous_store_dir, previous_file_path)
+    reused_sheets = {name: reusable[fingerprint] for name, fingerprint in fingerprints.items() if fingerprint in reusable}
+    result = ingest_workbook(file_path, store_dir, progress_path, chunk_rows, reused_sheets, fingerprints)
+    result['stages'].update(timer.as_dict())
+    previous_names = {name: reused_sheets[name][1]['name'] for name in result['reused_sheets']}
+    precompute_payloads(result, store_dir, payload_dir, file_id, filename, previous_payload_dir, previous_names)
+    return result
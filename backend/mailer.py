@@ -0,0 +1,136 @@
+import os
+import time
+import random
+import smtplib
+import logging
+import threading
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+
+logger = logging.getLogger(__name__)
+
+
+PLACEHOLDER_USERNAME = 'your-email@gmail.com'
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+
+
+def smtp_settings():
+    """SMTP settings from the environment; SMTP_USE_TLS=false allows a plain local server for testing"""
+    return {
+        'server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.getenv('SMTP_PORT', 587)),
+        'username': os.getenv('SMTP_USERNAME'),
+        'password': os.getenv('SMTP_PASSWORD'),
+        'use_tls': os.getenv('SMTP_USE_TLS', 'true').lower() == 'true',
+        'timeout': float(os.getenv('SMTP_TIMEOUT', 30)),
+        'idle_seconds': float(os.getenv('SMTP_IDLE_SECONDS', 60)),
+    }
+
+
+def smtp_configured(settings):
+    """Whether a sender address is set; without a password the server is used without logging in"""
+    return bool(settings['username']) and settings['username'] != PLACEHOLDER_USERNAME
+
+
+def build_message(from_email, to_email, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_string()
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a message that has failed ``attempts`` times: exponential with jitter"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class SMTPConnection:
+    """One authenticated SMTP connection, kept open across messages and reopened when it drops or idles out"""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.server = None
+        self.last_used = 0.0
+
+    def _open(self):
+        settings = self.settings
+        server = smtplib.SMTP(settings['server'], settings['port'], timeout=settings['timeout'])
+        try:
+            if settings['use_tls']:
+                server.starttls()
+            if settings['password']:
+                server.login(settings['username'], settings['password'])
+        except Exception:
+            server.close()
+            raise
+        logger.info(f"Opened SMTP connection to {settings['server']}:{settings['port']}")
+        return server
+
+    def send(self, to_email, message):
+        """Send one message, reconnecting once if the kept-open connection was dropped by the server"""
+        for attempt in range(2):
+            if self.server is None:
+                self.server = self._open()
+            try:
+                self.server.sendmail(self.settings['username'], to_email, message)
+                self.last_used = time.monotonic()
+                return
+            except smtplib.SMTPServerDisconnected:
+                self.server = None
+                if attempt:
+                    raise
+
+    def handle_error(self, error):
+        """Keep the connection after the server rejects one message, drop it after anything else"""
+        if not isinstance(error, smtplib.SMTPResponseException):
+            self.close()
+
+    def close_if_idle(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.settings['idle_seconds']:
+            self.close()
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+
+class OutboxSender(threading.Thread):
+    """Background thread that drains the email outbox, woken on enqueue and otherwise polling.
+
+    ``drain(connection)`` sends one batch of due messages over the shared
+    connection and returns how many it handled; a full batch is followed
+    straight away by the next one.
+    """
+
+    def __init__(self, drain, batch_size, poll_seconds):
+        super().__init__(name='outbox-sender', daemon=True)
+        self.drain = drain
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.connection = SMTPConnection(smtp_settings())
+        self.wakeup = threading.Event()
+
+    def wake(self):
+        self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                handled = self.drain(self.connection)
+            except Exception as e:
+                logger.error(f"Outbox sender error: {e}")
+                handled = 0
+            if handled >= self.batch_size:
+                continue
+            self.connection.close_if_idle()
+            self.wakeup.wait(self.poll_seconds)
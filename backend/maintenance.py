@@ -0,0 +1,79 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def path_size(path):
+    """Bytes used by a file, or by every file under a directory"""
+    if not os.path.isdir(path):
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def remove_path(path):
+    """Remove a file or directory tree, returning the bytes it used"""
+    size = path_size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+    return size
+
+
+def format_bytes(size):
+    """Human-readable size for reports"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def find_orphans(directory, referenced, grace_seconds, directories=False):
+    """Entries of ``directory`` not in ``referenced`` (absolute paths) and untouched for ``grace_seconds``.
+
+    The grace period keeps uploads that are being saved or queued, whose
+    records are written after their files, from being taken for orphans.
+    """
+    if not os.path.isdir(directory):
+        return []
+    cutoff = time.time() - grace_seconds
+    orphans = []
+    for entry in os.scandir(directory):
+        # Dotfiles such as .gitkeep belong to the deployment, not to uploads
+        if entry.name.startswith('.') or entry.is_symlink() or entry.is_dir(follow_symlinks=False) != directories:
+            continue
+        path = os.path.abspath(entry.path)
+        if path not in referenced and entry.stat(follow_symlinks=False).st_mtime < cutoff:
+            orphans.append(path)
+    return orphans
+
+
+class MaintenanceScheduler(threading.Thread):
+    """Background thread that runs ``task()`` every ``interval_seconds``, logging rather than raising its errors"""
+
+    def __init__(self, task, interval_seconds):
+        super().__init__(name='maintenance', daemon=True)
+        self.task = task
+        self.interval_seconds = interval_seconds
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval_seconds):
+            try:
+                self.task()
+            except Exception as e:
+                logger.error(f"Maintenance error: {e}")
@@ -0,0 +1,190 @@
+import os
+import json
+import gzip
+import shutil
+
+from storage import write_bytes_atomic, get_sheet_dir
+from sheet_store import SheetReader
+from metrics import StageTimer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+PAYLOAD_NAME = 'data.json'
+# Byte range of each sheet's rows within the plain payload, so a new version can reuse unchanged sheets
+PAYLOAD_INDEX_NAME = 'data.index.json'
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+PAYLOAD_BATCH_ROWS = 10000  # Rows serialized and compressed at a time
+COPY_CHUNK_BYTES = 1024 * 1024  # Bytes copied at a time from a previous version's payload
+
+# Precomputed encodings in order of preference, with the suffix of their file
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    """Content encodings that are precomputed, best first"""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def serialize_payload(payload):
+    """Serialize a response payload the way jsonify does in production"""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def payload_path(payload_dir, encoding=None):
+    return os.path.join(payload_dir, PAYLOAD_NAME + (ENCODING_SUFFIXES[encoding] if encoding else ''))
+
+
+def payload_index_path(payload_dir):
+    return os.path.join(payload_dir, PAYLOAD_INDEX_NAME)
+
+
+class PayloadWriter:
+    """Writes a payload and its gzip and (if available) brotli encodings as it is produced.
+
+    Everything goes to temporary files, moved into place by ``close``; the
+    time spent compressing and writing is charged to the ``compress`` stage.
+    """
+
+    def __init__(self, payload_dir, timer):
+        os.makedirs(payload_dir, exist_ok=True)
+        self.payload_dir = payload_dir
+        self.timer = timer
+        self.size = 0
+        self.files = {}
+        self.tmp_paths = {encoding: f"{payload_path(payload_dir, encoding)}.{os.getpid()}.tmp"
+                          for encoding in [None] + available_encodings()}
+        for encoding, path in self.tmp_paths.items():
+            self.files[encoding] = open(path, 'wb')
+        # An empty filename keeps the temporary file's name out of the gzip header
+        self.gzip = gzip.GzipFile(filename='', mode='wb', fileobj=self.files['gzip'], compresslevel=GZIP_LEVEL, mtime=0)
+        self.brotli = brotli.Compressor(quality=BROTLI_QUALITY) if brotli is not None else None
+
+    def write(self, data):
+        with self.timer.stage('compress'):
+            self.files[None].write(data)
+            self.gzip.write(data)
+            if self.brotli is not None:
+                self.files['br'].write(self.brotli.process(data))
+        self.size += len(data)
+
+    def close(self, ranges=None):
+        """Finish the encodings and move every file into place"""
+        with self.timer.stage('compress'):
+            self.gzip.close()
+            if self.brotli is not None:
+                self.files['br'].write(self.brotli.finish())
+            for f in self.files.values():
+                f.close()
+        for encoding in available_encodings():
+            os.replace(self.tmp_paths[encoding], payload_path(self.payload_dir, encoding))
+        if ranges is not None:
+            write_bytes_atomic(payload_index_path(self.payload_dir), serialize_payload(ranges))
+        # The plain payload is moved last, so its presence means every encoding is ready
+        os.replace(self.tmp_paths[None], payload_path(self.payload_dir))
+
+    def discard(self):
+        for f in self.files.values():
+            f.close()
+        for path in self.tmp_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def iter_sheet_rows(sheet_dir, batch_rows=PAYLOAD_BATCH_ROWS):
+    """A stored sheet's rows serialized as a JSON array, in fragments of ``batch_rows`` rows"""
+    yield b'['
+    for position, batch in enumerate(SheetReader(sheet_dir).iter_batches(batch_rows)):
+        yield (b',' if position else b'') + serialize_payload(batch)[1:-1]
+    yield b']'
+
+
+def iter_file_range(path, start, end, chunk_bytes=COPY_CHUNK_BYTES):
+    """Bytes ``start`` to ``end`` of a file, ``chunk_bytes`` at a time"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while start < end:
+            chunk = f.read(min(chunk_bytes, end - start))
+            if not chunk:
+                raise EOFError(f"{path} ends before byte {end}")
+            start += len(chunk)
+            yield chunk
+
+
+def read_payload_ranges(payload_dir):
+    """``{sheet: [start, end]}`` byte range of each sheet's rows in a precomputed payload, or {} without one"""
+    if not has_payloads(payload_dir) or not os.path.exists(payload_index_path(payload_dir)):
+        return {}
+    with open(payload_index_path(payload_dir), 'rb') as f:
+        return json.load(f)
+
+
+def write_file_payloads(payload_dir, file_id, filename, store_dir, manifest, previous_payload_dir=None,
+                        previous_names=None, timer=None):
+    """Stream a file's full data response, every row of every sheet, into its payload files.
+
+    Rows are read from the store ``PAYLOAD_BATCH_ROWS`` at a time and
+    written and compressed as they are serialized, so memory does not grow
+    with the file. The body is byte for byte what ``serialize_payload``
+    gives for the whole response, and the byte range of each sheet's rows
+    in it is recorded for the next version. Sheets named in
+    ``previous_names`` (name -> sheet name in the previous version) are
+    copied from ``previous_payload_dir`` instead of read from the store.
+    Returns the size of the plain body.
+    """
+    timer = timer or StageTimer()
+    previous_names = previous_names or {}
+    previous_ranges = read_payload_ranges(previous_payload_dir) if previous_names else {}
+    entries = {entry['name']: entry for entry in manifest['sheets']}
+    writer = PayloadWriter(payload_dir, timer)
+    try:
+        head = serialize_payload({'file_id': file_id, 'filename': filename, 'sheets': list(entries)})
+        writer.write(head[:-1] + b',"sheets_data":{')
+        ranges = {}
+        for position, name in enumerate(sorted(entries)):
+            writer.write((b',' if position else b'') + json.dumps(name).encode('utf-8') + b':')
+            start = writer.size
+            previous = previous_names.get(name)
+            if previous in previous_ranges:
+                fragments = iter_file_range(payload_path(previous_payload_dir), *previous_ranges[previous])
+            else:
+                fragments = iter_sheet_rows(get_sheet_dir(store_dir, entries[name]['key']))
+            for fragment in timer.iterate('serialize', fragments):
+                writer.write(fragment)
+            ranges[name] = [start, writer.size]
+        writer.write(b'}}')
+        writer.close(ranges)
+    except BaseException:
+        writer.discard()
+        raise
+    return writer.size
+
+
+def has_payloads(payload_dir):
+    return os.path.exists(payload_path(payload_dir))
+
+
+def negotiate_encoding(accept_encodings, payload_dir):
+    """Pick the best precomputed encoding the client accepts, or None for plain JSON"""
+    for encoding in available_encodings():
+        if accept_encodings[encoding] and os.path.exists(payload_path(payload_dir, encoding)):
+            return encoding
+    return None
+
+
+def remove_payloads(payload_dir):
+    if os.path.isdir(payload_dir):
+        shutil.rmtree(payload_dir, ignore_errors=True)
+
+
+def replace_payloads(staged_dir, payload_dir):
+    """Move the payloads built for a file's new version into place"""
+    remove_payloads(payload_dir)
+    if has_payloads(staged_dir):
+        os.replace(staged_dir, payload_dir)
+    else:
+        remove_payloads(staged_dir)
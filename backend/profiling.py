@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import write_json_atomic, read_json
+
+
+PROFILE_NAME = 'profile.json'
+PROFILE_BATCH_ROWS = 100000
+HLL_PRECISION = 12  # 4096 registers, about 1.6% standard error
+
+
+class HyperLogLog:
+    """HyperLogLog sketch over 64-bit hashes, updated a whole array at a time"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        remaining_bits = 64 - self.precision
+        buckets = (hashes >> np.uint64(remaining_bits)).astype(np.intp)
+        remainder = hashes & np.uint64((1 << remaining_bits) - 1)
+        # Rank is the position of the leftmost 1-bit in the remaining bits
+        bit_length = np.frexp(remainder.astype(np.float64))[1]
+        ranks = (remaining_bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def add_series(self, series):
+        self.add_hashes(pd.util.hash_pandas_object(series.dropna(), index=False).to_numpy())
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+def to_profile_value(value):
+    """Render a column minimum or maximum as a JSON value"""
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def profile_column(reader, name, batch_rows=PROFILE_BATCH_ROWS):
+    """Null count, distinct estimate and min/max of one stored column, read in batches"""
+    sketch = HyperLogLog()
+    null_count = 0
+    minimum = maximum = None
+    for start in range(0, reader.row_count, batch_rows):
+        series = reader.column(name, start, start + batch_rows)
+        values = series.dropna()
+        null_count += len(series) - len(values)
+        if not len(values):
+            continue
+        sketch.add_series(values)
+        low, high = values.min(), values.max()
+        minimum = low if minimum is None else min(minimum, low)
+        maximum = high if maximum is None else max(maximum, high)
+    return {
+        'name': name,
+        'type': reader.kinds[name],
+        'null_count': int(null_count),
+        'null_ratio': null_count / reader.row_count if reader.row_count else 0.0,
+        'distinct_estimate': min(sketch.estimate(), reader.row_count - null_count),
+        'min': to_profile_value(minimum),
+        'max': to_profile_value(maximum),
+    }
+
+
+def profile_reader(reader):
+    """Profile every column of a stored sheet"""
+    return {
+        'row_count': reader.row_count,
+        'column_count': len(reader.columns),
+        'columns': [profile_column(reader, name) for name in reader.columns],
+    }
+
+
+def write_profile(sheet_dir, profile):
+    write_json_atomic(os.path.join(sheet_dir, PROFILE_NAME), profile)
+
+
+def read_profile(sheet_dir):
+    """Return a sheet's stored profile, or None if it was stored before profiling existed"""
+    path = os.path.join(sheet_dir, PROFILE_NAME)
+    if not os.path.exists(path):
+        return None
+    return read_json(path)
@@ -0,0 +1,411 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from sheet_store import (INT, FLOAT, BOOL, DATETIME, STRING, VALUE_DTYPES, SheetReader, load_sheet_profile,
+                         read_valid, read_string_array, to_json_values, _memmap)
+
+
+FILTER_OPS = {'eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'not_in', 'contains', 'is_null', 'not_null'}
+AGGREGATE_FUNCS = {'count': 'count', 'sum': 'sum', 'mean': 'mean', 'min': 'min', 'max': 'max', 'count_distinct': 'nunique'}
+NUMERIC_FUNCS = {'sum', 'mean'}
+DEFAULT_LIMIT = 1000
+MAX_LIMIT = 10000
+
+
+class QueryError(Exception):
+    """Raised for a query specification that cannot be run against the sheet"""
+
+
+class _ColumnCache:
+    """Raw numpy values and null masks of the columns a query touches, each read once"""
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.loaded = {}
+
+    def get(self, name):
+        if name not in self.loaded:
+            position = self.reader.columns.index(name)
+            base = os.path.join(self.reader.sheet_dir, f"c{position}")
+            kind = self.reader.kinds[name]
+            row_count = self.reader.row_count
+            if kind == STRING:
+                values = read_string_array(base, row_count)
+            else:
+                values = np.array(_memmap(f"{base}.values", VALUE_DTYPES[kind], row_count))
+            self.loaded[name] = (values, read_valid(base, row_count))
+        return self.loaded[name]
+
+    def take(self, name, rows):
+        """Values and null mask of just the given rows, read without loading the whole column"""
+        if name in self.loaded:
+            values, valid = self.loaded[name]
+            return values[rows], valid[rows]
+        position = self.reader.columns.index(name)
+        base = os.path.join(self.reader.sheet_dir, f"c{position}")
+        kind = self.reader.kinds[name]
+        row_count = self.reader.row_count
+        valid = np.array(_memmap(f"{base}.valid", np.uint8, row_count)[rows]).astype(bool)
+        if kind != STRING:
+            return np.array(_memmap(f"{base}.values", VALUE_DTYPES[kind], row_count)[rows]), valid
+        offsets = _memmap(f"{base}.offsets", np.int64, row_count + 1)
+        blob = _memmap(f"{base}.values", np.uint8, int(offsets[-1]))
+        starts, ends = offsets[rows], offsets[rows + 1]
+        values = np.array([bytes(blob[start:end]).decode('utf-8') for start, end in zip(starts, ends)], dtype=object)
+        return values, valid
+
+
+def _string_operand(values, value):
+    """Make a query value comparable with a string column held as bytes or str"""
+    value = str(value)
+    if values.dtype.kind == 'S':
+        try:
+            return values, value.encode('ascii')
+        except UnicodeEncodeError:
+            return values.astype(f"U{values.dtype.itemsize}"), value
+    return values, value
+
+
+def _coerce(kind, value):
+    """Convert a JSON query value to the representation a column is stored in"""
+    if kind in (INT, FLOAT):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise QueryError(f"Expected a number, got {value!r}")
+        return value
+    if kind == BOOL:
+        if not isinstance(value, bool):
+            raise QueryError(f"Expected true or false, got {value!r}")
+        return value
+    if kind == DATETIME:
+        try:
+            timestamp = pd.Timestamp(value)
+        except (ValueError, TypeError):
+            raise QueryError(f"Expected a date, got {value!r}")
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_localize(None)
+        # Stored as microseconds since the epoch; Timestamp.value is always nanoseconds
+        return int(timestamp.as_unit('us').asm8.astype(np.int64))
+    return str(value)
+
+
+def _filter_mask(kind, values, valid, op, value):
+    """Rows of a column matching one filter; null cells only match is_null"""
+    if op == 'is_null':
+        return ~valid
+    if op == 'not_null':
+        return valid.copy()
+
+    if op in ('in', 'not_in'):
+        operands = [_coerce(kind, item) for item in value]
+        if kind == STRING:
+            if values.dtype.kind == 'S' and all(item.isascii() for item in operands):
+                operands = [item.encode('ascii') for item in operands]
+            elif values.dtype.kind == 'S':
+                values = values.astype(f"U{values.dtype.itemsize}")
+        matched = np.isin(values, np.array(operands)) if operands else np.zeros(len(values), dtype=bool)
+        return valid & (matched if op == 'in' else ~matched)
+
+    if op == 'contains':
+        if kind != STRING:
+            raise QueryError("contains only applies to text columns")
+        needle = str(value).lower()
+        if values.dtype.kind == 'S' and needle.isascii():
+            matched = np.strings.find(np.strings.lower(values), needle.encode('ascii')) >= 0
+        else:
+            text = values.astype(f"U{values.dtype.itemsize}") if values.dtype.kind == 'S' else values.astype(str)
+            matched = np.strings.find(np.strings.lower(text), needle) >= 0
+        return valid & matched
+
+    operand = _coerce(kind, value)
+    if kind == STRING:
+        values, operand = _string_operand(values, operand)
+    if kind == BOOL and op not in ('eq', 'ne'):
+        raise QueryError(f"{op} does not apply to true/false columns")
+    compare = {
+        'eq': np.equal, 'ne': np.not_equal, 'gt': np.greater,
+        'gte': np.greater_equal, 'lt': np.less, 'lte': np.less_equal,
+    }[op]
+    return valid & compare(values, operand)
+
+
+def _profile_bound(kind, bound):
+    if bound is None:
+        return None
+    if kind == DATETIME:
+        return _coerce(DATETIME, bound)
+    return bound
+
+
+def rules_out(column_profile, row_count, op, value):
+    """True when a column's min/max or null count show no row can match a filter"""
+    if column_profile is None:
+        return False
+    if op == 'is_null':
+        return column_profile['null_count'] == 0
+    if op == 'not_null':
+        return column_profile['null_count'] == row_count
+    kind = column_profile['type']
+    if kind == BOOL or op in ('ne', 'not_in', 'contains'):
+        return False
+    low = _profile_bound(kind, column_profile['min'])
+    high = _profile_bound(kind, column_profile['max'])
+    if low is None or high is None:
+        return column_profile['null_count'] == row_count
+    try:
+        if op == 'in':
+            return all(_coerce(kind, item) < low or _coerce(kind, item) > high for item in value)
+        operand = _coerce(kind, value)
+        return {
+            'eq': operand < low or operand > high,
+            'gt': high <= operand,
+            'gte': high < operand,
+            'lt': low >= operand,
+            'lte': low > operand,
+        }[op]
+    except TypeError:
+        return False
+
+
+def _series(kind, values, valid):
+    """pandas Series of raw column values with nulls restored, as read_column_series returns them"""
+    if kind == STRING:
+        if values.dtype.kind == 'S':
+            values = values.astype(f"U{values.dtype.itemsize}")
+        strings = values.astype(object)
+        strings[~valid] = None
+        return pd.Series(strings, dtype=object)
+    if kind == INT:
+        return pd.Series(pd.arrays.IntegerArray(values, ~valid))
+    if kind == BOOL:
+        return pd.Series(pd.arrays.BooleanArray(values, ~valid))
+    if kind == DATETIME:
+        return pd.Series(values.view('datetime64[us]')).mask(~valid)
+    return pd.Series(np.where(valid, values, np.nan))
+
+
+def _sorted_factorize(values):
+    """Distinct values in sorted order and each value's position among them.
+
+    Hashes first and sorts only the distinct values, which is much cheaper
+    than sorting every row. Text of up to 8 bytes is packed into big-endian
+    integers, whose order matches the byte order of the text.
+    """
+    if values.dtype.kind == 'S' and values.dtype.itemsize <= 8:
+        width = values.dtype.itemsize
+        packed = np.zeros((len(values), 8), dtype=np.uint8)
+        packed[:, :width] = values.view(np.uint8).reshape(len(values), width)
+        uniques, codes = _sorted_factorize(packed.view('>u8').ravel().astype(np.uint64))
+        return uniques.astype('>u8').view('S8').astype(values.dtype), codes
+    codes, uniques = pd.factorize(values, sort=False)
+    order = np.argsort(uniques, kind='stable')
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return np.asarray(uniques)[order], rank[codes]
+
+
+def _dense_codes(values, valid):
+    """Sorted distinct values of a column and each row's code into them (-1 for null)"""
+    codes = np.full(len(values), -1, dtype=np.int64)
+    uniques, codes[valid] = _sorted_factorize(values[valid])
+    return uniques, codes
+
+
+def _decode_unique(kind, value):
+    return to_json_values(_series(kind, np.array([value]), np.array([True])), kind)[0]
+
+
+class _Spec:
+    """Validated query specification"""
+
+    def __init__(self, spec, reader):
+        if not isinstance(spec, dict):
+            raise QueryError("Query must be a JSON object")
+        columns = reader.columns
+
+        def known(name):
+            if name not in columns:
+                raise QueryError(f"Unknown column: {name}")
+            return name
+
+        self.filters = []
+        for item in spec.get('filters') or []:
+            if not isinstance(item, dict) or item.get('op') not in FILTER_OPS:
+                raise QueryError(f"Filters need a column and an op ({', '.join(sorted(FILTER_OPS))})")
+            value = item.get('value')
+            if item['op'] in ('in', 'not_in') and not isinstance(value, list):
+                raise QueryError(f"{item['op']} needs a list value")
+            if item['op'] not in ('is_null', 'not_null') and value is None:
+                raise QueryError(f"{item['op']} needs a value")
+            self.filters.append((known(item.get('column')), item['op'], value))
+
+        self.group_by = [known(name) for name in spec.get('group_by') or []]
+        self.aggregates = []
+        for item in spec.get('aggregates') or []:
+            func = item.get('func') if isinstance(item, dict) else None
+            if func not in AGGREGATE_FUNCS:
+                raise QueryError(f"Aggregates need a func ({', '.join(sorted(AGGREGATE_FUNCS))})")
+            column = item.get('column')
+            if column is None and func != 'count':
+                raise QueryError(f"{func} needs a column")
+            if column is not None:
+                known(column)
+                if func in NUMERIC_FUNCS and reader.kinds[column] not in (INT, FLOAT, BOOL):
+                    raise QueryError(f"{func} needs a numeric column, {column} is {reader.kinds[column]}")
+            alias = item.get('as') or (f"{func}_{column}" if column else func)
+            self.aggregates.append((func, column, alias))
+        if self.group_by and not self.aggregates:
+            self.aggregates.append(('count', None, 'count'))
+
+        self.aggregating = bool(self.aggregates)
+        self.columns = self.group_by + [alias for _, _, alias in self.aggregates] if self.aggregating else \
+            [known(name) for name in spec.get('columns') or columns]
+        if len(set(self.columns)) != len(self.columns):
+            raise QueryError("Result column names must be unique")
+
+        self.order_by = []
+        for item in spec.get('order_by') or []:
+            if isinstance(item, str):
+                name, descending = item, False
+            elif isinstance(item, dict):
+                name, descending = item.get('column'), bool(item.get('desc'))
+            else:
+                raise QueryError("order_by items must be column names or {column, desc} objects")
+            if name not in (self.columns if self.aggregating else columns):
+                raise QueryError(f"Cannot order by {name}")
+            self.order_by.append((name, descending))
+
+        try:
+            self.offset = max(int(spec.get('offset', 0)), 0)
+            self.limit = min(max(int(spec.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except (ValueError, TypeError):
+            raise QueryError("offset and limit must be integers")
+
+
+def _ordered_rows(cache, reader, rows, order_by):
+    """Sort matching row numbers by the order_by columns, nulls last"""
+    if not order_by:
+        return rows
+    keys = []
+    for name, descending in order_by:
+        values, valid = cache.get(name)
+        values, valid = values[rows], valid[rows]
+        # Empty cells sort last either way, ahead of comparing values
+        keys.append(~valid)
+        if reader.kinds[name] in (INT, FLOAT, DATETIME):
+            # Numbers sort on their own values; negating them reverses the order
+            sort_values = np.where(valid, values, 0)
+            keys.append(-sort_values if descending else sort_values)
+        else:
+            _, codes = _dense_codes(values, valid)
+            keys.append(-codes if descending else codes)
+    # lexsort treats its last key as the primary one
+    return rows[np.lexsort(keys[::-1])]
+
+
+def _aggregate(cache, reader, rows, spec):
+    """Group matching rows and compute the aggregates as a DataFrame of JSON-ready columns"""
+    result = {}
+    if spec.group_by:
+        group_ids = np.zeros(len(rows), dtype=np.int64)
+        key_codes = []
+        for name in spec.group_by:
+            values, valid = cache.get(name)
+            uniques, codes = _dense_codes(values[rows], valid[rows])
+            key_codes.append((name, uniques, codes))
+            _, group_ids = _sorted_factorize(group_ids * (len(uniques) + 1) + codes + 1)
+        group_count = int(group_ids.max()) + 1 if len(group_ids) else 0
+        first_rows = np.full(group_count, len(group_ids), dtype=np.int64)
+        np.minimum.at(first_rows, group_ids, np.arange(len(group_ids)))
+        for name, uniques, codes in key_codes:
+            kind = reader.kinds[name]
+            result[name] = [None if code < 0 else _decode_unique(kind, uniques[code]) for code in codes[first_rows]]
+    else:
+        group_ids = np.zeros(len(rows), dtype=np.int64)
+        group_count = 1
+
+    for func, column, alias in spec.aggregates:
+        if column is None:
+            counts = np.bincount(group_ids, minlength=group_count)
+            result[alias] = [int(count) for count in counts]
+            continue
+        kind = reader.kinds[column]
+        values, valid = cache.get(column)
+        values, valid = values[rows], valid[rows]
+        uniques = None
+        if kind == STRING or (kind == BOOL and func in ('min', 'max', 'count_distinct')):
+            uniques, codes = _dense_codes(values, valid)
+            series = pd.Series(pd.arrays.IntegerArray(np.maximum(codes, 0), codes < 0))
+        elif kind == BOOL:
+            series = pd.Series(pd.arrays.IntegerArray(values.astype(np.int64), ~valid))
+        else:
+            series = _series(kind, values, valid)
+        grouped = series.groupby(group_ids)
+        # A sum over only null cells is null rather than 0
+        aggregated = grouped.sum(min_count=1) if func == 'sum' else grouped.agg(AGGREGATE_FUNCS[func])
+        aggregated = aggregated.reindex(range(group_count))
+        if uniques is not None and func in ('min', 'max'):
+            result[alias] = [None if pd.isna(code) else _decode_unique(kind, uniques[int(code)]) for code in aggregated]
+        elif kind == DATETIME and func in ('min', 'max'):
+            result[alias] = to_json_values(aggregated, DATETIME)
+        elif func in ('count', 'count_distinct'):
+            result[alias] = [0 if pd.isna(value) else int(value) for value in aggregated]
+        else:
+            result[alias] = [None if pd.isna(value) else value.item() if hasattr(value, 'item') else value
+                             for value in aggregated]
+    return pd.DataFrame(result, columns=spec.columns, dtype=object)
+
+
+def run_query(sheet_dir, spec):
+    """Filter, group and aggregate a stored sheet.
+
+    Only the columns the query names are read, as raw arrays; text is
+    compared as bytes where possible and decoded only for result rows and
+    distinct group keys. Filters the sheet profile rules out return no rows
+    without reading any data.
+    """
+    reader = SheetReader(sheet_dir)
+    spec = _Spec(spec, reader)
+    profile = load_sheet_profile(sheet_dir)
+    column_profiles = {column['name']: column for column in profile['columns']}
+
+    skipped = any(rules_out(column_profiles.get(name), reader.row_count, op, value) for name, op, value in spec.filters)
+    cache = _ColumnCache(reader)
+    if skipped:
+        rows = np.zeros(0, dtype=np.int64)
+    else:
+        mask = np.ones(reader.row_count, dtype=bool)
+        for name, op, value in spec.filters:
+            values, valid = cache.get(name)
+            mask &= _filter_mask(reader.kinds[name], values, valid, op, value)
+        rows = np.flatnonzero(mask)
+
+    if spec.aggregating:
+        frame = _aggregate(cache, reader, rows, spec)
+        if spec.order_by:
+            frame = frame.sort_values([name for name, _ in spec.order_by],
+                                      ascending=[not descending for _, descending in spec.order_by],
+                                      na_position='last', kind='stable')
+        total = len(frame)
+        page = frame.iloc[spec.offset:spec.offset + spec.limit]
+        records = [dict(zip(spec.columns, row)) for row in page.itertuples(index=False, name=None)]
+    else:
+        ordered = _ordered_rows(cache, reader, rows, spec.order_by)
+        total = len(ordered)
+        page = ordered[spec.offset:spec.offset + spec.limit]
+        values = []
+        for name in spec.columns:
+            column_values, valid = cache.take(name, page)
+            values.append(to_json_values(_series(reader.kinds[name], column_values, valid), reader.kinds[name]))
+        records = [dict(zip(spec.columns, row)) for row in zip(*values)]
+
+    return {
+        'columns': spec.columns,
+        'matched_rows': int(len(rows)),
+        'total': int(total),
+        'offset': spec.offset,
+        'limit': spec.limit,
+        'skipped': skipped,
+        'rows': records,
+    }
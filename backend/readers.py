@@ -0,0 +1,342 @@
+import re
+import zipfile
+import posixpath
+import importlib.util
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+
+import pandas as pd
+
+
+# File signatures
+ZIP_SIGNATURE = b'PK\x03\x04'
+OLE2_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+XLSX = 'xlsx'
+XLSB = 'xlsb'
+XLS = 'xls'
+UNKNOWN = 'unknown'
+
+RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+PACKAGE_RELATIONSHIP_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# The used range a writer records near the top of a worksheet part, e.g. <dimension ref="A1:D3000"/>
+DIMENSION = re.compile(rb'''<(?:\w+:)?dimension\s[^>]*?\bref=["']([A-Za-z]*)(\d*)(?::([A-Za-z]*)(\d*))?["']''')
+OUTLINE_READ_BYTES = 4096
+OUTLINE_MAX_BYTES = 64 * 1024
+# calamine holds a whole sheet's cells in memory (roughly 70 bytes each), so .xlsx workbooks
+# with a larger sheet are streamed with openpyxl, whose memory does not grow with the sheet
+CALAMINE_MAX_CELLS = 2000000
+
+
+def sniff_format(file_path):
+    """Identify a workbook from its leading bytes rather than its extension"""
+    with open(file_path, 'rb') as f:
+        signature = f.read(8)
+    if signature.startswith(ZIP_SIGNATURE):
+        try:
+            with zipfile.ZipFile(file_path) as archive:
+                names = set(archive.namelist())
+        except zipfile.BadZipFile:
+            return UNKNOWN
+        if 'xl/workbook.xml' in names:
+            return XLSX
+        if 'xl/workbook.bin' in names:
+            return XLSB
+        return UNKNOWN
+    if signature == OLE2_SIGNATURE:
+        return XLS
+    return UNKNOWN
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def xlsx_sheet_parts(archive):
+    """``[(sheet name, zip part)]`` in workbook order, resolved through the workbook relationships"""
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    relationships = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {}
+    for relationship in relationships.iter(f"{{{PACKAGE_RELATIONSHIP_NS}}}Relationship"):
+        target = relationship.get('Target')
+        if target.startswith('/'):
+            targets[relationship.get('Id')] = target.lstrip('/')
+        else:
+            targets[relationship.get('Id')] = posixpath.normpath(posixpath.join('xl', target))
+    return [
+        (sheet.get('name'), targets.get(sheet.get(f"{{{RELATIONSHIP_NS}}}id")))
+        for sheet in workbook.iter()
+        if local_name(sheet.tag) == 'sheet'
+    ]
+
+
+def column_number(letters):
+    number = 0
+    for letter in letters.upper():
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+def xlsx_sheet_dimensions(archive, part):
+    """``(data rows, columns)`` of a worksheet from its ``<dimension>`` element, or Nones without one.
+
+    Only the head of the part is read: the element precedes the cells.
+    The first row of the range is taken to be the header.
+    """
+    head = b''
+    with archive.open(part) as f:
+        while len(head) < OUTLINE_MAX_BYTES:
+            chunk = f.read(OUTLINE_READ_BYTES)
+            if not chunk:
+                break
+            head += chunk
+            if DIMENSION.search(head) or b'sheetData' in head:
+                break
+    match = DIMENSION.search(head)
+    if not match or not match.group(1) or not match.group(2):
+        return None, None
+    first_column, first_row, last_column, last_row = (group.decode('ascii') if group else None for group in match.groups())
+    last_column, last_row = last_column or first_column, last_row or first_row
+    return max(int(last_row) - int(first_row), 0), column_number(last_column) - column_number(first_column) + 1
+
+
+def workbook_sheet_names(file_path, file_format):
+    """Sheet names read from the workbook globals alone"""
+    if engine_available('calamine'):
+        from python_calamine import CalamineWorkbook
+        workbook = CalamineWorkbook.from_path(file_path)
+        try:
+            return list(workbook.sheet_names)
+        finally:
+            workbook.close()
+    if file_format == XLS and engine_available('xlrd'):
+        import xlrd
+        workbook = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            return workbook.sheet_names()
+        finally:
+            workbook.release_resources()
+    if file_format == XLSB and engine_available('pyxlsb'):
+        from pyxlsb import open_workbook as open_xlsb
+        with open_xlsb(file_path) as workbook:
+            return list(workbook.sheets)
+    return []
+
+
+def sheet_outline(file_path):
+    """``[{name, estimated_rows, estimated_columns}]`` of a workbook's sheets, without reading any cells.
+
+    Estimates come from the used range an .xlsx records for each sheet; they
+    are None where a writer leaves it out, and for other formats.
+    """
+    file_format = sniff_format(file_path)
+    if file_format == XLSX:
+        with zipfile.ZipFile(file_path) as archive:
+            names = set(archive.namelist())
+            outline = []
+            for name, part in xlsx_sheet_parts(archive):
+                rows, columns = xlsx_sheet_dimensions(archive, part) if part in names else (None, None)
+                outline.append({'name': name, 'estimated_rows': rows, 'estimated_columns': columns})
+            return outline
+    return [
+        {'name': name, 'estimated_rows': None, 'estimated_columns': None}
+        for name in workbook_sheet_names(file_path, file_format)
+    ]
+
+
+def engine_available(engine):
+    module = {'calamine': 'python_calamine', 'openpyxl': 'openpyxl', 'xlrd': 'xlrd', 'pyxlsb': 'pyxlsb'}[engine]
+    return importlib.util.find_spec(module) is not None
+
+
+def largest_sheet_cells(outline):
+    """Estimated cell count of the largest sheet in a ``sheet_outline``, or None if no sheet has an estimate"""
+    sizes = [sheet['estimated_rows'] * sheet['estimated_columns'] for sheet in outline
+             if sheet.get('estimated_rows') is not None and sheet.get('estimated_columns') is not None]
+    return max(sizes) if sizes else None
+
+
+def select_engines(file_format, largest_cells=None):
+    """Return the preferred engine for a format followed by at most one fallback.
+
+    ``largest_cells`` is the estimated size of the workbook's largest sheet;
+    past ``CALAMINE_MAX_CELLS`` an .xlsx is streamed with openpyxl first.
+    """
+    if file_format == XLSX:
+        if not engine_available('calamine'):
+            candidates = ['openpyxl', 'openpyxl-full']
+        elif largest_cells is not None and largest_cells > CALAMINE_MAX_CELLS:
+            candidates = ['openpyxl', 'calamine']
+        else:
+            candidates = ['calamine', 'openpyxl']
+    elif file_format == XLS:
+        candidates = ['calamine', 'xlrd']
+    elif file_format == XLSB:
+        candidates = ['calamine', 'pyxlsb']
+    else:
+        return []
+    return [engine for engine in candidates if engine_available(engine.split('-')[0])][:2]
+
+
+def unique_names(names, taken=()):
+    """Number repeated column names the way pandas does, never reusing a name already in ``names`` or ``taken``.
+
+    A second "a" becomes "a.1", or "a.2" when some column is already called
+    "a.1"; blank ("Unnamed: N") headers are numbered after the rest.
+    """
+    names = list(names)
+    existing = set(names) | set(taken)
+    counts = {}
+    for name in taken:
+        counts[name] = counts.get(name, 0) + 1
+    unnamed = [position for position, name in enumerate(names) if name.startswith('Unnamed: ')]
+    order = [position for position in range(len(names)) if position not in set(unnamed)] + unnamed
+    for position in order:
+        base = name = names[position]
+        count = counts.get(name, 0)
+        while count > 0:
+            counts[base] = count + 1
+            name = f"{base}.{count}"
+            count = count + 1 if name in existing else counts.get(name, 0)
+        names[position] = name
+        existing.add(name)
+        counts[name] = count + 1
+    return names
+
+
+def header_names(row):
+    """Column names for a header row, following pandas' naming of blank and repeated headers"""
+    return unique_names([str(value).strip() if value is not None else f"Unnamed: {position}"
+                         for position, value in enumerate(row)])
+
+
+def row_width(row):
+    """Number of cells in a row up to its last non-empty one"""
+    width = len(row)
+    while width and row[width - 1] is None:
+        width -= 1
+    return width
+
+
+def iter_frames(rows, chunk_rows):
+    """DataFrames of ``chunk_rows`` rows from an iterator of row tuples, under the first non-empty row as header.
+
+    As with pandas, trailing blank headers are dropped, but cells past the
+    header are kept: the first row reaching further adds "Unnamed: N"
+    columns, which the chunks before it leave out (the column store fills
+    them with nulls).
+    """
+    header = None
+    for row in rows:
+        width = row_width(row)
+        if width:
+            header = header_names(row[:width])
+            break
+    if header is None:
+        yield pd.DataFrame()
+        return
+
+    width = len(header)
+    chunk = []
+    yielded = False
+    for row in rows:
+        if len(row) > width:
+            extent = row_width(row)
+            if extent > width:
+                header = header + unique_names([f"Unnamed: {position}" for position in range(width, extent)], header)
+                width = extent
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            yield chunk_frame(chunk, header)
+            yielded = True
+            chunk = []
+    if chunk or not yielded:
+        yield chunk_frame(chunk, header)
+
+
+def chunk_frame(chunk, header):
+    """DataFrame of rows cut or padded to the header width"""
+    width = len(header)
+    rows = [row if len(row) == width else tuple(row[:width]) + (None,) * (width - len(row)) for row in chunk]
+    return pd.DataFrame(rows, columns=header)
+
+
+class OpenpyxlStreamReader:
+    """Read-only openpyxl reader that yields each sheet in fixed-size row chunks"""
+
+    def __init__(self, file_path):
+        import openpyxl
+        self.workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        self.sheet_names = list(self.workbook.sheetnames)
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        return iter_frames(self.workbook[sheet_name].iter_rows(values_only=True), chunk_rows)
+
+    def close(self):
+        self.workbook.close()
+
+
+def calamine_cell(value):
+    """A python-calamine cell as openpyxl reports it: empty as None, whole floats as ints, dates as datetimes"""
+    if isinstance(value, str):
+        return value if value else None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if type(value) is date:
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+class CalamineStreamReader:
+    """python-calamine reader that turns each sheet into DataFrames in fixed-size row chunks.
+
+    calamine loads a sheet's cells natively in one go, at a fraction of the
+    memory of the pandas frame ``PandasReader`` builds from them; only
+    ``chunk_rows`` rows at a time become Python objects here.
+    """
+
+    def __init__(self, file_path):
+        from python_calamine import CalamineWorkbook
+        self.workbook = CalamineWorkbook.from_path(file_path)
+        self.sheet_names = list(self.workbook.sheet_names)
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        sheet = self.workbook.get_sheet_by_name(sheet_name)
+        # Rows start at the first used column; pad them so columns line up with openpyxl's
+        padding = (None,) * (sheet.start[1] if sheet.start else 0)
+        rows = (padding + tuple(map(calamine_cell, row)) for row in sheet.iter_rows())
+        return iter_frames(rows, chunk_rows)
+
+    def close(self):
+        self.workbook.close()
+
+
+class PandasReader:
+    """pandas-backed reader that parses one sheet at a time and yields it in chunks"""
+
+    def __init__(self, file_path, engine):
+        self.excel_file = pd.ExcelFile(file_path, engine=engine)
+        self.sheet_names = list(self.excel_file.sheet_names)
+
+    def iter_chunks(self, sheet_name, chunk_rows):
+        df = self.excel_file.parse(sheet_name)
+        if df.empty:
+            yield df
+            return
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+    def close(self):
+        self.excel_file.close()
+
+
+def open_workbook(file_path, engine):
+    """Open a workbook with the named engine"""
+    if engine == 'openpyxl':
+        return OpenpyxlStreamReader(file_path)
+    if engine == 'calamine':
+        return CalamineStreamReader(file_path)
+    if engine == 'openpyxl-full':
+        return PandasReader(file_path, 'openpyxl')
+    return PandasReader(file_path, engine)
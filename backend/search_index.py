@@ -0,0 +1,339 @@
+import os
+import re
+import json
+import heapq
+import shutil
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from storage import get_sheet_dir, write_json_atomic, read_json, read_manifest
+from data_cache import DataCache
+
+
+INDEX_NAME = 'index.json'      # Columns, row count and section sizes of the index
+INDEX_DATA_NAME = 'index.bin'  # Term and posting offsets, posting rows and columns, then the term blob
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+POSTING_TYPECODE = 'Q'
+MAX_BUFFERED_POSTINGS = 1000000
+OFFSET_DTYPE = np.int64
+ROW_DTYPE = np.uint32
+COLUMN_DTYPE = np.uint16
+# A builder encodes cells as ``row * CELL_STRIDE + column``, so columns can be added while a sheet streams in
+CELL_STRIDE = 1 << 16
+INDEX_CACHE_BYTES = 256 * 1024 * 1024  # Mapped index bytes kept open per process
+MIN_CACHE_CHARGE = 1024 * 1024  # Each cached index holds an open map, so small ones count for this much
+
+
+def tokenize(value):
+    """Split a cell value into lowercase word tokens"""
+    if value is None:
+        return []
+    return TOKEN_PATTERN.findall(str(value).lower())
+
+
+def encode_term(term):
+    # UTF-8 keeps code point order, so the byte strings sort like the terms
+    return term.encode('utf-8', 'surrogatepass')
+
+
+def _write_postings(rows_out, columns_out, encoded, column_count):
+    encoded = np.array(encoded, dtype=np.uint64)
+    rows_out.write((encoded // column_count).astype(ROW_DTYPE).tobytes())
+    columns_out.write((encoded % column_count).astype(COLUMN_DTYPE).tobytes())
+
+
+def write_index(sheet_dir, columns, row_count, pairs, stride=None):
+    """Write a sheet index from ``(term, postings)`` pairs given in term order.
+
+    Postings are cells encoded as ``row * stride + column`` (the stride
+    defaults to the column count); they are
+    stored sorted, split into a uint32 row and a uint16 column array, with
+    an offsets table per term so a term's cells are one contiguous slice.
+    """
+    path = os.path.join(sheet_dir, INDEX_DATA_NAME)
+    column_count = stride or max(len(columns), 1)
+    parts = {part: f"{path}.{os.getpid()}.{part}" for part in ('rows', 'columns', 'terms')}
+    term_offsets, posting_offsets = array('q', [0]), array('q', [0])
+    pending = array(POSTING_TYPECODE)
+    with open(parts['rows'], 'wb') as rows_out, open(parts['columns'], 'wb') as columns_out, \
+            open(parts['terms'], 'wb') as terms_out:
+        for term, postings in pairs:
+            data = encode_term(term)
+            terms_out.write(data)
+            term_offsets.append(term_offsets[-1] + len(data))
+            pending.extend(sorted(postings))
+            posting_offsets.append(posting_offsets[-1] + len(postings))
+            if len(pending) >= MAX_BUFFERED_POSTINGS:
+                _write_postings(rows_out, columns_out, pending, column_count)
+                pending = array(POSTING_TYPECODE)
+        _write_postings(rows_out, columns_out, pending, column_count)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as out:
+        out.write(term_offsets.tobytes())
+        out.write(posting_offsets.tobytes())
+        for part in ('rows', 'columns', 'terms'):
+            with open(parts[part], 'rb') as f:
+                shutil.copyfileobj(f, out)
+            os.remove(parts[part])
+    os.replace(tmp_path, path)
+    write_json_atomic(os.path.join(sheet_dir, INDEX_NAME), {
+        'columns': list(columns),
+        'row_count': row_count,
+        'term_count': len(term_offsets) - 1,
+        'posting_count': posting_offsets[-1],
+        'term_bytes': term_offsets[-1],
+    })
+
+
+class SheetIndexBuilder:
+    """Accumulate an inverted index (token -> cells) over a sheet, chunk by chunk.
+
+    Each posting is encoded as ``row * CELL_STRIDE + column`` while the
+    index is built, and columns a later chunk adds are appended with
+    ``extend_columns``. When more than ``max_postings`` postings are buffered
+    they are spilled to a sorted run file beside the index and merged when
+    it is written, so building the index of a large sheet uses bounded memory.
+    """
+
+    def __init__(self, columns, max_postings=MAX_BUFFERED_POSTINGS):
+        self.columns = list(columns)
+        self.max_postings = max_postings
+        self.postings = {}
+        self.buffered = 0
+        self.row_count = 0
+        self.runs = []
+
+    def add(self, column_values, row_offset, spill_dir=None):
+        """Index one chunk given as a list of per-column value lists starting at ``row_offset``"""
+        for column_number, values in enumerate(column_values):
+            self.row_count = max(self.row_count, row_offset + len(values))
+            for row_number, value in enumerate(values, row_offset):
+                encoded = row_number * CELL_STRIDE + column_number
+                for token in set(tokenize(value)):
+                    postings = self.postings.get(token)
+                    if postings is None:
+                        postings = self.postings[token] = array(POSTING_TYPECODE)
+                    postings.append(encoded)
+                    self.buffered += 1
+        if spill_dir is not None and self.buffered > self.max_postings:
+            self._spill(spill_dir)
+
+    def extend_columns(self, columns):
+        """Adopt the names of columns beyond the ones already indexed"""
+        self.columns.extend(columns[len(self.columns):])
+
+    def _spill(self, spill_dir):
+        path = os.path.join(spill_dir, f"{INDEX_NAME}.run{len(self.runs)}")
+        with open(path, 'w', encoding='utf-8') as f:
+            for term in sorted(self.postings):
+                f.write(json.dumps([term, self.postings[term].tolist()], separators=(',', ':')) + '\n')
+        self.runs.append(path)
+        self.postings = {}
+        self.buffered = 0
+
+    def _merged(self):
+        """Yield ``(term, postings)`` in term order across every spilled run"""
+        def read_run(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    yield json.loads(line)
+
+        current_term, current = None, []
+        for term, postings in heapq.merge(*(read_run(path) for path in self.runs), key=lambda item: item[0]):
+            if term != current_term and current_term is not None:
+                yield current_term, current
+                current = []
+            current_term = term
+            current.extend(postings)
+        if current_term is not None:
+            yield current_term, current
+
+    def write(self, sheet_dir):
+        if not self.runs:
+            write_index(sheet_dir, self.columns, self.row_count,
+                        ((term, self.postings[term]) for term in sorted(self.postings)), CELL_STRIDE)
+            return
+
+        self._spill(sheet_dir)
+        write_index(sheet_dir, self.columns, self.row_count, self._merged(), CELL_STRIDE)
+        for run in self.runs:
+            os.remove(run)
+        self.runs = []
+
+
+class Terms:
+    """Sequence of a sheet's sorted vocabulary as UTF-8 bytes, read from the mapped term blob for ``bisect``"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        return self.blob[self.offsets[position]:self.offsets[position + 1]].tobytes()
+
+
+class SheetIndex:
+    """A sheet's inverted index, searched through one memory map of its data file instead of loaded"""
+
+    def __init__(self, sheet_dir, meta):
+        self.columns = meta['columns']
+        self.row_count = meta['row_count']
+        term_count, posting_count = meta['term_count'], meta['posting_count']
+        data = np.memmap(os.path.join(sheet_dir, INDEX_DATA_NAME), dtype=np.uint8, mode='r')
+        self.nbytes = data.nbytes
+        sections = {}
+        position = 0
+        for name, dtype, count in (
+            ('term_offsets', OFFSET_DTYPE, term_count + 1),
+            ('posting_offsets', OFFSET_DTYPE, term_count + 1),
+            ('rows', ROW_DTYPE, posting_count),
+            ('columns', COLUMN_DTYPE, posting_count),
+            ('terms', np.uint8, meta['term_bytes']),
+        ):
+            size = count * np.dtype(dtype).itemsize
+            sections[name] = data[position:position + size].view(dtype)
+            position += size
+        self.posting_offsets = sections['posting_offsets']
+        self.rows = sections['rows']
+        self.row_columns = sections['columns']
+        self.terms = Terms(sections['terms'], sections['term_offsets'])
+
+    def term_range(self, term, match='exact'):
+        """Positions ``[start, stop)`` of the vocabulary terms matching ``term``"""
+        key = encode_term(term)
+        start = bisect_left(self.terms, key)
+        if match == 'prefix':
+            # No UTF-8 byte is 0xff, so this sorts after every term starting with the prefix
+            return start, bisect_left(self.terms, key + b'\xff', start)
+        if start < len(self.terms) and self.terms[start] == key:
+            return start, start + 1
+        return start, start
+
+    def postings(self, term, match='exact'):
+        """Row and column arrays of the cells holding a term matching ``term``"""
+        start, stop = self.term_range(term, match)
+        begin, end = int(self.posting_offsets[start]), int(self.posting_offsets[stop])
+        return self.rows[begin:end], self.row_columns[begin:end]
+
+
+index_cache = DataCache(INDEX_CACHE_BYTES, sizeof=lambda index: max(index.nbytes, MIN_CACHE_CHARGE))
+
+
+def read_index_meta(sheet_dir):
+    """Return a sheet index's metadata, converting an index stored as one JSON document first"""
+    path = os.path.join(sheet_dir, INDEX_NAME)
+    meta = read_json(path)
+    if 'terms' in meta:
+        write_index(sheet_dir, meta['columns'], meta['row_count'], zip(meta['terms'], meta['postings']))
+        meta = read_json(path)
+    return meta
+
+
+def load_sheet_index(store_dir, sheet_key):
+    sheet_dir = get_sheet_dir(store_dir, sheet_key)
+    path = os.path.join(sheet_dir, INDEX_NAME)
+    key = (path, os.path.getmtime(path))
+    index = index_cache.get(key)
+    if index is None:
+        meta = read_index_meta(sheet_dir)
+        key = (path, os.path.getmtime(path))
+        index = SheetIndex(sheet_dir, meta)
+        index_cache.put(key, index)
+    return index
+
+
+def load_sheet_terms(store_dir, sheet_key):
+    """The vocabulary of a sheet's index as a list of terms"""
+    sheet_dir = get_sheet_dir(store_dir, sheet_key)
+    terms = SheetIndex(sheet_dir, read_index_meta(sheet_dir)).terms
+    blob, offsets = terms.blob.tobytes(), terms.offsets.tolist()
+    return [blob[start:end].decode('utf-8', 'surrogatepass') for start, end in zip(offsets, offsets[1:])]
+
+
+def distinct(values):
+    """Sorted distinct values of an array. Postings are mostly presorted, which a stable sort
+    exploits; ``np.unique`` hashes instead and is much slower on large posting lists."""
+    values = np.sort(values, kind='stable')
+    keep = np.ones(len(values), dtype=bool)
+    np.not_equal(values[1:], values[:-1], out=keep[1:])
+    return values[keep]
+
+
+def search_sheet(index, query, column=None, match='exact'):
+    """Return ``{row: [matched columns]}`` for rows containing every query token"""
+    query_tokens = tokenize(query)
+    if not query_tokens:
+        return {}
+
+    columns = index.columns
+    column_count = max(len(columns), 1)
+    column_filter = None
+    if column is not None:
+        if column not in columns:
+            return {}
+        column_filter = columns.index(column)
+
+    rows = None
+    cells = []
+    for term in query_tokens:
+        term_rows, term_columns = index.postings(term, match)
+        if column_filter is not None:
+            keep = term_columns == column_filter
+            term_rows, term_columns = term_rows[keep], term_columns[keep]
+        term_distinct = distinct(term_rows)
+        rows = term_distinct if rows is None else np.intersect1d(rows, term_distinct, assume_unique=True)
+        if not len(rows):
+            return {}
+        cells.append(term_rows.astype(np.int64) * column_count + term_columns)
+
+    cells = distinct(np.concatenate(cells))
+    cell_rows, cell_columns = np.divmod(cells, column_count)
+    keep = np.isin(cell_rows, rows)
+    matched = {}
+    for row_number, column_number in zip(cell_rows[keep].tolist(), cell_columns[keep].tolist()):
+        matched.setdefault(row_number, []).append(columns[column_number])
+    return matched
+
+
+def file_vocabulary(store_dir):
+    """Return the set of distinct tokens across every indexed sheet of a file"""
+    manifest = read_manifest(store_dir)
+    vocabulary = set()
+    if manifest is None:
+        return vocabulary
+    for entry in manifest['sheets']:
+        vocabulary.update(load_sheet_terms(store_dir, entry['key']))
+    return vocabulary
+
+
+def search_file(store_dir, query, sheet=None, column=None, match='exact'):
+    """Search every indexed sheet of a file, yielding ``(sheet, row, columns)`` hits"""
+    manifest = read_manifest(store_dir)
+    if manifest is None:
+        return
+
+    for entry in manifest['sheets']:
+        if sheet is not None and entry['name'] != sheet:
+            continue
+        index = load_sheet_index(store_dir, entry['key'])
+        for row_number, matched_columns in search_sheet(index, query, column, match).items():
+            yield entry['name'], row_number, matched_columns
+
+
+def matches_case(record, matched_columns, query, match='exact'):
+    """Re-check an index hit against the query with its original casing"""
+    cells = [TOKEN_PATTERN.findall(str(record.get(column, ''))) for column in matched_columns]
+    for query_token in TOKEN_PATTERN.findall(str(query)):
+        if match == 'prefix':
+            found = any(t.startswith(query_token) for tokens in cells for t in tokens)
+        else:
+            found = any(query_token in tokens for tokens in cells)
+        if not found:
+            return False
+    return True
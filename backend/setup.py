@@ -19,7 +19,13 @@ FLASK_PORT=5000
 
 # File Upload Configuration
 UPLOAD_FOLDER=uploads
-MAX_FILE_SIZE=16777216  # 16MB in bytes
+MAX_FILE_SIZE=16777216  # 16MB in bytes, 0 for no limit
+UPLOAD_WORKERS=4  # Worker processes parsing uploaded workbooks
+INGEST_CHUNK_ROWS=10000  # Rows held in memory per sheet while streaming .xlsx files
+UPLOAD_PREVIEW_ROWS=10  # Rows of each sheet returned in the upload summary
+
+# File Data Cache Configuration
+DATA_CACHE_BYTES=268435456  # 256MB of precomputed file data responses kept in memory per process
 
 # Email Configuration (for password reset)
 SMTP_SERVER=smtp.gmail.com
@@ -0,0 +1,393 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import get_sheet_dir, sheet_key_for, write_json_atomic, read_json, write_manifest
+from search_index import SheetIndexBuilder
+from cleaning import NULL_SENTINELS, narrow_integral
+from profiling import profile_reader, write_profile, read_profile
+
+
+STORE_FORMAT = 2
+COLUMNS_NAME = 'columns.json'
+
+# Column kinds and the numpy dtype of their value file
+INT = 'int64'
+FLOAT = 'float64'
+BOOL = 'bool'
+DATETIME = 'datetime'  # int64 microseconds since the epoch
+STRING = 'string'      # int64 offsets into a UTF-8 blob
+VALUE_DTYPES = {INT: np.int64, FLOAT: np.float64, BOOL: np.bool_, DATETIME: np.int64}
+
+# Padded size under which an ASCII string column is read without a Python loop
+MAX_PADDED_STRING_BYTES = 64 * 1024 * 1024
+
+
+def column_kind(series):
+    """Map a pandas Series to the store column kind it is written as"""
+    dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return BOOL
+    if pd.api.types.is_integer_dtype(dtype):
+        return INT
+    if pd.api.types.is_float_dtype(dtype):
+        return FLOAT
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DATETIME
+    return STRING
+
+
+def format_value(value):
+    """Render a non-numeric cell value as the string stored for it"""
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+class _ColumnWriter:
+    """Append-only writer for the files of a single column"""
+
+    def __init__(self, sheet_dir, position, name):
+        self.name = name
+        self.kind = None
+        self.row_count = 0
+        self.pending_nulls = 0
+        self.string_end = 0
+        self.base = os.path.join(sheet_dir, f"c{position}")
+
+    def _path(self, suffix):
+        return f"{self.base}.{suffix}"
+
+    def _start(self, kind):
+        self.kind = kind
+        for suffix in ('values', 'valid', 'offsets'):
+            open(self._path(suffix), 'wb').close()
+        if kind == STRING:
+            self.string_end = 0
+            np.zeros(1, dtype=np.int64).tofile(self._path('offsets'))
+        if self.pending_nulls:
+            nulls, self.pending_nulls = self.pending_nulls, 0
+            self._write_nulls(nulls)
+
+    def _write_nulls(self, count):
+        with open(self._path('valid'), 'ab') as f:
+            np.zeros(count, dtype=np.uint8).tofile(f)
+        if self.kind == STRING:
+            with open(self._path('offsets'), 'ab') as f:
+                np.full(count, self.string_end, dtype=np.int64).tofile(f)
+        else:
+            with open(self._path('values'), 'ab') as f:
+                np.zeros(count, dtype=VALUE_DTYPES[self.kind]).tofile(f)
+        self.row_count += count
+
+    def _write(self, series):
+        valid = series.notna().to_numpy()
+        with open(self._path('valid'), 'ab') as f:
+            valid.astype(np.uint8).tofile(f)
+
+        if self.kind == STRING:
+            encoded = [format_value(v).encode('utf-8') if ok else b'' for v, ok in zip(series.tolist(), valid)]
+            lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+            offsets = self.string_end + np.cumsum(lengths)
+            with open(self._path('offsets'), 'ab') as f:
+                offsets.tofile(f)
+            if len(offsets):
+                self.string_end = int(offsets[-1])
+            with open(self._path('values'), 'ab') as f:
+                f.write(b''.join(encoded))
+        else:
+            if self.kind == DATETIME:
+                values = series.dt.tz_localize(None) if series.dt.tz is not None else series
+                values = values.astype('datetime64[us]').to_numpy().view(np.int64)
+                values = np.where(valid, values, 0)
+            elif self.kind == FLOAT:
+                values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                values = series.to_numpy(dtype=VALUE_DTYPES[self.kind], na_value=0)
+            with open(self._path('values'), 'ab') as f:
+                values.astype(VALUE_DTYPES[self.kind]).tofile(f)
+        self.row_count += len(series)
+
+    def _promote(self, kind):
+        """Rewrite the rows written so far as ``kind`` (int -> float, anything -> string)"""
+        existing = read_column_series(self.base, self.kind, self.row_count)
+        if kind == FLOAT:
+            existing = existing.astype('float64')
+        self.row_count = 0
+        self._start(kind)
+        self._write(existing)
+
+    def append(self, series):
+        if series.isna().all():
+            if self.kind is None:
+                self.pending_nulls += len(series)
+            else:
+                self._write_nulls(len(series))
+            return
+
+        kind = column_kind(series)
+        if self.kind is None:
+            self._start(kind)
+        elif kind != self.kind:
+            if {kind, self.kind} == {INT, FLOAT}:
+                if self.kind == INT:
+                    self._promote(FLOAT)
+                kind = FLOAT
+            else:
+                if self.kind != STRING:
+                    self._promote(STRING)
+                kind = STRING
+            if kind == FLOAT:
+                series = series.astype('float64')
+        self._write(series)
+
+    def close(self):
+        if self.kind is None:
+            self._start(STRING)
+        return {'name': self.name, 'type': self.kind}
+
+
+class SheetWriter:
+    """Write a sheet chunk by chunk into one set of files per column"""
+
+    def __init__(self, sheet_dir):
+        self.sheet_dir = sheet_dir
+        self.columns = None
+        self.row_count = 0
+        os.makedirs(sheet_dir, exist_ok=True)
+
+    def append(self, frame):
+        if self.columns is None:
+            self.columns = []
+        # A chunk may add columns at the end (cells past the header of a streamed sheet); earlier rows are null there
+        for position in range(len(self.columns), len(frame.columns)):
+            writer = _ColumnWriter(self.sheet_dir, position, str(frame.columns[position]))
+            writer.pending_nulls = self.row_count
+            self.columns.append(writer)
+        for writer, (_, series) in zip(self.columns, frame.items()):
+            writer.append(series)
+        self.row_count += len(frame)
+
+    def close(self):
+        meta = {
+            'row_count': self.row_count,
+            'columns': [writer.close() for writer in (self.columns or [])],
+        }
+        write_json_atomic(os.path.join(self.sheet_dir, COLUMNS_NAME), meta)
+        return meta
+
+
+class SheetBuilder:
+    """Write a sheet's columns and search index from a stream of DataFrame chunks"""
+
+    def __init__(self, sheet_dir):
+        self.sheet_dir = sheet_dir
+        self.writer = SheetWriter(sheet_dir)
+        self.index = None
+
+    @property
+    def row_count(self):
+        return self.writer.row_count
+
+    def append(self, frame):
+        if self.index is None:
+            self.index = SheetIndexBuilder([])
+        self.index.extend_columns([str(name) for name in frame.columns])
+        row_offset = self.writer.row_count
+        self.writer.append(frame)
+        self.index.add([to_json_values(series, column_kind(series)) for _, series in frame.items()], row_offset, self.sheet_dir)
+
+    def close(self):
+        meta = self.writer.close()
+        (self.index or SheetIndexBuilder([])).write(self.sheet_dir)
+        write_profile(self.sheet_dir, profile_reader(SheetReader(self.sheet_dir)))
+        return meta
+
+
+def sheet_entry(sheet_name, sheet_key, meta):
+    """Manifest entry describing a stored sheet"""
+    return {
+        'name': sheet_name,
+        'key': sheet_key,
+        'row_count': meta['row_count'],
+        'columns': [column['name'] for column in meta['columns']],
+        'types': {column['name']: column['type'] for column in meta['columns']},
+    }
+
+
+def _memmap(path, dtype, count):
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+def read_valid(base, row_count, start=0, stop=None):
+    """Null mask of rows ``[start, stop)`` of a column (True where a value is present)"""
+    stop = row_count if stop is None else min(stop, row_count)
+    return _memmap(f"{base}.valid", np.uint8, row_count)[start:stop].astype(bool)
+
+
+def read_string_array(base, row_count, start=0, stop=None):
+    """Read rows ``[start, stop)`` of a string column as a numpy array.
+
+    ASCII columns whose padded size stays within a few times the blob come
+    back as a fixed-width bytes (``S``) array built without a Python loop;
+    anything else is decoded row by row into an object array of str. Null
+    rows hold an empty value either way.
+    """
+    stop = row_count if stop is None else min(stop, row_count)
+    if start >= stop:
+        return np.zeros(0, dtype=object)
+    offsets = np.array(_memmap(f"{base}.offsets", np.int64, row_count + 1)[start:stop + 1])
+    blob = np.array(_memmap(f"{base}.values", np.uint8, int(offsets[-1]))[offsets[0]:offsets[-1]])
+    relative = offsets - offsets[0]
+    lengths = np.diff(relative)
+    width = max(int(lengths.max()), 1)
+
+    if len(lengths) * width <= max(4 * len(blob), MAX_PADDED_STRING_BYTES) and (
+            not len(blob) or (blob.max() < 128 and blob.min() > 0)):
+        positions = np.arange(width)
+        source = np.minimum(relative[:-1, None] + positions, max(len(blob) - 1, 0))
+        padded = np.where(positions < lengths[:, None], blob[source] if len(blob) else 0, 0).astype(np.uint8)
+        return padded.view(f"S{width}").ravel()
+
+    data = blob.tobytes()
+    return np.array([data[relative[i]:relative[i + 1]].decode('utf-8') for i in range(len(lengths))], dtype=object)
+
+
+def read_column_series(base, kind, row_count, start=0, stop=None):
+    """Read rows ``[start, stop)`` of a column as a pandas Series with nulls restored"""
+    stop = row_count if stop is None else min(stop, row_count)
+    valid = read_valid(base, row_count, start, stop)
+    if kind == STRING:
+        strings = read_string_array(base, row_count, start, stop)
+        if strings.dtype.kind == 'S':
+            strings = strings.astype(f"U{strings.dtype.itemsize}").astype(object)
+        strings[~valid] = None
+        return pd.Series(strings, dtype=object)
+
+    values = np.array(_memmap(f"{base}.values", VALUE_DTYPES[kind], row_count)[start:stop])
+    if kind == DATETIME:
+        series = pd.Series(values.view('datetime64[us]'))
+    elif kind == INT:
+        series = pd.Series(values, dtype='Int64')
+    elif kind == BOOL:
+        series = pd.Series(values, dtype='boolean')
+    else:
+        series = pd.Series(values)
+    return series.mask(~valid)
+
+
+class SheetReader:
+    """Memory-mapped access to the columns of a stored sheet"""
+
+    def __init__(self, sheet_dir):
+        self.sheet_dir = sheet_dir
+        meta = read_json(os.path.join(sheet_dir, COLUMNS_NAME))
+        self.row_count = meta['row_count']
+        self.columns = [column['name'] for column in meta['columns']]
+        self.kinds = {column['name']: column['type'] for column in meta['columns']}
+
+    def column(self, name, start=0, stop=None):
+        position = self.columns.index(name)
+        return read_column_series(os.path.join(self.sheet_dir, f"c{position}"), self.kinds[name], self.row_count, start, stop)
+
+    def read_rows(self, offset=0, limit=None, projection=None):
+        """Read ``limit`` rows starting at ``offset`` as JSON-ready dicts"""
+        start = min(max(offset, 0), self.row_count)
+        stop = self.row_count if limit is None else min(start + limit, self.row_count)
+        if start >= stop:
+            return []
+        names = projection or self.columns
+        values = [to_json_values(self.column(name, start, stop), self.kinds[name]) for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+
+    def iter_batches(self, batch_rows, projection=None):
+        """Yield every row as JSON-ready dicts, ``batch_rows`` rows at a time"""
+        for start in range(0, self.row_count, batch_rows):
+            yield self.read_rows(start, batch_rows, projection)
+
+
+def to_json_values(series, kind):
+    """Convert a stored column slice to JSON-serializable Python values"""
+    if kind == STRING:
+        return [None if value is None or value is pd.NA or value != value else format_value(value) for value in series.tolist()]
+    if kind == DATETIME:
+        return [value.isoformat() if not pd.isna(value) else None for value in series]
+    if kind == FLOAT:
+        return [None if np.isnan(value) else float(value) for value in series.to_numpy(dtype=np.float64, na_value=np.nan)]
+    return [None if pd.isna(value) else value.item() if hasattr(value, 'item') else value for value in series]
+
+
+def read_rows(sheet_dir, offset=0, limit=None, projection=None):
+    return SheetReader(sheet_dir).read_rows(offset, limit, projection)
+
+
+def read_row(sheet_dir, row_number):
+    records = read_rows(sheet_dir, row_number, 1)
+    return records[0] if records else None
+
+
+def frame_from_records(records):
+    """Rebuild a typed DataFrame from legacy all-string row dicts"""
+    frame = pd.DataFrame.from_records(records) if records else pd.DataFrame()
+    frame = frame.replace(NULL_SENTINELS, np.nan)
+    for name in frame.columns:
+        try:
+            frame[name] = pd.to_numeric(frame[name])
+        except (ValueError, TypeError):
+            pass
+    return narrow_integral(frame)
+
+
+def build_file_store(store_dir, frames, on_sheet=None):
+    """Persist every sheet as typed columns plus a search index, then write the manifest.
+
+    ``on_sheet(position, entry)`` is called after each sheet is written.
+    """
+    manifest = {'format': STORE_FORMAT, 'sheets': []}
+    for position, (sheet_name, frame) in enumerate(frames.items()):
+        sheet_key = sheet_key_for(position)
+        sheet_dir = get_sheet_dir(store_dir, sheet_key)
+        builder = SheetBuilder(sheet_dir)
+        builder.append(frame)
+        entry = sheet_entry(sheet_name, sheet_key, builder.close())
+        manifest['sheets'].append(entry)
+        if on_sheet is not None:
+            on_sheet(position, entry)
+    write_manifest(store_dir, manifest)
+    return manifest
+
+
+def load_sheet_profile(sheet_dir):
+    """Return a sheet's column profile, computing it for sheets stored before profiling existed"""
+    profile = read_profile(sheet_dir)
+    if profile is None:
+        profile = profile_reader(SheetReader(sheet_dir))
+        write_profile(sheet_dir, profile)
+    return profile
+
+
+def summarize_store(store_dir, manifest, preview_rows):
+    """Shape, column types and first ``preview_rows`` rows of every stored sheet"""
+    return [
+        {
+            'name': entry['name'],
+            'row_count': entry['row_count'],
+            'column_count': len(entry['columns']),
+            'columns': entry['columns'],
+            'types': entry['types'],
+            'preview': read_rows(get_sheet_dir(store_dir, entry['key']), 0, preview_rows),
+        }
+        for entry in manifest['sheets']
+    ]
+
+
+def read_sheets_data(store_dir, manifest):
+    """Read every row of every sheet, in the legacy ``{sheet: [records]}`` shape"""
+    return {
+        entry['name']: read_rows(get_sheet_dir(store_dir, entry['key']))
+        for entry in manifest['sheets']
+    }
@@ -0,0 +1,97 @@
+import os
+import json
+import shutil
+
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def get_store_dir(upload_folder, file_id):
+    """Directory holding the derived data (indexes, etc.) of an uploaded file"""
+    return os.path.join(upload_folder, 'store', file_id)
+
+
+def get_payload_dir(upload_folder, file_id):
+    """Directory holding the precomputed data responses of an uploaded file"""
+    return os.path.join(upload_folder, 'payloads', file_id)
+
+
+def get_sheet_dir(store_dir, sheet_key):
+    """Directory holding the derived data of a single sheet"""
+    return os.path.join(store_dir, 'sheets', sheet_key)
+
+
+def version_key(file_id, version):
+    """Store and payload directory name of a file's later version while it is built"""
+    return f"{file_id}.v{version}"
+
+
+def sheet_key_for(position):
+    """Filesystem-safe key for the sheet at the given position in the workbook"""
+    return f"{position:03d}"
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and move it into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def write_bytes_atomic(path, data):
+    """Write bytes to a temporary file and move it into place"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_manifest(store_dir, manifest):
+    write_json_atomic(os.path.join(store_dir, MANIFEST_NAME), manifest)
+
+
+def read_manifest(store_dir):
+    """Return the store manifest, or None if the store has not been built"""
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    return read_json(path)
+
+
+def find_sheet(manifest, sheet_name):
+    """Return the manifest entry for a sheet name, or None"""
+    for entry in manifest['sheets']:
+        if entry['name'] == sheet_name:
+            return entry
+    return None
+
+
+def remove_store(store_dir):
+    if os.path.isdir(store_dir):
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+def link_tree(source_dir, target_dir):
+    """Hard-link every file under source_dir into target_dir, copying where the filesystem cannot link.
+
+    Store files are never modified in place once written, so the linked
+    copies can be shared between versions.
+    """
+    for root, _, files in os.walk(source_dir):
+        target_root = os.path.join(target_dir, os.path.relpath(root, source_dir))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            source = os.path.join(root, name)
+            target = os.path.join(target_root, name)
+            try:
+                os.link(source, target)
+            except OSError:
+                shutil.copy2(source, target)
@@ -0,0 +1,26 @@
+import pandas as pd
+
+from cleaning import clean_frame
+from sheet_store import BOOL, SheetBuilder, SheetReader
+
+
+def test_bool_column_with_blanks_is_stored_as_bool(tmp_path):
+    frame = pd.DataFrame({
+        'Active': [True, None, False, '', 'N/A'],
+        'Count': [1, 2, 3, 4, 5],
+    })
+    cleaned = clean_frame(frame)
+    assert str(cleaned['Active'].dtype) == 'boolean'
+    assert cleaned['Active'].tolist() == [True, pd.NA, False, pd.NA, pd.NA]
+
+    builder = SheetBuilder(str(tmp_path))
+    builder.append(cleaned)
+    builder.close()
+    reader = SheetReader(str(tmp_path))
+    assert reader.kinds['Active'] == BOOL
+    assert reader.column('Active').tolist() == [True, pd.NA, False, pd.NA, pd.NA]
+
+
+def test_mixed_bool_and_text_column_stays_text():
+    cleaned = clean_frame(pd.DataFrame({'Flag': [True, None, 'maybe']}))
+    assert not pd.api.types.is_bool_dtype(cleaned['Flag'].dtype)
@@ -1,8 +1,30 @@
 import pandas as pd
+import numpy as np
 import openpyxl
 import os
 import sys
-from pathlib import Path
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+from datetime import datetime
+
+from readers import sniff_format, engine_available, open_workbook, XLS, XLSX
+
+# Synthetic workbook shapes; rows are scaled by --rows (xls sheets are capped at the format's row limit)
+WORKBOOK_KINDS = {
+    'tall': {'sheets': 1, 'columns': 8, 'row_factor': 1.0},
+    'wide': {'sheets': 1, 'columns': 200, 'row_factor': 0.05},
+    'many_sheets': {'sheets': 30, 'columns': 8, 'row_factor': 0.02},
+    'mixed': {'sheets': 3, 'columns': 12, 'row_factor': 0.5},
+}
+XLS_MAX_ROWS = 65535  # Data rows below the header
+XLS_MAX_COLUMNS = 256
+ENGINES = {XLSX: ['calamine', 'openpyxl', 'openpyxl-full'], XLS: ['calamine', 'xlrd']}
+RETRIEVAL_REPEAT = 5
 
 def test_excel_file(file_path):
     print(f"Testing file: {file_path}")
@@ -20,10 +42,10 @@ def test_excel_file(file_path):
     for method_name, method_func in methods:
         try:
             print(f"Testing {method_name}...")
-            result = method_func()
+            seconds, peak, result = measure(method_func)
             
             if isinstance(result, dict):
-                print(f"SUCCESS: Found {len(result)} sheets")
+                print(f"SUCCESS: Found {len(result)} sheets in {seconds:.2f}s, peak {peak / 2 ** 20:.1f} MB")
                 for sheet_name, df in result.items():
                     print(f"   Sheet '{sheet_name}': {len(df)} rows, {len(df.columns)} columns")
             else:
@@ -49,11 +71,276 @@ def test_openpyxl_direct(file_path):
     
     return result
 
+def measure(func):
+    """Time one run of func, then repeat it under tracemalloc (which slows it down) for its peak allocation.
+
+    Returns the wall time, the peak traced Python/numpy allocation in bytes and
+    the result of the timed run.
+    """
+    started = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak, result
+
+def make_frame(rows, columns, seed):
+    """Synthetic sheet mixing integers, floats, text with null markers, dates and booleans"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for position in range(columns):
+        kind = position % 5
+        if kind == 0:
+            values = rng.integers(0, 100000, rows)
+        elif kind == 1:
+            values = np.round(rng.random(rows) * 1000, 2)
+        elif kind == 2:
+            values = np.array(['alpha', 'beta', 'N/A', '', 'gamma delta', 'null'], dtype=object)[rng.integers(0, 6, rows)]
+        elif kind == 3:
+            values = pd.date_range('2020-01-01', periods=rows, freq='h').to_pydatetime()
+        else:
+            values = rng.random(rows) < 0.5
+        data[f"Column {position}"] = values
+    return pd.DataFrame(data)
+
+def make_mixed_frame(rows, seed):
+    """Sheet whose columns mix types cell by cell, as hand-edited workbooks do"""
+    rng = np.random.default_rng(seed)
+    pool = np.array([1, 2.5, 'text', None, True, '42', datetime(2021, 5, 1), ''], dtype=object)
+    return pd.DataFrame({f"Mixed {position}": pool[rng.integers(0, len(pool), rows)] for position in range(12)})
+
+def write_xls(path, sheets):
+    """Write an .xls workbook with xlwt, which pandas no longer supports as an engine"""
+    import xlwt
+    workbook = xlwt.Workbook()
+    date_style = xlwt.easyxf(num_format_str='yyyy-mm-dd hh:mm')
+    for sheet_name, frame in sheets.items():
+        sheet = workbook.add_sheet(sheet_name)
+        for column, name in enumerate(frame.columns):
+            sheet.write(0, column, name)
+        for column, name in enumerate(frame.columns):
+            for row, value in enumerate(frame[name].tolist(), start=1):
+                if value is None or value == '':
+                    continue
+                if isinstance(value, datetime):
+                    sheet.write(row, column, value, date_style)
+                else:
+                    sheet.write(row, column, value.item() if hasattr(value, 'item') else value)
+    workbook.save(path)
+
+def make_workbook(directory, kind, file_format, rows, seed=0):
+    """Generate one synthetic workbook and return its path and shape"""
+    shape = WORKBOOK_KINDS[kind]
+    sheet_rows = max(int(rows * shape['row_factor']), 1)
+    columns = shape['columns']
+    if file_format == XLS:
+        sheet_rows = min(sheet_rows, XLS_MAX_ROWS)
+        columns = min(columns, XLS_MAX_COLUMNS)
+    sheets = {}
+    for position in range(shape['sheets']):
+        if kind == 'mixed' and position == 0:
+            sheets[f"Sheet{position + 1}"] = make_mixed_frame(sheet_rows, seed + position)
+        else:
+            sheets[f"Sheet{position + 1}"] = make_frame(sheet_rows, columns, seed + position)
+    path = os.path.join(directory, f"{kind}.{file_format}")
+    if file_format == XLS:
+        write_xls(path, sheets)
+    else:
+        with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+            for sheet_name, frame in sheets.items():
+                frame.to_excel(writer, sheet_name=sheet_name, index=False)
+    return path, {'sheets': len(sheets), 'rows_per_sheet': sheet_rows, 'columns': columns}
+
+def read_all_chunks(file_path, engine, chunk_rows):
+    """Read every sheet through one reader engine, as ingestion does, and count the rows"""
+    reader = open_workbook(file_path, engine)
+    try:
+        rows = 0
+        for sheet_name in reader.sheet_names:
+            for chunk in reader.iter_chunks(sheet_name, chunk_rows):
+                rows += len(chunk)
+        return rows
+    finally:
+        reader.close()
+
+def bench_engines(file_path, chunk_rows):
+    """Time and peak memory of each installed engine that reads the workbook's format"""
+    results = {}
+    for engine in ENGINES.get(sniff_format(file_path), []):
+        if not engine_available(engine.split('-')[0]):
+            continue
+        try:
+            seconds, peak, rows = measure(lambda: read_all_chunks(file_path, engine, chunk_rows))
+            results[engine] = {'seconds': round(seconds, 4), 'peak_mb': round(peak / 2 ** 20, 2), 'rows': rows}
+        except Exception as e:
+            results[engine] = {'error': str(e)}
+    return results
+
+def bench_ingest(file_path, work_dir, chunk_rows):
+    """Time and peak memory of the worker's ingestion: read, clean, column store, indexes and payloads"""
+    from ingest import ingest_upload
+    store_dir = os.path.join(work_dir, 'store')
+    payload_dir = os.path.join(work_dir, 'payloads')
+
+    def ingest():
+        shutil.rmtree(store_dir, ignore_errors=True)
+        shutil.rmtree(payload_dir, ignore_errors=True)
+        return ingest_upload(file_path, store_dir, None, chunk_rows, payload_dir, 'BENCH', os.path.basename(file_path))
+
+    seconds, peak, result = measure(ingest)
+    store_bytes = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(store_dir) for name in names)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    shutil.rmtree(payload_dir, ignore_errors=True)
+    return {
+        'seconds': round(seconds, 4),
+        'peak_mb': round(peak / 2 ** 20, 2),
+        'engine': result['engine'],
+        'parse_seconds': round(result['parse_seconds'], 4),
+        'store_mb': round(store_bytes / 2 ** 20, 2),
+    }
+
+def timed_get(client, path, headers=None, repeat=RETRIEVAL_REPEAT):
+    """Best-of-repeat latency of a GET, with the size of its body"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path, headers=headers or {})
+        body = response.get_data()
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, f"{path}: {response.status_code}"
+        best = elapsed if best is None else min(best, elapsed)
+    return {'seconds': round(best, 4), 'bytes': len(body)}
+
+class AppBench:
+    """Drives the Flask app's upload and retrieval endpoints against DATABASE_URL (a temporary SQLite database by default)"""
+
+    def __init__(self, work_dir):
+        os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(work_dir, 'bench.db')}")
+        os.environ.setdefault('UPLOAD_FOLDER', os.path.join(work_dir, 'uploads'))
+        import app as app_module
+        self.app_module = app_module
+        self.client = app_module.app.test_client()
+        with app_module.app.app_context():
+            app_module.db.create_all()
+        stamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        response = self.client.post('/api/auth/register', json={
+            'email': f"bench{stamp}@example.com", 'password': 'bench', 'name': 'Bench'
+        })
+        self.user_id = response.get_json()['user']['user_id']
+
+    def upload(self, file_path):
+        """Upload a workbook and wait until it is indexed; returns the file ID and end-to-end seconds"""
+        started = time.perf_counter()
+        with open(file_path, 'rb') as f:
+            response = self.client.post('/api/upload', data={'user_id': self.user_id, 'file': (f, os.path.basename(file_path))})
+        upload = response.get_json()
+        if response.status_code not in (201, 202):
+            raise Exception(upload.get('error', response.status_code))
+        status = upload['status']
+        while status not in ('indexed', 'failed'):
+            time.sleep(0.02)
+            job = self.client.get(f"/api/jobs/{upload['job_id']}", query_string={'user_id': self.user_id}).get_json()
+            status = job['status']
+        if status == 'failed':
+            raise Exception(job['error'])
+        return upload['file_id'], time.perf_counter() - started
+
+    def retrieval(self, file_id):
+        """Latency of the file data endpoints: first full read, cached full reads, gzip and a single page"""
+        self.app_module.data_cache.invalidate(self.app_module.payload_cache_key(file_id, None, None))
+        path = f"/api/files/{file_id}/data?user_id={self.user_id}"
+        results = {'full_cold': timed_get(self.client, path, repeat=1)}
+        results['full_cached'] = timed_get(self.client, path)
+        results['full_gzip'] = timed_get(self.client, path, {'Accept-Encoding': 'gzip'})
+        results['page_100'] = timed_get(self.client, f"{path}&sheet=Sheet1&offset=0&limit=100")
+        return results
+
+    def close(self):
+        self.app_module.get_upload_executor().shutdown()
+
+def run_benchmarks(args):
+    """Generate each workbook, benchmark it end to end and return the JSON-ready results"""
+    work_dir = tempfile.mkdtemp(prefix='excel-bench-')
+    app_bench = None if args.skip_app else AppBench(work_dir)
+    results = {
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'versions': {'pandas': pd.__version__, 'numpy': np.__version__, 'openpyxl': openpyxl.__version__},
+        'rows': args.rows,
+        'chunk_rows': args.chunk_rows,
+        'database_url': os.environ.get('DATABASE_URL', '').split('@')[-1] if app_bench else None,
+        'workbooks': [],
+    }
+    try:
+        for file_format in args.formats:
+            for kind in args.kinds:
+                started = time.perf_counter()
+                file_path, shape = make_workbook(work_dir, kind, file_format, args.rows)
+                entry = {'name': os.path.basename(file_path), 'kind': kind, 'format': file_format,
+                         'bytes': os.path.getsize(file_path), 'generate_seconds': round(time.perf_counter() - started, 2)}
+                entry.update(shape)
+                print(f"{entry['name']}: {shape['sheets']} sheets x {shape['rows_per_sheet']:,} rows x {shape['columns']} columns",
+                      file=sys.stderr)
+                entry['engines'] = bench_engines(file_path, args.chunk_rows)
+                entry['ingest'] = bench_ingest(file_path, work_dir, args.chunk_rows)
+                if app_bench:
+                    file_id, upload_seconds = app_bench.upload(file_path)
+                    entry['upload_seconds'] = round(upload_seconds, 4)
+                    entry['retrieval'] = app_bench.retrieval(file_id)
+                results['workbooks'].append(entry)
+                os.remove(file_path)
+    finally:
+        if app_bench:
+            app_bench.close()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_summary(results):
+    print(f"{'workbook':<18} {'engine':<14} {'seconds':>8} {'peak MB':>8}", file=sys.stderr)
+    for entry in results['workbooks']:
+        rows = [(engine, stats) for engine, stats in entry['engines'].items()] + [('ingest', entry['ingest'])]
+        for engine, stats in rows:
+            if 'error' in stats:
+                print(f"{entry['name']:<18} {engine:<14} {'failed':>8}", file=sys.stderr)
+            else:
+                print(f"{entry['name']:<18} {engine:<14} {stats['seconds']:>8.3f} {stats['peak_mb']:>8.1f}", file=sys.stderr)
+        if 'retrieval' in entry:
+            timings = ', '.join(f"{name} {stats['seconds'] * 1000:.1f}ms" for name, stats in entry['retrieval'].items())
+            print(f"{entry['name']:<18} upload {entry['upload_seconds']:.3f}s; {timings}", file=sys.stderr)
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python test_excel.py <excel_file_path>")
+    parser = argparse.ArgumentParser(description='Check an Excel file with every reader, or benchmark ingestion and retrieval')
+    parser.add_argument('file', nargs='?', help='Excel file to test with each reader method')
+    parser.add_argument('--bench', action='store_true', help='Benchmark synthetic workbooks and emit JSON results')
+    parser.add_argument('--rows', type=int, default=20000, help='Rows of the tall workbook; other shapes are scaled from it')
+    parser.add_argument('--formats', nargs='+', default=[XLSX, XLS], choices=[XLSX, XLS])
+    parser.add_argument('--kinds', nargs='+', default=list(WORKBOOK_KINDS), choices=list(WORKBOOK_KINDS))
+    parser.add_argument('--chunk-rows', type=int, default=10000)
+    parser.add_argument('--skip-app', action='store_true', help='Skip the upload and retrieval endpoints')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory with the database and uploads')
+    parser.add_argument('--output', help='Write the JSON results to this file instead of stdout')
+    args = parser.parse_args()
+
+    if args.bench:
+        results = run_benchmarks(args)
+        print_summary(results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+        else:
+            print(json.dumps(results, indent=2))
+        return
+
+    file_path = args.file
+    if not file_path:
+        print("Usage: python test_excel.py <excel_file_path> | --bench [--output results.json]")
         sys.exit(1)
-    file_path = sys.argv[1]
     if not os.path.exists(file_path):
         print(f"File not found: {file_path}")
         sys.exit(1)
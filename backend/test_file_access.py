@@ -0,0 +1,69 @@
+import pytest
+
+SHEETS = {'Sheet1': [{'Name': 'Alice Smith', 'Amount': 1}, {'Name': 'Bob Jones', 'Amount': 2}]}
+
+
+def file_requests(file_id):
+    return [
+        ('get', f"/api/files/{file_id}/data", {}),
+        ('get', f"/api/files/{file_id}/data?sheet=Sheet1&limit=1", {}),
+        ('get', f"/api/files/{file_id}/search?q=alice", {}),
+        ('post', f"/api/files/{file_id}/query", {'json': {'filters': [{'column': 'Amount', 'op': 'gt', 'value': 1}]}}),
+        ('get', f"/api/files/{file_id}/sheets/Sheet1/rows.csv", {}),
+        ('get', f"/api/files/{file_id}/profile", {}),
+        ('get', f"/api/files/{file_id}/versions", {}),
+    ]
+
+
+@pytest.fixture
+def owned_file(make_user, make_file):
+    owner_id, owner_headers = make_user('owner@example.com')
+    other_id, other_headers = make_user('other@example.com')
+    file_id = make_file(owner_id, SHEETS)
+    return file_id, (owner_id, owner_headers), (other_id, other_headers)
+
+
+def test_owner_can_read_file(client, owned_file):
+    file_id, (owner_id, owner_headers), _ = owned_file
+    for method, path, kwargs in file_requests(file_id):
+        response = getattr(client, method)(path, headers=owner_headers, **kwargs)
+        assert response.status_code == 200, (path, response.get_json())
+    # Clients without a token identify themselves by user_id
+    assert client.get(f"/api/files/{file_id}/profile?user_id={owner_id}").status_code == 200
+
+
+def test_other_users_are_denied(client, owned_file):
+    file_id, _, (other_id, other_headers) = owned_file
+    for method, path, kwargs in file_requests(file_id):
+        response = getattr(client, method)(path, headers=other_headers, **kwargs)
+        assert response.status_code == 403, path
+        separator = '&' if '?' in path else '?'
+        assert getattr(client, method)(f"{path}{separator}user_id={other_id}", **kwargs).status_code == 403, path
+        assert getattr(client, method)(path, **kwargs).status_code == 400, path
+    assert client.delete(f"/api/files/{file_id}", headers=other_headers).status_code == 403
+    assert client.get(f"/api/files/{file_id}/profile", headers={'Authorization': 'Bearer forged'}).status_code == 401
+
+
+def test_owner_can_delete_file(client, owned_file):
+    file_id, (_, owner_headers), _ = owned_file
+    assert client.delete(f"/api/files/{file_id}", headers=owner_headers).status_code == 200
+    assert client.get(f"/api/files/{file_id}/profile", headers=owner_headers).status_code == 404
+
+
+def test_job_status_is_limited_to_the_uploader(client, owned_file):
+    from app import app, db, UploadJob, ExcelFile
+    file_id, (owner_id, owner_headers), (other_id, other_headers) = owned_file
+    with app.app_context():
+        excel_file = ExcelFile.query.filter_by(file_id=file_id).first()
+        db.session.add(UploadJob(job_id='JOBTEST01', user_id=excel_file.user_id, file_id=file_id, filename='book.xlsx',
+                                 original_filename='book.xlsx', file_path=excel_file.file_path, file_size=1,
+                                 status='indexed'))
+        db.session.commit()
+
+    response = client.get('/api/jobs/JOBTEST01', headers=owner_headers)
+    assert response.status_code == 200
+    assert response.get_json()['summary']['sheets'][0]['preview']
+    assert client.get(f"/api/jobs/JOBTEST01?user_id={owner_id}").status_code == 200
+    assert client.get('/api/jobs/JOBTEST01', headers=other_headers).status_code == 403
+    assert client.get(f"/api/jobs/JOBTEST01?user_id={other_id}").status_code == 403
+    assert client.get('/api/jobs/JOBTEST01').status_code == 400
@@ -0,0 +1,69 @@
+import io
+import json
+
+import app as app_module
+from app import app, db, ExcelFile, UploadJob
+from payloads import payload_path
+from storage import get_payload_dir
+
+SHEETS = {'Sheet1': [{'Name': 'Alice Smith', 'Amount': 1}]}
+
+
+def test_replaced_file_is_not_served_from_an_earlier_cache_entry(client, make_user, make_file):
+    user_id, headers = make_user()
+    file_id = make_file(user_id, SHEETS)
+    first = client.get(f"/api/files/{file_id}/data", headers=headers)
+    assert first.status_code == 200
+    assert first.get_json()['sheets'] == ['Sheet1']
+
+    # Another process finishes a replacement: new payload and version, but this process's cache is not invalidated
+    replaced = {'file_id': file_id, 'filename': 'book.xlsx', 'sheets': ['New'], 'sheets_data': {'New': []}}
+    with open(payload_path(get_payload_dir(app.config['UPLOAD_FOLDER'], file_id)), 'wb') as f:
+        f.write(json.dumps(replaced).encode('utf-8'))
+    with app.app_context():
+        excel_file = ExcelFile.query.filter_by(file_id=file_id).first()
+        excel_file.version = 2
+        excel_file.content_hash = 'b' * 64
+        db.session.commit()
+
+    second = client.get(f"/api/files/{file_id}/data", headers=headers)
+    assert second.status_code == 200
+    assert second.get_json()['sheets'] == ['New']
+
+
+def test_replacement_sent_while_another_is_saved_is_refused(client, make_user, make_file, monkeypatch):
+    user_id, headers = make_user()
+    file_id = make_file(user_id, SHEETS)
+    monkeypatch.setattr(app_module, 'queue_replace_job', lambda job, excel_file: None)
+    save_upload = app_module.save_upload
+    concurrent = []
+
+    def save_during_second_request(file, file_path):
+        if not concurrent:
+            concurrent.append(client.put(f"/api/files/{file_id}", headers=headers,
+                                         data={'file': (io.BytesIO(b'second'), 'book.xlsx')}))
+        return save_upload(file, file_path)
+
+    monkeypatch.setattr(app_module, 'save_upload', save_during_second_request)
+    first = client.put(f"/api/files/{file_id}", headers=headers, data={'file': (io.BytesIO(b'first'), 'book.xlsx')})
+    assert first.status_code == 202
+    assert concurrent[0].status_code == 409
+    with app.app_context():
+        jobs = UploadJob.query.filter_by(file_id=file_id).all()
+        assert [(job.version, job.file_size) for job in jobs] == [(2, len(b'first'))]
+
+
+def test_unchanged_replacement_frees_its_version(client, make_user, make_file, monkeypatch):
+    user_id, headers = make_user()
+    file_id = make_file(user_id, SHEETS)
+    monkeypatch.setattr(app_module, 'queue_replace_job', lambda job, excel_file: None)
+    with app.app_context():
+        excel_file = ExcelFile.query.filter_by(file_id=file_id).first()
+        excel_file.content_hash = app_module.hashlib.sha256(b'same').hexdigest()
+        db.session.commit()
+
+    response = client.put(f"/api/files/{file_id}", headers=headers, data={'file': (io.BytesIO(b'same'), 'book.xlsx')})
+    assert response.get_json()['status'] == 'unchanged'
+    response = client.put(f"/api/files/{file_id}", headers=headers, data={'file': (io.BytesIO(b'new'), 'book.xlsx')})
+    assert response.status_code == 202
+    assert response.get_json()['version'] == 2
@@ -0,0 +1,39 @@
+import pandas as pd
+
+import fuzzy_index
+from fuzzy_index import fuzzy_search_file
+from sheet_store import build_file_store
+
+
+def build_store(tmp_path, frames):
+    store_dir = str(tmp_path / 'store')
+    build_file_store(store_dir, frames)
+    return store_dir
+
+
+def test_word_finds_multi_word_value(tmp_path):
+    store_dir = build_store(tmp_path, {'People': pd.DataFrame({
+        'Name': ['Alice Smith', 'Bob Jones', 'ACME  Corp.'],
+        'Notes': ['met at the conference in Lisbon last spring, follow up about the renewal contract', None, None],
+    })})
+
+    hits = fuzzy_search_file(store_dir, 'alice')
+    assert [(hit[0], hit[2], hit[3]) for hit in hits] == [(1.0, 0, ['Name'])]
+    assert [hit[2] for hit in fuzzy_search_file(store_dir, 'smyth')] == [0]
+    # Whole values still match with spaces and punctuation ignored
+    assert [hit[2] for hit in fuzzy_search_file(store_dir, 'acme corp')] == [2]
+    # Words of values too long to index whole are found
+    assert [(hit[2], hit[3]) for hit in fuzzy_search_file(store_dir, 'lisbon')] == [(0, ['Notes'])]
+
+
+def test_column_filter_applies_before_candidate_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(fuzzy_index, 'MAX_CANDIDATES', 5)
+    # Names of another column are closer to the query than any Code, and would fill the shortlist
+    store_dir = build_store(tmp_path, {'Items': pd.DataFrame({
+        'Name': [f"widgit{letter}" for letter in 'abcdefghij'],
+        'Code': ['wodgit'] * 10,
+    })})
+
+    hits = fuzzy_search_file(store_dir, 'widgit', column='Code')
+    assert sorted(hit[2] for hit in hits) == list(range(10))
+    assert all(hit[3] == ['Code'] for hit in hits)
@@ -0,0 +1,27 @@
+from app import PROFILE_NAME_LENGTH
+
+
+def test_profile_truncates_long_header(client, make_user, make_file):
+    user_id, headers = make_user()
+    long_header = 'Quarterly revenue ' * 30
+    file_id = make_file(user_id, {'Sheet1': [{long_header: 1, 'Region': 'North'}, {long_header: 2, 'Region': 'South'}]})
+
+    response = client.get(f"/api/files/{file_id}/profile", headers=headers)
+    assert response.status_code == 200
+    sheets = response.get_json()['sheets']
+    assert [sheet['name'] for sheet in sheets] == ['Sheet1']
+    columns = {column['name']: column for column in sheets[0]['columns']}
+    truncated = long_header.strip()[:PROFILE_NAME_LENGTH]
+    assert set(columns) == {truncated, 'Region'}
+    assert columns[truncated]['type'] == 'int64'
+    assert (columns[truncated]['min'], columns[truncated]['max']) == (1, 2)
+
+
+def test_profile_keeps_sheets_apart_when_names_truncate_alike(client, make_user, make_file):
+    user_id, headers = make_user()
+    prefix = 'S' * PROFILE_NAME_LENGTH
+    file_id = make_file(user_id, {prefix + 'A': [{'a': 1}], prefix + 'B': [{'b': 2}]})
+
+    sheets = client.get(f"/api/files/{file_id}/profile", headers=headers).get_json()['sheets']
+    assert [sheet['name'] for sheet in sheets] == [prefix, prefix]
+    assert [[column['name'] for column in sheet['columns']] for sheet in sheets] == [['a'], ['b']]
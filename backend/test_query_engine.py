@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+from query_engine import QueryError, run_query
+from sheet_store import build_file_store
+from storage import get_sheet_dir, read_manifest
+
+
+@pytest.fixture
+def sheet_dir(tmp_path):
+    frame = pd.DataFrame({
+        'When': pd.to_datetime(['2024-01-05', '2024-02-10', '2024-03-15', None, '2024-04-20']),
+        'Amount': [10, 20, 30, 40, 50],
+    })
+    store_dir = str(tmp_path / 'store')
+    build_file_store(store_dir, {'Sheet1': frame})
+    return get_sheet_dir(store_dir, read_manifest(store_dir)['sheets'][0]['key'])
+
+
+def test_date_range_filter(sheet_dir):
+    result = run_query(sheet_dir, {
+        'filters': [
+            {'column': 'When', 'op': 'gte', 'value': '2024-02-01'},
+            {'column': 'When', 'op': 'lt', 'value': '2024-04-01T00:00:00'},
+        ],
+        'columns': ['Amount'],
+    })
+    assert not result['skipped']
+    assert [row['Amount'] for row in result['rows']] == [20, 30]
+
+
+def test_date_equality_filter(sheet_dir):
+    result = run_query(sheet_dir, {'filters': [{'column': 'When', 'op': 'eq', 'value': '2024-03-15'}]})
+    assert [row['Amount'] for row in result['rows']] == [30]
+
+
+def test_date_outside_profile_range_is_skipped(sheet_dir):
+    result = run_query(sheet_dir, {'filters': [{'column': 'When', 'op': 'gt', 'value': '2024-05-01'}]})
+    assert result['skipped']
+    assert result['rows'] == []
+
+
+def test_order_by_rejects_non_column_items(sheet_dir):
+    with pytest.raises(QueryError):
+        run_query(sheet_dir, {'order_by': [['Amount', 'desc']]})
+    result = run_query(sheet_dir, {'order_by': [{'column': 'Amount', 'desc': True}], 'limit': 2})
+    assert [row['Amount'] for row in result['rows']] == [50, 40]
+
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_order_by_puts_empty_cells_last(tmp_path, descending):
+    frame = pd.DataFrame({
+        'Number': pd.array([5, -3, None, 0, 2], dtype='Int64'),
+        'Text': ['pear', None, 'apple', 'fig', None],
+    })
+    store_dir = str(tmp_path / 'store')
+    build_file_store(store_dir, {'Sheet1': frame})
+    sheet_dir = get_sheet_dir(store_dir, read_manifest(store_dir)['sheets'][0]['key'])
+
+    numbers = run_query(sheet_dir, {'order_by': [{'column': 'Number', 'desc': descending}], 'columns': ['Number']})
+    expected = [5, 2, 0, -3] if descending else [-3, 0, 2, 5]
+    assert [row['Number'] for row in numbers['rows']] == expected + [None]
+
+    texts = run_query(sheet_dir, {'order_by': [{'column': 'Text', 'desc': descending}], 'columns': ['Text']})
+    expected = ['pear', 'fig', 'apple'] if descending else ['apple', 'fig', 'pear']
+    assert [row['Text'] for row in texts['rows']] == expected + [None, None]
@@ -0,0 +1,49 @@
+import openpyxl
+import pandas as pd
+import pytest
+
+import ingest
+from readers import engine_available, iter_frames
+from sheet_store import SheetReader
+from storage import get_sheet_dir
+
+ENGINES = [engine for engine in ('calamine', 'openpyxl') if engine_available(engine)]
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """Repeated headers, a blank header in the middle and cells past the last header, first seen after a chunk"""
+    path = str(tmp_path / 'headers.xlsx')
+    book = openpyxl.Workbook()
+    sheet = book.active
+    sheet.append(['a', 'a', 'a.1', None, 'b', None])
+    for i in range(25):
+        row = [i, i * 10, i * 100, 'middle' if i == 3 else None, f"x{i}"]
+        if i == 17:
+            row += [None, 'late']
+        sheet.append(row)
+    book.save(path)
+    return path
+
+
+def test_repeated_names_do_not_collide():
+    frames = list(iter_frames(iter([('a', 'a', 'a.1'), (1, 2, 3)]), 10))
+    assert list(frames[0].columns) == ['a', 'a.2', 'a.1']
+    assert frames[0].iloc[0].tolist() == [1, 2, 3]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_ingest_keeps_repeated_and_blank_header_columns(workbook, tmp_path, monkeypatch, engine):
+    monkeypatch.setattr(ingest, 'select_engines', lambda file_format, largest_cells=None: [engine])
+    store_dir = str(tmp_path / 'store')
+    result = ingest.ingest_workbook(workbook, store_dir, chunk_rows=10)
+    reader = SheetReader(get_sheet_dir(store_dir, result['manifest']['sheets'][0]['key']))
+
+    expected = pd.read_excel(workbook)
+    assert reader.columns == list(expected.columns) == ['a', 'a.2', 'a.1', 'Unnamed: 3', 'b', 'Unnamed: 5', 'Unnamed: 6']
+    rows = reader.read_rows()
+    assert [row['a.2'] for row in rows[:3]] == [0, 10, 20]
+    assert [row['a.1'] for row in rows[:3]] == [0, 100, 200]
+    assert rows[3]['Unnamed: 3'] == 'middle'
+    assert rows[17]['Unnamed: 6'] == 'late'
+    assert [row['Unnamed: 6'] for row in rows].count(None) == 24
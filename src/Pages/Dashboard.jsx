@@ -16,6 +16,7 @@ function Dashboard() {
 
     const handleLogout = () => {
         localStorage.removeItem('loggedIn');
+        localStorage.removeItem('token');
         navigate('/');
     }
 
@@ -41,8 +42,13 @@ function Dashboard() {
         setUploadSuccess(false);
         
         try {
-            // Upload file to backend
-            const response = await ApiService.uploadFile(file, user.user_id);
+            // Upload file to backend and wait for it to be processed
+            const upload = await ApiService.uploadFile(file, user.user_id);
+            // Already-stored content comes back deduplicated without a job to wait for
+            if (upload.job_id) {
+                await ApiService.waitForJob(upload.job_id);
+            }
+            const response = await ApiService.getFileData(upload.file_id);
             
             // Set the data from backend response
             setExcelData(response.sheets_data);
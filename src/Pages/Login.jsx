@@ -74,6 +74,7 @@ function Login() {
             
             localStorage.setItem('loggedIn', 'true');
             localStorage.setItem('user', JSON.stringify(response.user));
+            localStorage.setItem('token', response.token);
             window.location.href = '/dashboard';
         } catch (error) {
             alert(error.message);
@@ -1,6 +1,12 @@
 // API service for connecting to Python backend
 const API_BASE_URL = 'http://localhost:5000/api';
 
+// Authorization header carrying the session token saved at login
+const authHeaders = () => {
+  const token = localStorage.getItem('token');
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
 class ApiService {
   // AUTHENTICATION
   static async register(userData) {
@@ -118,6 +124,7 @@ class ApiService {
 
     const response = await fetch(`${API_BASE_URL}/upload`, {
       method: 'POST',
+      headers: authHeaders(),
       body: formData,
       credentials: includeCredentials ? 'include' : 'same-origin',
     });
@@ -147,6 +154,31 @@ class ApiService {
 }
 
 
+  // Upload many workbooks in one request; resolves with a per-file status list
+  static async uploadFiles(files, userId, { includeCredentials = false } = {}) {
+    try {
+      if (!files || files.length === 0) throw new Error('No files selected');
+
+      const formData = new FormData();
+      Array.from(files).forEach((file) => formData.append('files', file));
+      formData.append('user_id', userId);
+
+      const response = await fetch(`${API_BASE_URL}/upload/batch`, {
+        method: 'POST',
+        headers: authHeaders(),
+        body: formData,
+        credentials: includeCredentials ? 'include' : 'same-origin',
+      });
+
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error || `Batch upload failed (status ${response.status})`);
+      return data;
+    } catch (error) {
+      console.error('Batch upload error:', error);
+      throw error;
+    }
+  }
+
   // Upload with progress tracking
   static async uploadFileWithProgress(file, userId, onProgress, { includeCredentials = false } = {}) {
     return new Promise((resolve, reject) => {
@@ -160,6 +192,7 @@ class ApiService {
       formData.append('user_id', userId);
 
       xhr.open('POST', url, true);
+      Object.entries(authHeaders()).forEach(([name, value]) => xhr.setRequestHeader(name, value));
       if (includeCredentials) xhr.withCredentials = true;
 
       xhr.upload.onprogress = (e) => {
@@ -191,12 +224,40 @@ class ApiService {
     });
   }
 
+  // UPLOAD JOBS
+  static async getJobStatus(jobId) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, {
+        method: 'GET',
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
+      });
+
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error || 'Failed to fetch job status');
+      return data;
+    } catch (error) {
+      console.error('Get job status error:', error);
+      throw error;
+    }
+  }
+
+  // Poll an upload job until its workbook is indexed or processing fails
+  static async waitForJob(jobId, { intervalMs = 1000, onProgress } = {}) {
+    for (;;) {
+      const job = await ApiService.getJobStatus(jobId);
+      if (typeof onProgress === 'function') onProgress(job);
+      if (job.status === 'indexed') return job;
+      if (job.status === 'failed') throw new Error(job.error || 'Failed to process Excel file');
+      await new Promise((resolve) => setTimeout(resolve, intervalMs));
+    }
+  }
+
   // FILE MANAGEMENT
   static async getUserFiles(userId) {
     try {
       const response = await fetch(`${API_BASE_URL}/files/${userId}`, {
         method: 'GET',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
       });
 
       const data = await response.json();
@@ -208,11 +269,19 @@ class ApiService {
     }
   }
 
-  static async getFileData(fileId) {
+  // Pass { sheet, offset, limit, columns } to fetch a single page of one sheet
+  static async getFileData(fileId, { sheet, offset, limit, columns } = {}) {
     try {
-      const response = await fetch(`${API_BASE_URL}/files/${fileId}/data`, {
+      const params = new URLSearchParams();
+      if (sheet !== undefined) params.set('sheet', sheet);
+      if (offset !== undefined) params.set('offset', offset);
+      if (limit !== undefined) params.set('limit', limit);
+      if (columns !== undefined) params.set('columns', columns.join(','));
+      const query = params.toString() ? `?${params}` : '';
+
+      const response = await fetch(`${API_BASE_URL}/files/${fileId}/data${query}`, {
         method: 'GET',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
       });
 
       const data = await response.json();
@@ -224,11 +293,28 @@ class ApiService {
     }
   }
 
+  static async queryFile(fileId, query) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/files/${fileId}/query`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
+        body: JSON.stringify(query),
+      });
+
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error || 'Query failed');
+      return data;
+    } catch (error) {
+      console.error('Query file error:', error);
+      throw error;
+    }
+  }
+
   static async deleteFile(fileId) {
     try {
       const response = await fetch(`${API_BASE_URL}/files/${fileId}`, {
         method: 'DELETE',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', ...authHeaders() },
       });
 
       const data = await response.json();